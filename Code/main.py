@@ -17,31 +17,36 @@ import pandas as pd
 from datetime import datetime
 from config.constants import (
     USER_TIME_HORIZON, USER_DESIRED_GROWTH, USER_FLUCTUATION,
-    USER_WORST_CASE, USER_MINIMUM_ETF_AGE, USER_RISK_PREFERENCE, TESTING_PERIOD, RECOMMENDATION_COUNT
+    USER_WORST_CASE, USER_MINIMUM_ETF_AGE, USER_RISK_PREFERENCE, TESTING_PERIOD
 )
-from core.data_processing.ishares_ETF_list import download_valid_data
-from core.user.user_profile import getUserProfile
-from core.analysis.max_drawdown import calculate_max_drawdown
-from core.data_processing.etf_data import get_etf_data
+from core.data_processing.shared_prices import get_shared_price_data
+from core.user.user_profile import getUserProfile, editUserProfile
+from core.scoring.recommendation_pipeline import new_memo, run_pipeline
 from visualization.visualizing_etf_metrics import plot_risk_return_user
-from core.data_processing.risk_free_rates import fetch_risk_free_boc
-from core.scoring.etf_recommendation_evaluation import top_recommend
+from core.data_processing.risk_free_rates import get_risk_free_snapshot
 from core.scoring.custom_score import utility_score
 from testing.recommendation_test import recommendation_test
 from visualization.graph_performance import graph_annual_growth_rate
 from testing.compare_custom_Sharpe_test_results import quantitative_etf_basket_comparison
-from core.scoring.sharpe_recommendation import sharpe_score
 
 def main():
-    valid_tickers, data = download_valid_data()
+    valid_tickers, data = get_shared_price_data()
     user = getUserProfile()
+    risk_free_data = get_risk_free_snapshot()
+    memo = new_memo()
+    while True:
+        explanations = recommend(user, valid_tickers, data, risk_free_data, memo)
+        explain_tickers(explanations)
+        # Editing one answer only reruns the stages that depend on it
+        if not editUserProfile(user):
+            break
+
+def recommend(user, valid_tickers, data, risk_free_data, memo):
     end_date = pd.Timestamp(datetime.now())
-    md_tolerable_list = calculate_max_drawdown(user[USER_WORST_CASE], user[USER_MINIMUM_ETF_AGE], valid_tickers, data, end_date)
-    etf_metrics = get_etf_data(md_tolerable_list, user[USER_TIME_HORIZON], data, end_date)
-    risk_free_data = fetch_risk_free_boc("1995-01-01")
-    # etf_utility_calculation = utility_score(etf_metrics, user[USER_TIME_HORIZON], risk_free_data, user[USER_RISK_PREFERENCE])
+    results = run_pipeline(['metrics', 'ranked', 'rejections'], user, valid_tickers, data, end_date, risk_free_data, memo)
+    etf_metrics = results['metrics']
+    # etf_utility_calculation = utility_score(etf_metrics, user[USER_TIME_HORIZON], risk_free_data, user[USER_RISK_PREFERENCE], user[USER_DESIRED_GROWTH], user[USER_FLUCTUATION])
     # etf_utility_recommend = top_recommend(etf_utility_calculation, 'Utility_Score', RECOMMENDATION_COUNT)
-    etf_sharpe_recommend = top_recommend(sharpe_score(etf_metrics, user[USER_TIME_HORIZON], risk_free_data), 'Sharpe', RECOMMENDATION_COUNT)
     # print("Full time recommendations:")
     # print("Custom Recommendations:")
     # print(etf_utility_recommend)
@@ -86,6 +91,18 @@ def main():
     # )
     print(f'Time_Horizon: {user[USER_TIME_HORIZON]}\nGrowth: {user[USER_DESIRED_GROWTH]}\nSTD: {user[USER_FLUCTUATION]}\nMax_Drawdown:'
           + f'{user[USER_WORST_CASE]}\nMin_ETF_Age: {user[USER_MINIMUM_ETF_AGE]}\nRisk_Return_Ratio: {user[USER_RISK_PREFERENCE]}\n')
+    if not results['ranked'].empty:
+        print(f"Recommended ETFs (Sharpe): {', '.join(results['ranked']['Ticker'])}")
+    return results['rejections']
+
+def explain_tickers(explanations):
+    # Answers "why not this ETF?" from the filter masks the pipeline already produced
+    lookup = explanations.set_index('Ticker')['Explanation']
+    while True:
+        ticker = input('\nEnter a ticker to see why it was or was not recommended, or press Enter to continue: ').strip().upper()
+        if not ticker:
+            return
+        print(f"{ticker}: {lookup.get(ticker, 'Not in the ETF universe')}")
 
 if __name__ == "__main__":
     main()
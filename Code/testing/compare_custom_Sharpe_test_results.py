@@ -15,6 +15,8 @@ def quantitative_etf_basket_comparison(
     test_start,
     test_end=None,
     risk_free_rate=0.02,
+    custom_weights=None,
+    sharpe_weights=None,
 ):
     """
     Compares the quantitative performance of two ETF baskets over a test period.
@@ -38,6 +40,11 @@ def quantitative_etf_basket_comparison(
         risk_free_rate (float, optional): The annual risk-free rate, used for
                                           Sharpe and Sortino ratio calculations.
                                           Defaults to 0.02 (2%).
+        custom_weights (dict, optional): Portfolio weight per ticker of the custom
+                                         basket, e.g. from `portfolio_weights`.
+                                         Defaults to equal weights.
+        sharpe_weights (dict, optional): Portfolio weight per ticker of the Sharpe
+                                         basket. Defaults to equal weights.
 
     Returns:
         pd.DataFrame: A DataFrame with the calculated performance metrics for
@@ -58,7 +65,8 @@ def quantitative_etf_basket_comparison(
 
     results = []
 
-    for label, tickers in [('Custom', custom_tickers), ('Sharpe', sharpe_tickers)]:
+    for label, tickers, weights in [('Custom', custom_tickers, custom_weights),
+                                    ('Sharpe', sharpe_tickers, sharpe_weights)]:
         combined_returns = []
 
         for ticker in tickers:
@@ -71,7 +79,7 @@ def quantitative_etf_basket_comparison(
                 continue
 
             returns = prices.pct_change().dropna()
-            combined_returns.append(returns)
+            combined_returns.append(returns.rename(ticker))
 
         if not combined_returns:
             print(f"No valid returns for {label}")
@@ -81,7 +89,14 @@ def quantitative_etf_basket_comparison(
             ])
             continue
 
-        test_returns = pd.concat(combined_returns, axis=1).mean(axis=1)
+        basket_returns = pd.concat(combined_returns, axis=1)
+        if weights is None:
+            test_returns = basket_returns.mean(axis=1)
+        else:
+            # Weighted daily mean, renormalized over the tickers trading that day
+            w = pd.Series(weights, dtype=float).reindex(basket_returns.columns).fillna(0.0)
+            test_returns = (basket_returns * w).sum(axis=1) / basket_returns.notna().mul(w).sum(axis=1)
+            test_returns = test_returns.dropna()
 
         # Calculate metrics
         ann_return = (1 + test_returns.mean()) ** 252 - 1
@@ -0,0 +1,140 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+import json
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from config.constants import CIRCUIT_RESET_SECONDS
+from core.data_processing.http_client import (
+    CircuitBreaker, CircuitOpenError, http_get, BOC_BREAKER
+)
+from core.data_processing.risk_free_rates import fetch_risk_free_boc
+from core.data_processing.shared_prices import get_shared_risk_free, refresh_metrics, RISK_FREE
+
+# What the stub answers: 'ok', 'error' (503) or 'slow' (sleeps past the read timeout)
+STUB_MODE = {'mode': 'ok', 'requests': 0}
+SLOW_SECONDS = 2.0
+
+VALET_PAYLOAD = {
+    'observations': [
+        {'d': '2024-01-02', 'V39079': {'v': '4.95'}},
+        {'d': '2024-01-03', 'V39079': {'v': '4.97'}},
+        {'d': '2024-01-04', 'V39079': {'v': '5.01'}},
+    ]
+}
+
+
+class _ValetStub(BaseHTTPRequestHandler):
+    def do_GET(self):
+        STUB_MODE['requests'] += 1
+        if STUB_MODE['mode'] == 'slow':
+            time.sleep(SLOW_SECONDS)
+            return  # the client has timed out and closed the connection
+        if STUB_MODE['mode'] == 'error':
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps(VALET_PAYLOAD).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server():
+    """
+    Starts the local Valet stub on a free port.
+
+    Returns:
+        tuple: `(server, base_url)`; call `server.shutdown()` when done.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ValetStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/valet"
+
+
+def _fetch(base_url):
+    # Bypass st.cache_data so every call reaches the stub
+    fetch = getattr(fetch_risk_free_boc, '__wrapped__', fetch_risk_free_boc)
+    return fetch("2024-01-01", base_url=base_url)
+
+
+def run_fetch_layer_tests():
+    """
+    Exercises timeouts, retries, the circuit breaker and the snapshot fallback
+    against a local stub of the BoC Valet API, printing each check.
+    """
+    server, base_url = start_stub_server()
+    snapshot_dir = tempfile.mkdtemp()
+    try:
+        # 1. Healthy upstream: parsed and published as the last good snapshot
+        STUB_MODE['mode'] = 'ok'
+        BOC_BREAKER.record_success()
+        rates = get_shared_risk_free(lambda: _fetch(base_url), snapshot_dir)
+        assert len(rates) == 3 and rates['yield_pct'].iloc[-1] == 5.01
+        print("healthy upstream: OK")
+
+        # 2. 503s are retried, then the circuit opens and calls fail immediately
+        STUB_MODE.update(mode='error', requests=0)
+        try:
+            _fetch(base_url)
+            raise AssertionError("expected the 503 to surface")
+        except RuntimeError:
+            pass
+        assert STUB_MODE['requests'] == 3, STUB_MODE
+        assert BOC_BREAKER.state == 'open'
+        started = time.monotonic()
+        try:
+            _fetch(base_url)
+            raise AssertionError("expected an open circuit")
+        except CircuitOpenError:
+            pass
+        assert time.monotonic() - started < 0.05 and STUB_MODE['requests'] == 3
+        print("retries then open circuit: OK")
+
+        # 3. Expired snapshot + unhealthy upstream: last good data is served at once
+        started = time.monotonic()
+        rates = get_shared_risk_free(lambda: _fetch(base_url), snapshot_dir, max_age=0)
+        elapsed = time.monotonic() - started
+        assert rates['yield_pct'].iloc[-1] == 5.01 and elapsed < 0.5, elapsed
+        time.sleep(0.2)
+        assert refresh_metrics(snapshot_dir)[RISK_FREE]['last_error'] is not None
+        print(f"snapshot fallback in {elapsed * 1000:.1f} ms: OK")
+
+        # 4. Slow upstream: the read timeout bounds the total latency
+        STUB_MODE.update(mode='slow', requests=0)
+        breaker = CircuitBreaker('slow stub', failure_threshold=10, reset_timeout=0.5)
+        started = time.monotonic()
+        try:
+            http_get(f"{base_url}/observations/V39079/json", breaker, timeout=(0.5, 0.3))
+            raise AssertionError("expected a timeout")
+        except Exception as e:
+            assert 'timed out' in str(e).lower() or 'timeout' in type(e).__name__.lower(), e
+        elapsed = time.monotonic() - started
+        assert elapsed < 3 * 0.3 + 2 * 1.0 + 0.5, elapsed
+        print(f"slow upstream bounded at {elapsed:.2f} s: OK")
+
+        # 5. Recovery: after the reset timeout one trial call closes the circuit
+        STUB_MODE['mode'] = 'ok'
+        BOC_BREAKER.reset_timeout = 0.2
+        time.sleep(0.25)
+        assert BOC_BREAKER.state == 'half-open'
+        assert len(_fetch(base_url)) == 3 and BOC_BREAKER.state == 'closed'
+        print("half-open trial closes the circuit: OK")
+    finally:
+        BOC_BREAKER.reset_timeout = CIRCUIT_RESET_SECONDS
+        BOC_BREAKER.record_success()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    run_fetch_layer_tests()
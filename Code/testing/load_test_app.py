@@ -0,0 +1,243 @@
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+# The app reads its snapshots from ETF_SHARED_PRICE_DIR, so the synthetic
+# fixture is published to a private directory before the constants are
+# imported; a real shared snapshot is never read or overwritten.
+LOAD_TEST_DIR = os.path.join(tempfile.gettempdir(), f'etf_load_test_{os.getpid()}')
+os.environ['ETF_SHARED_PRICE_DIR'] = LOAD_TEST_DIR
+os.environ.pop('ETF_PRICE_SNAPSHOT', None)
+os.environ.pop('ETF_RISK_FREE_SNAPSHOT', None)
+
+import resource
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+from streamlit.components.v2.component_manager import BidiComponentManager
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test, local_script_runner
+
+from config.constants import (
+    LOAD_TEST_CONCURRENCY, LOAD_TEST_SESSIONS_PER_WORKER, LOAD_TEST_SCRIPT_TIMEOUT, LOAD_TEST_SEED,
+    FETCH_MODE
+)
+from core.data_processing.ishares_ETF_list import ETF_LIST, fetch_valid_data
+from core.data_processing.risk_free_rates import fetch_risk_free_boc
+from core.data_processing.shared_prices import publish_price_matrix, publish_risk_free
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), 'app.py')
+
+# AppTest is written for one run at a time: every run installs its own
+# runtime as the process-wide `Runtime._instance`, with fresh caches, and
+# removes it when done, and compiles the script again. A server has one
+# runtime and one script cache for all sessions, so the harness installs
+# those once and points AppTest's swaps at a throwaway subclass.
+class _PerRunRuntime(Runtime):
+    pass
+
+
+def _install_shared_runtime():
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    components = BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = components
+    Runtime._instance = runtime
+    app_test.Runtime = _PerRunRuntime
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+# Question step -> (selectbox key, button key); every question offers choices 1-5
+QUESTION_STEPS = [('q1', 'next1'), ('q2', 'next2'), ('q3', 'next3'), ('q4', 'next4'), ('q5', 'final')]
+
+
+def publish_fixture_data(n_tickers=len(ETF_LIST), start="1995-01-01", seed=LOAD_TEST_SEED):
+    """
+    Publishes a synthetic price panel and risk-free series as the current snapshots.
+
+    The panel has the real ETF tickers and daily random-walk prices since
+    `start`, with staggered inception dates so the age and drawdown filters
+    reject some ETFs, like the production data. With ETF_FETCH_MODE=replay
+    the recorded fixtures (scaled by ETF_FIXTURE_SCALE) are published
+    instead and the other arguments are ignored.
+
+    Args:
+        n_tickers (int, optional): Number of ETFs. Defaults to all of `ETF_LIST`.
+        start (str, optional): The first date. Defaults to "1995-01-01".
+        seed (int, optional): Random seed. Defaults to `LOAD_TEST_SEED`.
+
+    Returns:
+        tuple: `(price_version, risk_free_version)`.
+    """
+    if FETCH_MODE == 'replay':
+        tickers, data = fetch_valid_data()
+        risk_free = getattr(fetch_risk_free_boc, '__wrapped__', fetch_risk_free_boc)()
+        return publish_price_matrix(tickers, data, LOAD_TEST_DIR), publish_risk_free(risk_free, LOAD_TEST_DIR)
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, pd.Timestamp.today().normalize())
+    tickers = [ETF_LIST[i] if i < len(ETF_LIST) else f"SYN{i}.TO" for i in range(n_tickers)]
+    drift = rng.uniform(-0.0001, 0.0006, n_tickers)
+    volatility = rng.uniform(0.004, 0.02, n_tickers)
+    prices = 20 * np.exp(np.cumsum(rng.normal(drift, volatility, (len(dates), n_tickers)), axis=0))
+    inception = rng.integers(0, len(dates) - 300, n_tickers)
+    prices[np.arange(len(dates))[:, np.newaxis] < inception] = np.nan
+    data = pd.DataFrame(prices, index=dates,
+                        columns=pd.MultiIndex.from_tuples([(ticker, 'Adj Close') for ticker in tickers]))
+
+    yields = 3 + np.cumsum(rng.normal(0, 0.02, len(dates)))
+    risk_free = pd.DataFrame({'yield_pct': np.clip(yields, 0.1, 8)}, index=dates)
+    return publish_price_matrix(tickers, data, LOAD_TEST_DIR), publish_risk_free(risk_free, LOAD_TEST_DIR)
+
+
+def _memory_mb():
+    # (current, peak) resident set size of this process in MB; current is Linux-only
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+    try:
+        with open('/proc/self/status') as status:
+            current = next(int(line.split()[1]) for line in status if line.startswith('VmRSS'))
+        return current / 2 ** 10, peak
+    except (OSError, StopIteration):
+        return None, peak
+
+
+def run_session(choices, timeout=LOAD_TEST_SCRIPT_TIMEOUT):
+    """
+    Drives one simulated user from the intro page to the recommendations.
+
+    Every step is one script run of its own `AppTest`, the headless
+    equivalent of a browser session: the intro button, then one selectbox
+    answer and its Next button per question.
+
+    Args:
+        choices (list): The option (1-5) picked for each of the five questions.
+        timeout (int, optional): Seconds allowed per script run.
+
+    Returns:
+        dict: 'step6_seconds' (the run that renders the recommendations),
+              'total_seconds' and 'error' (None, or what went wrong).
+    """
+    started = time.perf_counter()
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    try:
+        at.run()
+        next(button for button in at.button if button.label == "Find Investments!").click()
+        at.run()
+        for (question, button), choice in zip(QUESTION_STEPS, choices):
+            at.selectbox(key=question).set_value(choice)
+            at.button(key=button).click()
+            step_started = time.perf_counter()
+            at.run()
+        step6 = time.perf_counter() - step_started
+    except Exception as e:
+        return {'step6_seconds': np.nan, 'total_seconds': time.perf_counter() - started,
+                'error': f"{type(e).__name__}: {e}"}
+
+    error = None
+    if at.session_state['step'] != 6:
+        error = f"Stopped at step {at.session_state['step']}"
+    elif len(at.exception) or len(at.error):
+        error = "; ".join([str(e.value) for e in at.exception] + [str(e.value) for e in at.error])
+    return {'step6_seconds': step6, 'total_seconds': time.perf_counter() - started, 'error': error}
+
+
+def run_load_test(concurrency=LOAD_TEST_CONCURRENCY, sessions_per_worker=LOAD_TEST_SESSIONS_PER_WORKER,
+                  seed=LOAD_TEST_SEED, warmup=True, output_path=None):
+    """
+    Measures step-6 latency, throughput and memory of one app process versus
+    the number of simultaneous sessions.
+
+    Streamlit runs every session's script in a thread of the server process;
+    here each level runs `concurrency` sessions at a time on a thread pool in
+    this process, so they contend for the GIL, the process-wide caches and
+    the memory-mapped snapshot the same way. Profiles are random answers.
+    The price and risk-free data are an offline fixture (synthetic, or the
+    recorded replay; see `publish_fixture_data`) published as the current
+    snapshots, so no network is used and no refresh starts; the snapshot
+    directory is removed afterwards.
+
+    Args:
+        concurrency (list, optional): Simultaneous sessions per level.
+                                      Defaults to `LOAD_TEST_CONCURRENCY`.
+        sessions_per_worker (int, optional): Sessions each worker runs per
+                                             level. Defaults to
+                                             `LOAD_TEST_SESSIONS_PER_WORKER`.
+        seed (int, optional): Seed for the fixture and the profiles.
+        warmup (bool, optional): Run one uncounted session first, so the
+                                 per-snapshot caches are built before the
+                                 first level. Defaults to True.
+        output_path (str, optional): Also write the report to this CSV file.
+
+    Returns:
+        pd.DataFrame: One row per level with 'Concurrency', 'Sessions',
+                      'Errors', 'p50 (s)', 'p95 (s)', 'p99 (s)' (step-6
+                      latency), 'Mean Session (s)', 'Throughput (sessions/s)',
+                      'RSS (MB)' and 'Peak RSS (MB)'.
+    """
+    publish_fixture_data(seed=seed)
+    _install_shared_runtime()
+    try:
+        return _run_levels(concurrency, sessions_per_worker, seed, warmup, output_path)
+    finally:
+        shutil.rmtree(LOAD_TEST_DIR, ignore_errors=True)
+
+
+def _run_levels(concurrency, sessions_per_worker, seed, warmup, output_path):
+    rng = np.random.default_rng(seed)
+    if warmup:
+        run_session(rng.integers(1, 6, len(QUESTION_STEPS)).tolist())
+
+    rows = []
+    for workers in concurrency:
+        profiles = [rng.integers(1, 6, len(QUESTION_STEPS)).tolist() for _ in range(workers * sessions_per_worker)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='session') as pool:
+            results = list(pool.map(run_session, profiles))
+        elapsed = time.perf_counter() - started
+
+        latency = np.array([result['step6_seconds'] for result in results if result['error'] is None])
+        errors = [result['error'] for result in results if result['error'] is not None]
+        for error in errors[:3]:
+            print(f"  {workers} sessions: {error}")
+        current, peak = _memory_mb()
+        rows.append({
+            'Concurrency': workers,
+            'Sessions': len(results),
+            'Errors': len(errors),
+            'p50 (s)': np.percentile(latency, 50) if len(latency) else np.nan,
+            'p95 (s)': np.percentile(latency, 95) if len(latency) else np.nan,
+            'p99 (s)': np.percentile(latency, 99) if len(latency) else np.nan,
+            'Mean Session (s)': np.mean([result['total_seconds'] for result in results]),
+            'Throughput (sessions/s)': len(latency) / elapsed,
+            'RSS (MB)': current,
+            'Peak RSS (MB)': peak,
+        })
+        print(f"{workers} concurrent: p50 {rows[-1]['p50 (s)']:.2f}s, p95 {rows[-1]['p95 (s)']:.2f}s, "
+              f"{rows[-1]['Throughput (sessions/s)']:.2f} sessions/s, {len(errors)} errors")
+
+    report = pd.DataFrame(rows)
+    if output_path:
+        report.to_csv(output_path, index=False)
+    return report
+
+
+if __name__ == "__main__":
+    print(run_load_test().round(3).to_string(index=False))
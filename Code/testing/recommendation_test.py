@@ -7,7 +7,7 @@ from config.constants import (
 from core.scoring.sharpe_recommendation import sharpe_score
 from core.scoring.custom_score import utility_score
 from core.scoring.etf_recommendation_evaluation import top_recommend
-from core.data_processing.risk_free_rates import fetch_risk_free_boc
+from core.data_processing.risk_free_rates import get_risk_free_snapshot
 from visualization.visualizing_etf_metrics import plot_risk_return_user
 from core.data_processing.etf_data import get_etf_data
 from core.analysis.max_drawdown import calculate_max_drawdown
@@ -17,7 +17,8 @@ import pandas as pd
 
 def recommendation_test(
     time_horizon, desired_growth, std_deviation, max_drawdown,
-    minimum_etf_age, risk_preference, valid_tickers, data, test_period
+    minimum_etf_age, risk_preference, valid_tickers, data, test_period, max_underwater_years=None,
+    end_date=None
 ):
     """
     Generates ETF recommendations based on a training period and returns
@@ -39,6 +40,12 @@ def recommendation_test(
         valid_tickers (list): A list of all available ETF tickers.
         data (pd.DataFrame): A DataFrame containing the historical price data for all ETFs.
         test_period (int): The length of the back-testing period, in years.
+        max_underwater_years (float, optional): Also drop ETFs that stayed below
+                                                a previous high for longer than
+                                                this many years. Defaults to no limit.
+        end_date (pd.Timestamp, optional): The end of the full-time window; the
+                                           training window ends `test_period`
+                                           years before it. Defaults to now.
 
     Returns:
         tuple: A tuple containing two lists of strings:
@@ -47,15 +54,17 @@ def recommendation_test(
                - `sharpe_recommended_list` (list of str): Tickers of ETFs recommended
                  by the Sharpe ratio.
     """
-    today = pd.Timestamp(datetime.now())
-    train_end = today - pd.DateOffset(years=test_period)
+    end_date = pd.Timestamp(datetime.now()) if end_date is None else pd.Timestamp(end_date)
+    train_end = end_date - pd.DateOffset(years=test_period)
 
-    md_tolerable_list = calculate_max_drawdown(max_drawdown, minimum_etf_age, valid_tickers, data, train_end)
+    md_tolerable_list = calculate_max_drawdown(max_drawdown, minimum_etf_age, valid_tickers, data, train_end,
+                                               max_underwater_years=max_underwater_years)
     etf_metrics = get_etf_data(md_tolerable_list, time_horizon, data, train_end)
-    risk_free_data = fetch_risk_free_boc("1995-01-01")
+    risk_free_data = get_risk_free_snapshot()
 
     etf_utility_calculation = utility_score(
-        etf_metrics, time_horizon, risk_free_data, risk_preference)
+        etf_metrics, time_horizon, risk_free_data, risk_preference,
+        desired_growth, std_deviation, end_date=train_end)
 
     if 'Utility_Score' in etf_utility_calculation.columns:
         custom_clean = etf_utility_calculation.dropna(subset=['Utility_Score'])
@@ -65,7 +74,7 @@ def recommendation_test(
         custom_recommended_list = []
 
     sharpe_scoring_calculation = sharpe_score(
-        etf_metrics, time_horizon, risk_free_data)
+        etf_metrics, time_horizon, risk_free_data, end_date=train_end)
 
     if 'Sharpe' in sharpe_scoring_calculation.columns:
         sharpe_clean = sharpe_scoring_calculation.dropna(subset=['Sharpe'])
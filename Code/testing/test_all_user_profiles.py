@@ -2,19 +2,27 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config.constants import (
-    TESTING_PERIOD, RECOMMENDATION_COUNT, TOP_RANGE_RECOMMENDATIONS
+    TESTING_PERIOD, RECOMMENDATION_COUNT, TOP_RANGE_RECOMMENDATIONS, SWEEP_OUTPUT_DIR, SWEEP_BATCH_SIZE,
+    REPORT_PROCESSES
 )
 import itertools
+import json
 import pandas as pd
 from datetime import datetime
-from core.data_processing.ishares_ETF_list import download_valid_data
-from core.analysis.max_drawdown import calculate_max_drawdown
-from core.data_processing.Etf_Data import get_etf_data
-from core.data_processing.risk_free_rates import fetch_risk_free_boc
+from core.data_processing.shared_prices import get_shared_price_data, load_quality, snapshot_version
+from core.data_processing.data_quality import QUALITY_FLAGS
+import numpy as np
+from core.analysis.max_drawdown import max_drawdown_masks
+from core.analysis.rebalancing import simulate_rebalancing
+from core.data_processing.etf_data import get_etf_data_with_masks
+from core.data_processing.risk_free_rates import get_risk_free_snapshot, average_risk_free_rate
+from core.analysis.portfolio_weights import portfolio_weights
 from core.scoring.etf_recommendation_evaluation import top_recommend
 from core.scoring.custom_score import utility_score
 from testing.recommendation_test import recommendation_test
-from core.scoring.sharpe_recommendation import sharpe_score
+from testing.compare_custom_Sharpe_test_results import quantitative_etf_basket_comparison
+from core.scoring.sharpe_recommendation import sharpe_score, daily_sharpe_matrix
+from visualization.batch_reports import growth_chart_job, risk_return_chart_job, render_chart_batch
 
 # Constants for index access
 USER_TIME_HORIZON = 0
@@ -24,8 +32,182 @@ USER_WORST_CASE = 3
 USER_MINIMUM_ETF_AGE = 4
 USER_RISK_PREFERENCE = 5
 
+MANIFEST_FILE = 'manifest.json'
+REBALANCING_FILE = 'rebalancing.parquet'
+WEIGHTED_BASKETS_FILE = 'weighted_baskets.parquet'
+CHARTS_DIR = 'charts'
+CHARTS_FILE = 'charts.parquet'
 
-def generate_all_user_tests():
+
+def evaluate_user_profile(user, valid_tickers, data, end_date, risk_free_data, max_underwater_years=None,
+                          daily_sharpe=None):
+    """
+    Computes the overlap metrics and recommended tickers for one profile.
+
+    Args:
+        user (list): The profile, indexed by the USER_* constants.
+        valid_tickers (list): A list of all available ETF tickers.
+        data (pd.DataFrame): The 'Adj Close' price panel.
+        end_date (pd.Timestamp): The end of the full-time window.
+        risk_free_data (pd.DataFrame): The BoC risk-free series.
+        max_underwater_years (float, optional): The app's limit on time below a
+                                                previous high. Defaults to no limit.
+        daily_sharpe (pd.DataFrame, optional): The `daily_sharpe_matrix` of the
+                                               sweep's full-time horizons; when
+                                               given, the row also records the
+                                               full-time 'Daily Sharpe' basket.
+
+    Returns:
+        dict or None: One result row, or None when either period yields no
+                      recommendations.
+    """
+    # Full-time recommendations - direct calc method; the masks say why ETFs were dropped
+    drawdown_masks = max_drawdown_masks(
+        user[USER_WORST_CASE], user[USER_MINIMUM_ETF_AGE] + TESTING_PERIOD, valid_tickers, data, end_date,
+        max_underwater_years=max_underwater_years
+    )
+    rejected = np.logical_or.reduce(list(drawdown_masks.values()))
+    md_tolerable_list = [ticker for ticker, out in zip(valid_tickers, rejected) if not out]
+    etf_metrics_full_time, metric_masks = get_etf_data_with_masks(
+        md_tolerable_list, user[USER_TIME_HORIZON] + TESTING_PERIOD, data, end_date)
+
+    utility_scores = utility_score(etf_metrics_full_time, user[USER_TIME_HORIZON] + TESTING_PERIOD, risk_free_data, user[USER_RISK_PREFERENCE],
+                                   user[USER_DESIRED_GROWTH], user[USER_FLUCTUATION], end_date=end_date)
+    sharpe_scores = sharpe_score(etf_metrics_full_time, user[USER_TIME_HORIZON] + TESTING_PERIOD, risk_free_data,
+                                 amount_recommend=TOP_RANGE_RECOMMENDATIONS, end_date=end_date)
+
+    # Get top RECOMMENDATION_COUNT (e.g., 5) recommendations for full-time
+    full_time_custom_df = top_recommend(utility_scores, 'Utility_Score', RECOMMENDATION_COUNT)
+    full_time_sharpe_df = top_recommend(sharpe_scores, 'Sharpe', RECOMMENDATION_COUNT)
+    full_time_custom_list = full_time_custom_df['Ticker'].tolist()
+    full_time_sharpe_list = full_time_sharpe_df['Ticker'].tolist()
+    if daily_sharpe is not None:
+        daily_scores = etf_metrics_full_time[['Ticker']].assign(Daily_Sharpe=daily_sharpe[
+            user[USER_TIME_HORIZON] + TESTING_PERIOD].reindex(etf_metrics_full_time['Ticker']).to_numpy())
+        full_time_daily_sharpe_list = top_recommend(daily_scores.dropna(), 'Daily_Sharpe',
+                                                    RECOMMENDATION_COUNT)['Ticker'].tolist()
+
+    # Get TOP_RANGE_RECOMMENDATIONS (e.g., 15) recommendations for full-time for comparison
+    full_time_custom_top_range_df = top_recommend(utility_scores, 'Utility_Score', TOP_RANGE_RECOMMENDATIONS)
+    full_time_sharpe_top_range_df = top_recommend(sharpe_scores, 'Sharpe', TOP_RANGE_RECOMMENDATIONS)
+    full_time_custom_top_range_list = full_time_custom_top_range_df['Ticker'].tolist()
+    full_time_sharpe_top_range_list = full_time_sharpe_top_range_df['Ticker'].tolist()
+
+    if not full_time_custom_list or not full_time_sharpe_list:
+        print(f"Skipping combo {tuple(user)} due to empty full-time recommendations.")
+        return None
+
+    # Test period recommendations via recommendation_test
+    custom_list, sharpe_list = recommendation_test(
+        user[USER_TIME_HORIZON], user[USER_DESIRED_GROWTH], user[USER_FLUCTUATION],
+        user[USER_WORST_CASE], user[USER_MINIMUM_ETF_AGE], user[USER_RISK_PREFERENCE],
+        valid_tickers, data, TESTING_PERIOD, max_underwater_years, end_date
+    )
+
+    if not custom_list or not sharpe_list:
+        print(f"Skipping combo {tuple(user)} due to empty test period recommendations.")
+        return None
+
+    # Sets for overlap calculations
+    set_full_custom = set(full_time_custom_list)
+    set_full_sharpe = set(full_time_sharpe_list)
+    set_full_custom_top_range = set(full_time_custom_top_range_list)
+    set_full_sharpe_top_range = set(full_time_sharpe_top_range_list)
+    set_test_custom = set(custom_list)
+    set_test_sharpe = set(sharpe_list)
+
+    # Counts of overlaps
+    overlap_full_custom_sharpe = len(set_full_custom & set_full_sharpe)
+    overlap_test_custom_sharpe = len(set_test_custom & set_test_sharpe)
+    overlap_full_test_custom = len(set_full_custom & set_test_custom)
+    overlap_full_test_sharpe = len(set_full_sharpe & set_test_sharpe)
+    
+    # New columns: Test period recommendations vs. Full-time top 15
+    custom_test_in_custom_full_top_range = len(set_test_custom & set_full_custom_top_range)
+    sharpe_test_in_sharpe_full_top_range = len(set_test_sharpe & set_full_sharpe_top_range)
+
+    # Intersections as comma-separated strings (sorted)
+    intersection_custom_test_sharpe_test = ', '.join(sorted(set_test_custom & set_test_sharpe))
+    intersection_custom_full_test = ', '.join(sorted(set_full_custom & set_test_custom))
+    intersection_sharpe_full_test = ', '.join(sorted(set_full_sharpe & set_test_sharpe))
+
+    # Convert ticker lists to comma-separated strings for output
+    custom_full_time_tickers = ', '.join(full_time_custom_list)
+    custom_test_time_tickers = ', '.join(custom_list)
+    sharpe_full_time_tickers = ', '.join(full_time_sharpe_list)
+    sharpe_test_time_tickers = ', '.join(sharpe_list)
+    
+    # New columns for the top 15 lists
+    custom_full_time_top_15 = ', '.join(full_time_custom_top_range_list)
+    sharpe_full_time_top_15 = ', '.join(full_time_sharpe_top_range_list)
+
+    # Build final row
+    row = {
+        "time_horizon": user[USER_TIME_HORIZON],
+        "growth": user[USER_DESIRED_GROWTH],
+        "fluctuation": user[USER_FLUCTUATION],
+        "max_drawdown": user[USER_WORST_CASE],
+        "min_etf_age": user[USER_MINIMUM_ETF_AGE],
+        "risk_preference": user[USER_RISK_PREFERENCE],
+        "overlap_full_custom_sharpe": overlap_full_custom_sharpe,
+        "overlap_test_custom_sharpe": overlap_test_custom_sharpe,
+        "overlap_full_test_custom": overlap_full_test_custom,
+        "overlap_full_test_sharpe": overlap_full_test_sharpe,
+        "custom_test_in_custom_full_top_range": custom_test_in_custom_full_top_range,
+        "sharpe_test_in_sharpe_full_top_range": sharpe_test_in_sharpe_full_top_range,
+        "custom_full_time_tickers": custom_full_time_tickers,
+        "custom_test_time_tickers": custom_test_time_tickers,
+        "sharpe_full_time_tickers": sharpe_full_time_tickers,
+        "sharpe_test_time_tickers": sharpe_test_time_tickers,
+        "custom_full_time_top_15": custom_full_time_top_15,
+        "sharpe_full_time_top_15": sharpe_full_time_top_15,
+        "intersection_custom_test_sharpe_test": intersection_custom_test_sharpe_test,
+        "intersection_custom_full_test": intersection_custom_full_test,
+        "intersection_sharpe_full_test": intersection_sharpe_full_test,
+    }
+    if daily_sharpe is not None:
+        row["daily_sharpe_full_time_tickers"] = ', '.join(full_time_daily_sharpe_list)
+    # How many ETFs each full-time filter rejected (see core/analysis/rejections.py)
+    for reason, mask in {**drawdown_masks, **metric_masks}.items():
+        row[f"rejected_{reason}"] = int(mask.sum())
+
+
+    return row
+
+
+def _read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(output_dir, manifest):
+    # Write-then-rename so an interruption never leaves a half-written manifest
+    tmp_path = os.path.join(output_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_FILE))
+
+
+def _quality_summary(version):
+    # Flag totals from the snapshot's data-quality report; None if it has none
+    quality = load_quality(version=version)
+    if quality is None:
+        return None
+    report = quality['report']
+    return {name: int(report[f'{name.capitalize()}_Count'].sum()) for name in QUALITY_FLAGS}
+
+
+def _profile_key(combo):
+    return json.dumps(list(combo))
+
+
+def generate_all_user_tests(output_dir=SWEEP_OUTPUT_DIR, batch_size=SWEEP_BATCH_SIZE, excel_path=None,
+                            max_underwater_years=None):
     """
     Automates the generation and analysis of ETF recommendations for a full
     range of hypothetical user profiles.
@@ -36,23 +218,59 @@ def generate_all_user_tests():
     the full dataset and a back-testing period. It then calculates and
     records metrics such as the overlap between custom and Sharpe recommendations,
     as well as the consistency between full-time and test-period recommendations.
-    The final results are compiled into a pandas DataFrame and saved to an
-    Excel file for further analysis.
+
+    Results are streamed to `output_dir` in Parquet part files of
+    `batch_size` profiles. After each part is written, a manifest records it
+    together with every finished profile (skipped ones included), so an
+    interrupted sweep resumes where it stopped when called again with the
+    same directory. Profiles that raised an error are retried on resume. The
+    manifest also records the data snapshots and the flag totals of the price
+    snapshot's data-quality report; resuming against different data is
+    refused, so pin them with ETF_PRICE_SNAPSHOT / ETF_RISK_FREE_SNAPSHOT or
+    use a new directory. The same holds for the underwater-time limit.
 
     Args:
-        None: This function does not take any arguments. All test parameters
-              are hard-coded within the function for controlled testing.
+        output_dir (str, optional): The sweep directory. Defaults to `SWEEP_OUTPUT_DIR`.
+        batch_size (int, optional): Profiles per part file. Defaults to `SWEEP_BATCH_SIZE`.
+        excel_path (str, optional): If given, the results are also exported
+                                    to this Excel file at the end.
+        max_underwater_years (float, optional): Drop ETFs that stayed below a
+                                                previous high for longer than
+                                                this many years, as the app's
+                                                filter does. Defaults to no limit.
 
     Returns:
         pd.DataFrame: A DataFrame containing the results of all user profile
                       tests, including the profile parameters, various overlap
                       metrics, and the recommended tickers for each scenario.
-                      This DataFrame is also saved to an Excel file.
     """
-
-
-    valid_tickers, data = download_valid_data()
+    valid_tickers, data = get_shared_price_data()
     end_date = pd.Timestamp(datetime.now())
+    risk_free_data = get_risk_free_snapshot()
+    snapshots = {'prices': snapshot_version(data), 'risk_free': snapshot_version(risk_free_data)}
+    # Rerun with ETF_PRICE_SNAPSHOT / ETF_RISK_FREE_SNAPSHOT set to these to reproduce
+    print(f"Price snapshot: {snapshots['prices']}, risk-free snapshot: {snapshots['risk_free']}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _read_manifest(output_dir)
+    if manifest is None:
+        manifest = {'snapshots': snapshots, 'end_date': str(end_date.date()),
+                    'max_underwater_years': max_underwater_years,
+                    'data_quality': _quality_summary(snapshots['prices']), 'parts': [], 'done': []}
+        print(f"Data quality flags: {manifest['data_quality']}")
+        _write_manifest(output_dir, manifest)
+    elif manifest['snapshots'] != snapshots:
+        raise RuntimeError(
+            f"Sweep in {output_dir} was run on snapshots {manifest['snapshots']}, "
+            f"current data is {snapshots}. Pin the original snapshots or use a new directory.")
+    elif manifest.get('max_underwater_years') != max_underwater_years:
+        raise RuntimeError(
+            f"Sweep in {output_dir} was run with max_underwater_years={manifest.get('max_underwater_years')}; "
+            f"resume it with the same limit or use a new directory.")
+    else:
+        print(f"Resuming sweep: {len(manifest['done'])} profiles already done.")
+    # Keep the original window so resumed rows match the first run
+    end_date = pd.Timestamp(manifest['end_date'])
 
     time_horizons = [1, 8, 25]
     growths = [2, 21]
@@ -61,123 +279,263 @@ def generate_all_user_tests():
     min_etf_ages = [0, 3, 10]
     risk_preferences = [[3, 1], [1, 1], [1, 3]]
 
-    rows = []
+    done = set(manifest['done'])
+    pending = [combo for combo in itertools.product(time_horizons, growths, stds, max_drawdowns, min_etf_ages, risk_preferences)
+               if _profile_key(combo) not in done]
 
-    for combo in itertools.product(time_horizons, growths, stds, max_drawdowns, min_etf_ages, risk_preferences):
+    # The daily excess-return Sharpe of every full-time horizon, in one pass
+    daily_sharpe = daily_sharpe_matrix(data, risk_free_data, end_date,
+                                       [horizon + TESTING_PERIOD for horizon in time_horizons])
+
+    rows = []
+    finished = []
+    for position, combo in enumerate(pending):
         user = list(combo)
         print(f"Processing combo: {combo}")
 
         try:
-            # Full-time recommendations - direct calc method
-            md_tolerable_list = calculate_max_drawdown(
-                user[USER_WORST_CASE], user[USER_MINIMUM_ETF_AGE] + TESTING_PERIOD, valid_tickers, data, end_date
-            )
-            etf_metrics_full_time = get_etf_data(md_tolerable_list, user[USER_TIME_HORIZON] + TESTING_PERIOD, data, end_date)
-            risk_free_data = fetch_risk_free_boc("1995-01-01")
-
-            utility_scores = utility_score(etf_metrics_full_time, user[USER_TIME_HORIZON] + TESTING_PERIOD, risk_free_data, user[USER_RISK_PREFERENCE])
-            sharpe_scores = sharpe_score(etf_metrics_full_time, user[USER_TIME_HORIZON] + TESTING_PERIOD, risk_free_data)
-
-            # Get top RECOMMENDATION_COUNT (e.g., 5) recommendations for full-time
-            full_time_custom_df = top_recommend(utility_scores, 'Utility_Score', RECOMMENDATION_COUNT)
-            full_time_sharpe_df = top_recommend(sharpe_scores, 'Sharpe', RECOMMENDATION_COUNT)
-            full_time_custom_list = full_time_custom_df['Ticker'].tolist()
-            full_time_sharpe_list = full_time_sharpe_df['Ticker'].tolist()
-
-            # Get TOP_RANGE_RECOMMENDATIONS (e.g., 15) recommendations for full-time for comparison
-            full_time_custom_top_range_df = top_recommend(utility_scores, 'Utility_Score', TOP_RANGE_RECOMMENDATIONS)
-            full_time_sharpe_top_range_df = top_recommend(sharpe_scores, 'Sharpe', TOP_RANGE_RECOMMENDATIONS)
-            full_time_custom_top_range_list = full_time_custom_top_range_df['Ticker'].tolist()
-            full_time_sharpe_top_range_list = full_time_sharpe_top_range_df['Ticker'].tolist()
-
-            if not full_time_custom_list or not full_time_sharpe_list:
-                print(f"Skipping combo {combo} due to empty full-time recommendations.")
-                continue
-
-            # Test period recommendations via recommendation_test
-            custom_list, sharpe_list = recommendation_test(
-                user[USER_TIME_HORIZON], user[USER_DESIRED_GROWTH], user[USER_FLUCTUATION],
-                user[USER_WORST_CASE], user[USER_MINIMUM_ETF_AGE], user[USER_RISK_PREFERENCE],
-                valid_tickers, data, TESTING_PERIOD
-            )
-
-            if not custom_list or not sharpe_list:
-                print(f"Skipping combo {combo} due to empty test period recommendations.")
-                continue
-
-            # Sets for overlap calculations
-            set_full_custom = set(full_time_custom_list)
-            set_full_sharpe = set(full_time_sharpe_list)
-            set_full_custom_top_range = set(full_time_custom_top_range_list)
-            set_full_sharpe_top_range = set(full_time_sharpe_top_range_list)
-            set_test_custom = set(custom_list)
-            set_test_sharpe = set(sharpe_list)
-
-            # Counts of overlaps
-            overlap_full_custom_sharpe = len(set_full_custom & set_full_sharpe)
-            overlap_test_custom_sharpe = len(set_test_custom & set_test_sharpe)
-            overlap_full_test_custom = len(set_full_custom & set_test_custom)
-            overlap_full_test_sharpe = len(set_full_sharpe & set_test_sharpe)
-            
-            # New columns: Test period recommendations vs. Full-time top 15
-            custom_test_in_custom_full_top_range = len(set_test_custom & set_full_custom_top_range)
-            sharpe_test_in_sharpe_full_top_range = len(set_test_sharpe & set_full_sharpe_top_range)
-
-            # Intersections as comma-separated strings (sorted)
-            intersection_custom_test_sharpe_test = ', '.join(sorted(set_test_custom & set_test_sharpe))
-            intersection_custom_full_test = ', '.join(sorted(set_full_custom & set_test_custom))
-            intersection_sharpe_full_test = ', '.join(sorted(set_full_sharpe & set_test_sharpe))
-
-            # Convert ticker lists to comma-separated strings for output
-            custom_full_time_tickers = ', '.join(full_time_custom_list)
-            custom_test_time_tickers = ', '.join(custom_list)
-            sharpe_full_time_tickers = ', '.join(full_time_sharpe_list)
-            sharpe_test_time_tickers = ', '.join(sharpe_list)
-            
-            # New columns for the top 15 lists
-            custom_full_time_top_15 = ', '.join(full_time_custom_top_range_list)
-            sharpe_full_time_top_15 = ', '.join(full_time_sharpe_top_range_list)
-
-            # Build final row
-            row = {
-                "time_horizon": user[USER_TIME_HORIZON],
-                "growth": user[USER_DESIRED_GROWTH],
-                "fluctuation": user[USER_FLUCTUATION],
-                "max_drawdown": user[USER_WORST_CASE],
-                "min_etf_age": user[USER_MINIMUM_ETF_AGE],
-                "risk_preference": user[USER_RISK_PREFERENCE],
-                "overlap_full_custom_sharpe": overlap_full_custom_sharpe,
-                "overlap_test_custom_sharpe": overlap_test_custom_sharpe,
-                "overlap_full_test_custom": overlap_full_test_custom,
-                "overlap_full_test_sharpe": overlap_full_test_sharpe,
-                "custom_test_in_custom_full_top_range": custom_test_in_custom_full_top_range,
-                "sharpe_test_in_sharpe_full_top_range": sharpe_test_in_sharpe_full_top_range,
-                "custom_full_time_tickers": custom_full_time_tickers,
-                "custom_test_time_tickers": custom_test_time_tickers,
-                "sharpe_full_time_tickers": sharpe_full_time_tickers,
-                "sharpe_test_time_tickers": sharpe_test_time_tickers,
-                "custom_full_time_top_15": custom_full_time_top_15,
-                "sharpe_full_time_top_15": sharpe_full_time_top_15,
-                "intersection_custom_test_sharpe_test": intersection_custom_test_sharpe_test,
-                "intersection_custom_full_test": intersection_custom_full_test,
-                "intersection_sharpe_full_test": intersection_sharpe_full_test,
-            }
-
-            rows.append(row)
-
+            row = evaluate_user_profile(user, valid_tickers, data, end_date, risk_free_data, max_underwater_years,
+                                        daily_sharpe)
         except Exception as e:
             print(f"Failed on combo {combo}: {e}")
-            continue
+            row = None
+        else:
+            finished.append(_profile_key(combo))
+        if row is not None:
+            rows.append(row)
+
+        if len(finished) >= batch_size or (position == len(pending) - 1 and finished):
+            if rows:
+                part = f"part-{len(manifest['parts']):05d}.parquet"
+                tmp_path = os.path.join(output_dir, part + '.tmp')
+                pd.DataFrame(rows).to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, os.path.join(output_dir, part))
+                manifest['parts'].append(part)
+            manifest['done'].extend(finished)
+            _write_manifest(output_dir, manifest)
+            rows, finished = [], []
+
+    df = load_sweep_results(output_dir)
+    if df.empty:
+        print("No valid data rows collected.")
+        return None
+
+    print(f"Sweep complete: {len(df)} rows in {output_dir}.")
+    if excel_path is not None:
+        export_sweep_to_excel(output_dir, excel_path)
+    return df
+
+
+def load_sweep_results(output_dir=SWEEP_OUTPUT_DIR):
+    """
+    Reads every part file recorded in a sweep's manifest into one DataFrame.
+
+    Args:
+        output_dir (str, optional): The sweep directory. Defaults to `SWEEP_OUTPUT_DIR`.
+
+    Returns:
+        pd.DataFrame: All result rows written so far (empty if none).
+    """
+    manifest = _read_manifest(output_dir)
+    if manifest is None or not manifest['parts']:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(os.path.join(output_dir, part)) for part in manifest['parts']],
+                     ignore_index=True)
+
+
+def compare_rebalancing_policies(output_dir=SWEEP_OUTPUT_DIR):
+    """
+    Backtests every test-period basket of a finished sweep under each
+    rebalancing policy, with trading costs.
+
+    All distinct baskets are simulated in one `simulate_rebalancing` call over
+    the sweep's test window, so comparing policies costs one vectorized pass
+    instead of one run per profile. The result is also written to
+    `rebalancing.parquet` in the sweep directory.
+
+    Args:
+        output_dir (str, optional): The sweep directory. Defaults to `SWEEP_OUTPUT_DIR`.
+
+    Returns:
+        pd.DataFrame: One row per basket and policy with the basket's 'Method'
+                      ('custom' or 'sharpe'), its 'Tickers', the number of
+                      'Profiles' that received it and the summary columns of
+                      `simulate_rebalancing`.
+    """
+    manifest = _read_manifest(output_dir)
+    results = load_sweep_results(output_dir)
+    if results.empty:
+        print("No sweep results to backtest.")
+        return None
+
+    _, data = get_shared_price_data()
+    if snapshot_version(data) != manifest['snapshots']['prices']:
+        raise RuntimeError(f"Sweep in {output_dir} was run on price snapshot {manifest['snapshots']['prices']}; "
+                           f"pin it with ETF_PRICE_SNAPSHOT to backtest its baskets.")
+    test_end = pd.Timestamp(manifest['end_date'])
+    test_start = test_end - pd.DateOffset(years=TESTING_PERIOD)
+
+    # Equal-weight baskets with the same members are the same basket, whatever their rank order
+    baskets = pd.concat([
+        results['custom_test_time_tickers'].rename('Tickers').to_frame().assign(Method='custom'),
+        results['sharpe_test_time_tickers'].rename('Tickers').to_frame().assign(Method='sharpe'),
+    ])
+    baskets['Tickers'] = baskets['Tickers'].map(lambda tickers: ', '.join(sorted(tickers.split(', '))))
+    baskets = baskets.groupby(['Method', 'Tickers']).size().rename('Profiles').reset_index()
+
+    simulation = simulate_rebalancing(data, [tickers.split(', ') for tickers in baskets['Tickers']],
+                                      test_start, test_end)
+    comparison = baskets.join(simulation['summary']).reset_index(drop=True)
+    comparison.to_parquet(os.path.join(output_dir, REBALANCING_FILE), index=False)
+    print(comparison.groupby('Policy')[['Annual Return (%)', 'Max Drawdown (%)', 'Costs (%)']].mean())
+    return comparison
+
+
+def compare_weighted_baskets(output_dir=SWEEP_OUTPUT_DIR):
+    """
+    Compares every test-period basket of a finished sweep equal-weighted and
+    weighted to the profile's fluctuation target.
+
+    The target-volatility weights are estimated on the training window that
+    picked the baskets. All baskets of one time horizon are solved in a
+    single batched `portfolio_weights` call over the shared covariance, so
+    the full profile grid costs one solve per horizon. Both weightings are
+    then compared with `quantitative_etf_basket_comparison` over the sweep's
+    test window. The result is also written to `weighted_baskets.parquet` in
+    the sweep directory.
+
+    Args:
+        output_dir (str, optional): The sweep directory. Defaults to `SWEEP_OUTPUT_DIR`.
+
+    Returns:
+        pd.DataFrame: One row per profile, 'Method' ('Custom' or 'Sharpe') and
+                      'Weighting' ('Equal' or 'Target_Volatility') with the
+                      comparison's performance columns.
+    """
+    manifest = _read_manifest(output_dir)
+    results = load_sweep_results(output_dir)
+    if results.empty:
+        print("No sweep results to compare.")
+        return None
+
+    _, data = get_shared_price_data()
+    risk_free_data = get_risk_free_snapshot()
+    snapshots = {'prices': snapshot_version(data), 'risk_free': snapshot_version(risk_free_data)}
+    if snapshots != manifest['snapshots']:
+        raise RuntimeError(f"Sweep in {output_dir} was run on snapshots {manifest['snapshots']}; pin them with "
+                           f"ETF_PRICE_SNAPSHOT / ETF_RISK_FREE_SNAPSHOT to compare its baskets.")
+    test_end = pd.Timestamp(manifest['end_date'])
+    test_start = test_end - pd.DateOffset(years=TESTING_PERIOD)
+    risk_free_rate = average_risk_free_rate(risk_free_data, TESTING_PERIOD, test_end) / 100
+
+    profile_columns = ['time_horizon', 'growth', 'fluctuation', 'max_drawdown', 'min_etf_age', 'risk_preference']
+    metric_columns = ['Annual Return (%)', 'Volatility (%)', 'Sharpe', 'Sortino', 'Max Drawdown (%)',
+                      'Reward to Shortfall']
+    rows = []
+    for horizon, group in results.groupby('time_horizon'):
+        custom_baskets = [tickers.split(', ') for tickers in group['custom_test_time_tickers']]
+        sharpe_baskets = [tickers.split(', ') for tickers in group['sharpe_test_time_tickers']]
+        targets = group['fluctuation'].tolist()
+        weights = portfolio_weights(data, custom_baskets + sharpe_baskets, horizon, test_start,
+                                    risk_free_data, targets + targets)
+
+        for position, profile in enumerate(group[profile_columns].itertuples(index=False)):
+            # No usable estimate for a basket leaves it equal-weighted
+            custom_weights = weights[position].set_index('Ticker')['Target_Volatility'].to_dict() or None
+            sharpe_weights = weights[len(group) + position].set_index('Ticker')['Target_Volatility'].to_dict() or None
+            for weighting, basket_weights in [('Equal', (None, None)),
+                                              ('Target_Volatility', (custom_weights, sharpe_weights))]:
+                comparison = quantitative_etf_basket_comparison(
+                    data, custom_baskets[position], sharpe_baskets[position], profile.growth,
+                    profile.fluctuation, test_start, test_end, risk_free_rate, *basket_weights)
+                for method, metrics in comparison[metric_columns].iterrows():
+                    rows.append({**profile._asdict(), 'Method': method, 'Weighting': weighting, **metrics})
+
+    comparison = pd.DataFrame(rows)
+    comparison.to_parquet(os.path.join(output_dir, WEIGHTED_BASKETS_FILE), index=False)
+    print(comparison.groupby(['Method', 'Weighting'])[['Annual Return (%)', 'Volatility (%)', 'Sharpe']].mean())
+    return comparison
+
+
+def render_sweep_charts(output_dir=SWEEP_OUTPUT_DIR, processes=REPORT_PROCESSES):
+    """
+    Renders the growth and risk-return charts of every profile in a sweep.
+
+    Each profile gets the `graph_annual_growth_rate` chart of its test-period
+    baskets and the `plot_risk_return_user` chart of its full-time metrics,
+    drawn in one `render_chart_batch` over a process pool into the `charts`
+    folder of the sweep. Full-time metrics depend only on the drawdown, age
+    and horizon answers, so they are computed once per combination. Chart
+    files are content-addressed, so rerunning only draws charts that changed.
+    An index of the files is written to `charts.parquet`.
+
+    Args:
+        output_dir (str, optional): The sweep directory. Defaults to `SWEEP_OUTPUT_DIR`.
+        processes (int, optional): Worker processes. Defaults to `REPORT_PROCESSES`.
 
-    if not rows:
-        print("No valid data rows collected to write to Excel.")
+    Returns:
+        pd.DataFrame: The profile columns with the 'growth_chart' and
+                      'risk_return_chart' paths.
+    """
+    manifest = _read_manifest(output_dir)
+    results = load_sweep_results(output_dir)
+    if results.empty:
+        print("No sweep results to chart.")
         return None
 
-    df = pd.DataFrame(rows)
-    df.to_excel('~/Desktop/all_users_etf_overlap_and_tickers_1yr_test_with_top_15.xlsx', index=False)
+    valid_tickers, data = get_shared_price_data()
+    if snapshot_version(data) != manifest['snapshots']['prices']:
+        raise RuntimeError(f"Sweep in {output_dir} was run on price snapshot {manifest['snapshots']['prices']}; "
+                           f"pin it with ETF_PRICE_SNAPSHOT to chart its results.")
+    end_date = pd.Timestamp(manifest['end_date'])
+
+    metrics = {}
+    jobs = []
+    for row in results.itertuples(index=False):
+        user = [row.time_horizon, row.growth, row.fluctuation, row.max_drawdown, row.min_etf_age,
+                list(row.risk_preference)]
+        key = (row.max_drawdown, row.min_etf_age, row.time_horizon)
+        if key not in metrics:
+            drawdown_masks = max_drawdown_masks(row.max_drawdown, row.min_etf_age + TESTING_PERIOD,
+                                                valid_tickers, data, end_date,
+                                                max_underwater_years=manifest.get('max_underwater_years'))
+            rejected = np.logical_or.reduce(list(drawdown_masks.values()))
+            md_tolerable_list = [ticker for ticker, out in zip(valid_tickers, rejected) if not out]
+            metrics[key], _ = get_etf_data_with_masks(md_tolerable_list, row.time_horizon + TESTING_PERIOD,
+                                                      data, end_date)
+        jobs.append(growth_chart_job(row.custom_test_time_tickers.split(', '),
+                                     row.sharpe_test_time_tickers.split(', '),
+                                     TESTING_PERIOD, end_date, user))
+        jobs.append(risk_return_chart_job(metrics[key], row.time_horizon + TESTING_PERIOD,
+                                          row.sharpe_full_time_tickers.split(', '),
+                                          row.custom_full_time_tickers.split(', '), user))
+
+    paths = render_chart_batch(jobs, data, os.path.join(output_dir, CHARTS_DIR), processes)
+    charts = results[['time_horizon', 'growth', 'fluctuation', 'max_drawdown', 'min_etf_age',
+                      'risk_preference']].assign(growth_chart=paths[0::2], risk_return_chart=paths[1::2])
+    charts.to_parquet(os.path.join(output_dir, CHARTS_FILE), index=False)
+    return charts
+
+
+def export_sweep_to_excel(output_dir=SWEEP_OUTPUT_DIR,
+                          excel_path='~/Desktop/all_users_etf_overlap_and_tickers_1yr_test_with_top_15.xlsx'):
+    """
+    Optional post-processing step: writes a finished sweep to one Excel file.
+
+    Args:
+        output_dir (str, optional): The sweep directory. Defaults to `SWEEP_OUTPUT_DIR`.
+        excel_path (str, optional): The Excel file to write.
+
+    Returns:
+        pd.DataFrame: The exported rows.
+    """
+    df = load_sweep_results(output_dir)
+    # Excel cells cannot hold lists
+    df['risk_preference'] = df['risk_preference'].map(lambda value: str(list(value)))
+    df.to_excel(os.path.expanduser(excel_path), index=False)
     print(f"Saved results with {len(df)} rows to Excel.")
     return df
 
 
 if __name__ == "__main__":
-    generate_all_user_tests()
\ No newline at end of file
+    generate_all_user_tests()
@@ -0,0 +1,375 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib.dates as mdates
+import matplotlib.patches as mpatches
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from config.constants import (
+    USER_TIME_HORIZON, USER_DESIRED_GROWTH, USER_FLUCTUATION, USER_WORST_CASE, USER_MINIMUM_ETF_AGE,
+    USER_RISK_PREFERENCE, TRADING_DAYS_PER_YEAR, REPORT_PROCESSES, REPORT_CHUNK_SIZE
+)
+from core.data_processing.shared_prices import snapshot_version
+from visualization.graph_performance import rolling_annual_growth
+
+# Bump when the templates change, so content-addressed charts are redrawn
+TEMPLATE_REVISION = 1
+
+# Category colors shared with graph_performance / visualizing_etf_metrics
+GROWTH_CATEGORIES = [('In Both (Custom & Sharpe)', 'purple'), ('Custom Only', 'orange'), ('Sharpe Only', 'blue')]
+RISK_RETURN_CATEGORIES = {'Sharpe Only': 'blue', 'Utility Only': 'orange', 'Both': 'purple', 'Not Selected': 'grey'}
+
+
+def _profile(user):
+    # tolist() turns numpy scalars (e.g. from a Parquet sweep) into JSON-safe values
+    return {'horizon': np.asarray(user[USER_TIME_HORIZON]).tolist(),
+            'growth': np.asarray(user[USER_DESIRED_GROWTH]).tolist(),
+            'fluctuation': np.asarray(user[USER_FLUCTUATION]).tolist(),
+            'max_drawdown': np.asarray(user[USER_WORST_CASE]).tolist(),
+            'min_etf_age': np.asarray(user[USER_MINIMUM_ETF_AGE]).tolist(),
+            'risk_preference': np.asarray(user[USER_RISK_PREFERENCE]).tolist()}
+
+
+def growth_chart_job(custom_recommend_list, sharpe_recommend_list, test_period, end_date, user):
+    """
+    Describes one `graph_annual_growth_rate` chart for `render_chart_batch`.
+
+    Args:
+        custom_recommend_list (list): ETFs recommended by the custom utility score.
+        sharpe_recommend_list (list): ETFs recommended by the Sharpe ratio.
+        test_period (int): The duration of the test period in years.
+        end_date (pd.Timestamp): The end of the test period.
+        user (list): The profile, indexed by the USER_* constants.
+
+    Returns:
+        dict: A JSON-serializable job.
+    """
+    return {'kind': 'growth', 'custom': list(custom_recommend_list), 'sharpe': list(sharpe_recommend_list),
+            'test_period': int(test_period), 'end_date': str(pd.Timestamp(end_date).date()),
+            'profile': _profile(user)}
+
+
+def risk_return_chart_job(etf_metrics_df, time_horizon, sharpe_list, utility_list, user, title=None):
+    """
+    Describes one `plot_risk_return_user` chart for `render_chart_batch`.
+
+    The ETF points are copied into the job, so its output path changes
+    whenever the metrics do.
+
+    Args:
+        etf_metrics_df (pd.DataFrame): Metrics with a 'Ticker' column, as from `get_etf_data`.
+        time_horizon (int): Selects the 'Standard_Deviation_{n}Y' and
+                            'Annual_Growth_{n}Y' columns.
+        sharpe_list (list): ETFs recommended by the Sharpe ratio.
+        utility_list (list): ETFs recommended by the custom utility score.
+        user (list): The profile, indexed by the USER_* constants.
+        title (str, optional): The chart title. Defaults to the one used in `main.py`.
+
+    Returns:
+        dict: A JSON-serializable job.
+    """
+    std_col = f'Standard_Deviation_{time_horizon}Y'
+    growth_col = f'Annual_Growth_{time_horizon}Y'
+    points = etf_metrics_df.dropna(subset=[std_col, growth_col])
+    return {'kind': 'risk_return', 'sharpe': list(sharpe_list), 'utility': list(utility_list),
+            'time_horizon': int(time_horizon),
+            'title': title or f'ETF Risk-Return Space with User Profile (Time Horizon = {time_horizon}Y)',
+            'tickers': points['Ticker'].astype(str).tolist(),
+            'std': points[std_col].astype(float).round(6).tolist(),
+            'growth': points[growth_col].astype(float).round(6).tolist(),
+            'profile': _profile(user)}
+
+
+def chart_path(job, output_dir, data_version=''):
+    """
+    Returns the content-addressed PNG path of a job.
+
+    Args:
+        job (dict): A job from `growth_chart_job` or `risk_return_chart_job`.
+        output_dir (str): The chart directory.
+        data_version (str, optional): The price snapshot the chart is drawn from.
+
+    Returns:
+        str: '{output_dir}/{kind}_{hash}.png'; equal jobs on equal data share a path.
+    """
+    digest = hashlib.sha1(json.dumps([TEMPLATE_REVISION, data_version, job], sort_keys=True).encode())
+    return os.path.join(output_dir, f"{job['kind']}_{digest.hexdigest()[:16]}.png")
+
+
+def growth_curves(data, tickers, test_period, end_date):
+    """
+    Computes the rolling annual growth curves drawn by the growth charts.
+
+    Args:
+        data (pd.DataFrame): The 'Adj Close' price panel.
+        tickers (iterable): The ETFs to compute.
+        test_period (int): The duration of the test period in years.
+        end_date (pd.Timestamp): The end of the test period.
+
+    Returns:
+        dict: 'x' (matplotlib date numbers of the business days in the
+              window) and 'curves' ({ticker: np.ndarray} in percent; ETFs
+              without prices or a year of days are absent).
+    """
+    end_date = pd.Timestamp(end_date).normalize()
+    start_date = end_date - pd.DateOffset(years=test_period)
+    dates = pd.date_range(start=start_date, end=end_date, freq='B')
+    curves = {}
+    if len(dates) >= TRADING_DAYS_PER_YEAR:
+        for ticker in tickers:
+            if (ticker, 'Adj Close') not in data.columns:
+                continue
+            price_series = data[(ticker, 'Adj Close')].dropna().loc[start_date:end_date].reindex(dates).ffill()
+            curves[ticker] = rolling_annual_growth(price_series, TRADING_DAYS_PER_YEAR).to_numpy()
+    return {'x': mdates.date2num(dates.to_pydatetime()), 'curves': curves}
+
+
+def _profile_text(profile, bullet):
+    return (
+        f"User Profile:\n"
+        f"{bullet}Horizon: {profile['horizon']}y\n"
+        f"{bullet}Growth Goal: {profile['growth']}%\n"
+        f"{bullet}Std Dev: ±{profile['fluctuation']}%\n"
+        f"{bullet}Max Drawdown: {profile['max_drawdown']}%\n"
+        f"{bullet}Min ETF Age: {profile['min_etf_age']}y\n"
+        f"{bullet}Risk (Return:Risk): {profile['risk_preference'][1]}:{profile['risk_preference'][0]}"
+    )
+
+
+def _limits(values, margin=0.05):
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    low, high = (values.min(), values.max()) if len(values) else (0.0, 1.0)
+    pad = (high - low) * margin or 1.0
+    return low - pad, high + pad
+
+
+class _ChartTemplate:
+    # One figure per chart kind and worker. Rendering updates the data of
+    # pooled artists and hides the unused ones instead of building a figure;
+    # the layout is computed on the first render and then kept.
+
+    def __init__(self, figsize):
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.ax.grid(True)
+        self.pools = {}
+        self.laid_out = False
+
+    def pooled(self, name, count, create):
+        pool = self.pools.setdefault(name, [])
+        while len(pool) < count:
+            pool.append(create())
+        for artist in pool[count:]:
+            artist.set_visible(False)
+        for artist in pool[:count]:
+            artist.set_visible(True)
+        return pool[:count]
+
+    def save(self, path):
+        if not self.laid_out:
+            self.figure.tight_layout(rect=[0, 0, 0.85, 1])  # leave space on right for legend
+            # keep these positions; an active layout engine costs an extra draw per save
+            self.figure.set_layout_engine(None)
+            self.laid_out = True
+        staging = path + '.tmp.png'
+        self.figure.savefig(staging)
+        os.replace(staging, path)
+
+
+class _GrowthTemplate(_ChartTemplate):
+    # The layout of graph_performance.graph_annual_growth_rate
+
+    def __init__(self):
+        super().__init__((14, 7))
+        self.band = self.ax.axhspan(0, 1, color='green', alpha=0.15)
+        self.ax.xaxis_date()
+        self.ax.set_xlabel("Date")
+        self.ax.set_ylabel("Annual Growth Rate (%)")
+        self.profile = self.ax.text(
+            0.02, 0.98, '', transform=self.ax.transAxes, fontsize=9, va='top', ha='left',
+            bbox=dict(boxstyle="round,pad=0.4", facecolor="whitesmoke", edgecolor="gray", alpha=0.9))
+        self.legend_labels = None
+
+    def render(self, job, windows):
+        profile = job['profile']
+        window = windows[(job['test_period'], job['end_date'])]
+        x = window['x']
+
+        # Custom picks first, then Sharpe-only ones, each in rank order
+        custom, sharpe = job['custom'], job['sharpe']
+        drawn = []
+        for etf in list(dict.fromkeys(custom + sharpe)):
+            if etf not in window['curves']:
+                continue
+            in_custom, in_sharpe = etf in custom, etf in sharpe
+            category = 0 if in_custom and in_sharpe else (1 if in_custom else 2)
+            drawn.append((etf, category, window['curves'][etf]))
+
+        lines = self.pooled('lines', len(drawn), lambda: self.ax.plot([], [], alpha=0.8)[0])
+        labels = self.pooled('labels', len(drawn), lambda: self.ax.text(0, 0, '', fontsize=8, va='center', ha='left'))
+        seen = []
+        values = [profile['growth'] - 2, profile['growth'] + 2]
+        for line, label, (etf, category, curve) in zip(lines, labels, drawn):
+            color = GROWTH_CATEGORIES[category][1]
+            if category not in seen:
+                seen.append(category)
+            line.set_data(x, curve)
+            line.set_color(color)
+            # offset the end label by the number of categories so far, as graph_annual_growth_rate does
+            label.set_position((x[-1], curve[-1] + len(seen) * 0.3))
+            label.set_text(etf)
+            label.set_color(color)
+            label.set_visible(bool(np.isfinite(curve[-1])))
+            values.extend([np.nanmin(curve), np.nanmax(curve)] if np.isfinite(curve).any() else [])
+
+        self.band.set_y(profile['growth'] - 2)
+        self.band.set_height(4)
+        self.ax.set_xlim(x[0], x[-1])
+        self.ax.set_ylim(*_limits(values))
+        self.ax.set_title(f"Annual Growth Rate Results:\nAfter {profile['horizon']} years training "
+                          f"the recommended ETFs performance from each method.\n")
+        self.profile.set_text(_profile_text(profile, '• '))
+
+        # The legend lists the categories present, like the one-off chart
+        legend_labels = tuple(sorted(seen))
+        if legend_labels != self.legend_labels:
+            handles = [mpatches.Patch(color='green', alpha=0.15, label="User Ideal Growth")]
+            handles += [Line2D([], [], color=GROWTH_CATEGORIES[category][1], alpha=0.8,
+                               label=GROWTH_CATEGORIES[category][0]) for category in legend_labels]
+            self.ax.legend(handles=handles, loc='center left', bbox_to_anchor=(1, 0.5), fontsize=9,
+                           title="ETF Group")
+            self.legend_labels = legend_labels
+
+
+class _RiskReturnTemplate(_ChartTemplate):
+    # The layout of visualizing_etf_metrics.plot_risk_return_user
+
+    def __init__(self):
+        super().__init__((14, 8))
+        self.points = self.ax.scatter([], [], alpha=0.7)
+        self.user = self.ax.scatter([0], [0], color='red', s=100, edgecolor='black', label='User Profile')
+        self.ax.set_xlabel('Standard Deviation (Risk %)')
+        self.ax.set_ylabel('Annual Growth (%)')
+        patches = [mpatches.Patch(color=color, label=label) for label, color in RISK_RETURN_CATEGORIES.items()]
+        patches.append(Line2D([0], [0], marker='o', color='w', label='User Profile',
+                              markerfacecolor='red', markersize=10, markeredgecolor='black'))
+        self.ax.legend(handles=patches, loc='center left', bbox_to_anchor=(1.02, 0.5), fontsize=10)
+        self.profile = self.ax.text(
+            0.01, 0.98, '', transform=self.ax.transAxes, fontsize=10, va='top', ha='left',
+            bbox=dict(boxstyle="round,pad=0.5", facecolor="whitesmoke", edgecolor="gray", alpha=0.9))
+
+    def render(self, job, windows):
+        profile = job['profile']
+        sharpe, utility = set(job['sharpe']), set(job['utility'])
+        std = np.asarray(job['std'], dtype=float)
+        growth = np.asarray(job['growth'], dtype=float)
+        colors = []
+        for ticker in job['tickers']:
+            in_sharpe, in_util = ticker in sharpe, ticker in utility
+            colors.append(RISK_RETURN_CATEGORIES['Both'] if in_sharpe and in_util
+                          else RISK_RETURN_CATEGORIES['Utility Only'] if in_util
+                          else RISK_RETURN_CATEGORIES['Sharpe Only'] if in_sharpe
+                          else RISK_RETURN_CATEGORIES['Not Selected'])
+
+        self.points.set_offsets(np.column_stack([std, growth]) if len(std) else np.empty((0, 2)))
+        self.points.set_facecolor(colors)
+        self.points.set_edgecolor(colors)
+        self.user.set_offsets([[profile['fluctuation'], profile['growth']]])
+
+        # Label selected ETFs, ordered by risk with small vertical offsets
+        selected = sorted((s, g, ticker) for s, g, ticker in zip(std, growth, job['tickers'])
+                          if ticker in sharpe or ticker in utility)
+        y_offsets = np.linspace(-0.15, 0.15, len(selected))
+        labels = self.pooled('labels', len(selected), lambda: self.ax.text(0, 0, '', fontsize=8, ha='left', va='center'))
+        for label, (s, g, ticker), offset in zip(labels, selected, y_offsets):
+            label.set_position((s, g + offset))
+            label.set_text(ticker)
+
+        self.ax.set_xlim(*_limits(np.append(std, profile['fluctuation'])))
+        self.ax.set_ylim(*_limits(np.append(growth, profile['growth'])))
+        self.ax.set_title(job['title'])
+        self.profile.set_text(_profile_text(profile, ''))
+
+
+TEMPLATES = {'growth': _GrowthTemplate, 'risk_return': _RiskReturnTemplate}
+
+# Per worker process: kind -> template, and the growth-curve windows of the batch
+_worker_templates = {}
+_worker_windows = {}
+
+
+def _init_worker(windows):
+    _worker_windows.clear()
+    _worker_windows.update(windows)
+
+
+def _render_tasks(tasks):
+    rendered = 0
+    for job, path in tasks:
+        if os.path.exists(path):
+            continue
+        template = _worker_templates.get(job['kind'])
+        if template is None:
+            template = _worker_templates[job['kind']] = TEMPLATES[job['kind']]()
+        template.render(job, _worker_windows)
+        template.save(path)
+        rendered += 1
+    return rendered
+
+
+def render_chart_batch(jobs, data, output_dir, processes=REPORT_PROCESSES, chunk_size=REPORT_CHUNK_SIZE):
+    """
+    Renders many growth and risk-return charts on a process pool.
+
+    The charts look like those of `graph_annual_growth_rate` and
+    `plot_risk_return_user` but never touch pyplot: every worker draws on the
+    Agg canvas of one reusable figure per chart kind, updating its lines,
+    points and labels instead of rebuilding the axes. Growth curves are
+    computed once per ticker in this process and shared with the workers.
+    Each chart is written to `chart_path` (a hash of the job and the price
+    snapshot) with write-then-rename, so charts that already exist are
+    skipped and concurrent batches never clobber each other's files.
+
+    Args:
+        jobs (list): Jobs from `growth_chart_job` and `risk_return_chart_job`.
+        data (pd.DataFrame): The 'Adj Close' price panel the growth charts use.
+        output_dir (str): The chart directory, created if needed.
+        processes (int, optional): Worker processes. Defaults to
+                                   `REPORT_PROCESSES` (all CPUs when None).
+        chunk_size (int, optional): Jobs per task sent to a worker. Defaults
+                                    to `REPORT_CHUNK_SIZE`.
+
+    Returns:
+        list: The PNG path of every job, in order.
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    version = snapshot_version(data)
+    paths = [chart_path(job, output_dir, version) for job in jobs]
+
+    pending = list(dict((path, job) for job, path in zip(jobs, paths) if not os.path.exists(path)).items())
+    tickers = {}
+    for _, job in pending:
+        if job['kind'] == 'growth':
+            tickers.setdefault((job['test_period'], job['end_date']), set()).update(job['custom'] + job['sharpe'])
+    windows = {window: growth_curves(data, sorted(members), *window) for window, members in tickers.items()}
+
+    tasks = [[(job, path) for path, job in pending[i:i + chunk_size]] for i in range(0, len(pending), chunk_size)]
+    rendered = 0
+    if tasks:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(windows,)) as pool:
+            rendered = sum(pool.map(_render_tasks, tasks))
+    print(f"Rendered {rendered} charts ({len(jobs) - len(pending)} already present) to {output_dir} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return paths
@@ -3,6 +3,46 @@ import matplotlib.colors as mcolors
 import pandas as pd
 import numpy as np
 
+
+def rolling_annual_growth(price_series, window=252):
+    """
+    Computes the rolling annual growth rate from the slope of log prices.
+
+    Equivalent to fitting `np.polyfit(range(window), log_prices, 1)` on every
+    window, but the least-squares slope of each window comes from running
+    sums of y and k * y, so a long series costs a few array passes instead of
+    one fit per day.
+
+    Args:
+        price_series (pd.Series): Prices on a regular (business-day) index.
+        window (int, optional): Days per fit. Defaults to 252 (one year).
+
+    Returns:
+        pd.Series: Annual growth in percent, NaN until a full window without
+                   missing prices is available.
+    """
+    y = np.log(price_series.to_numpy(dtype=float))
+    n = len(y)
+    result = np.full(n, np.nan)
+    if n >= window:
+        missing = np.isnan(y)
+        filled = np.where(missing, 0.0, y)
+        k = np.arange(n)
+        zero = np.zeros(1)
+        sum_y = np.concatenate([zero, np.cumsum(filled)])
+        sum_ky = np.concatenate([zero, np.cumsum(k * filled)])
+        gaps = np.concatenate([zero, np.cumsum(missing)])
+
+        end = np.arange(window, n + 1)  # window covers rows end-window .. end-1
+        window_y = sum_y[end] - sum_y[end - window]
+        # sum over the window of (x - mean x) * y, with x = 0 .. window-1
+        centred = (sum_ky[end] - sum_ky[end - window]) - (end - window + (window - 1) / 2) * window_y
+        slope = centred / (window * (window ** 2 - 1) / 12)
+        complete = (gaps[end] - gaps[end - window]) == 0
+        result[window - 1:] = np.where(complete, (np.exp(slope * 252) - 1) * 100, np.nan)
+    return pd.Series(result, index=price_series.index)
+
+
 def graph_annual_growth_rate(
     data, 
     custom_recommend_list, 
@@ -13,7 +53,8 @@ def graph_annual_growth_rate(
     user_std_pct,
     user_max_drawdown,
     user_etf_age,
-    user_risk_pref
+    user_risk_pref,
+    output_path='etf_risk_return.png'
 ):
     """
     Graphs the rolling annual growth rate of recommended ETFs and compares them to user goals.
@@ -40,10 +81,13 @@ def graph_annual_growth_rate(
         user_max_drawdown (int): The user's maximum tolerated drawdown in percentage.
         user_etf_age (int): The minimum age of an ETF to be considered.
         user_risk_pref (list): The risk-return preference weights of the user.
+        output_path (str, optional): Where to save the PNG. Defaults to
+            'etf_risk_return.png'; use a distinct path per call when charts
+            are rendered concurrently (see `visualization.batch_reports`).
 
     Returns:
-        None: This function displays a plot and saves it as 'etf_risk_return.png',
-            but it does not return a value.
+        None: This function saves the plot to `output_path`, but it does not
+            return a value.
     """
     today = pd.Timestamp.now().normalize()
     start_date = today - pd.DateOffset(years=test_period)
@@ -94,17 +138,9 @@ def graph_annual_growth_rate(
             print(f"[!] Not enough data for {etf}, skipping.")
             continue
 
-        # Calculate rolling annual growth rate (year-over-year slope)
-        # Using 252 trading days = 1 year approx
-        window = 252
-        log_prices = np.log(price_series)
-        rolling_slope = (
-            log_prices.rolling(window=window)
-            .apply(lambda x: np.polyfit(range(len(x)), x, 1)[0] * 252, raw=True)
-        )
-
-        # Convert slope of log price to annual growth % (exp(slope) - 1)*100
-        annual_growth_rate = (np.exp(rolling_slope) - 1) * 100
+        # Rolling annual growth rate from the year-over-year slope of log prices
+        # (252 trading days = 1 year approx), converted to % as (exp(slope) - 1)*100
+        annual_growth_rate = rolling_annual_growth(price_series)
         if not annual_growth_rate.empty:
             latest_growth = annual_growth_rate.iloc[-1]
             print(f"{etf}: {latest_growth:.2f}% annual growth")
@@ -150,5 +186,5 @@ def graph_annual_growth_rate(
     )
 
     plt.tight_layout(rect=[0, 0, 0.85, 1])  # leave space on right for legend
-    plt.savefig('etf_risk_return.png')
+    plt.savefig(output_path)
     plt.close()
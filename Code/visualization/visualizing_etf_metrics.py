@@ -12,7 +12,8 @@ def plot_risk_return_user(
     utility_list,
     user_risk_ratio,
     user_min_etf_age,
-    user_max_drawdown
+    user_max_drawdown,
+    output_path='user_etf_risk_return.png'
 ):
     """
     Creates a scatter plot visualizing the risk and return of ETFs, benchmarked against a user's profile.
@@ -39,10 +40,13 @@ def plot_risk_return_user(
             weighted preference for return versus risk.
         user_min_etf_age (int): The minimum age in years for an ETF to be considered.
         user_max_drawdown (float): The user's maximum tolerated drawdown in percentage.
+        output_path (str, optional): Where to save the PNG. Defaults to
+            'user_etf_risk_return.png'; use a distinct path per call when charts
+            are rendered concurrently (see `visualization.batch_reports`).
 
     Returns:
-        None: This function displays a plot and saves it as 'etf_risk_return.png',
-            but it does not return a value.
+        None: This function saves the plot to `output_path`, but it does not
+            return a value.
     """
 
     std_col = f'Standard_Deviation_{time_horizon}Y'
@@ -121,5 +125,5 @@ def plot_risk_return_user(
 
     # Adjust layout to fit legend on right
     plt.tight_layout(rect=[0, 0, 0.85, 1])
-    plt.savefig('user_etf_risk_return.png')
+    plt.savefig(output_path)
     plt.close()
\ No newline at end of file
@@ -3,16 +3,17 @@ import pandas as pd
 from datetime import datetime
 import plotly.graph_objects as go
 
-from core.data_processing.ishares_ETF_list import download_valid_data
-from core.data_processing.etf_data import get_etf_data
-from core.analysis.max_drawdown import calculate_max_drawdown
-from core.data_processing.risk_free_rates import fetch_risk_free_boc
+from core.data_processing.shared_prices import get_shared_price_data, refresh_metrics, PRICES
+from core.data_processing.risk_free_rates import get_risk_free_snapshot
 from config.constants import (
     USER_TIME_HORIZON, USER_DESIRED_GROWTH, USER_FLUCTUATION,
-    USER_WORST_CASE, USER_MINIMUM_ETF_AGE
+    USER_WORST_CASE, USER_MINIMUM_ETF_AGE, RECOMMENDATION_COUNT, DCA_MONTHLY_CONTRIBUTION,
+    MAX_UNDERWATER_OPTIONS, TIME_HORIZON_OPTIONS, DESIRED_GROWTH_OPTIONS, FLUCTUATION_OPTIONS,
+    WORSE_CASE_OPTIONS, MINIMUM_ETF_AGE_OPTIONS
 )
-from core.scoring.sharpe_recommendation import sharpe_score
-from visuals.etf_performance import create_etf_performance_chart
+from core.scoring.scorer_registry import SCORERS, DISTRIBUTION_STATISTICS
+from core.scoring.recommendation_pipeline import new_memo, run_pipeline
+from visuals.etf_performance import create_etf_performance_chart, create_underwater_chart
 
 # Global styles
 st.markdown("""
@@ -39,6 +40,8 @@ if 'step' not in st.session_state:
     st.session_state.step = 0
 if 'user_profile' not in st.session_state:
     st.session_state.user_profile = [None] * 6
+if 'pipeline_memo' not in st.session_state:
+    st.session_state.pipeline_memo = new_memo()
 
 
 # ---------- STEP 0: Intro ----------
@@ -61,13 +64,6 @@ if st.session_state.step == 0:
             st.session_state.step = 1
             st.rerun()
 
-# Options for all questions
-time_horizon_options = [1, 4, 8, 15, 25]
-desired_growth_options = [2, 5, 10, 16, 21]
-fluctuation_options = [5, 10, 15, 20, 35]
-worse_case_options = [15, 25, 35, 45, 100]
-minimum_etf_age_options = [10, 5, 3, 1, 0]
-
 # ---------- QUESTION STEPS ----------
 if 1 <= st.session_state.step <= 5:
     progress = (st.session_state.step - 1) / 5
@@ -100,7 +96,7 @@ if st.session_state.step == 1:
             if choice == "Select a Time Horizon":
                 st.warning("Please select a time horizon.")
             else:
-                st.session_state.user_profile[USER_TIME_HORIZON] = time_horizon_options[choice-1]
+                st.session_state.user_profile[USER_TIME_HORIZON] = TIME_HORIZON_OPTIONS[choice-1]
                 st.session_state.step = 2
                 st.rerun()
 
@@ -135,7 +131,7 @@ elif st.session_state.step == 2:
             if choice == "Select Growth Goal":
                 st.warning("Please select a growth goal.")
             else:
-                st.session_state.user_profile[USER_DESIRED_GROWTH] = desired_growth_options[choice-1]
+                st.session_state.user_profile[USER_DESIRED_GROWTH] = DESIRED_GROWTH_OPTIONS[choice-1]
                 st.session_state.step = 3
                 st.rerun()
 
@@ -169,7 +165,7 @@ elif st.session_state.step == 3:
             if choice == "Select Fluctuation Tolerance":
                 st.warning("Please select fluctuation tolerance.")
             else:
-                st.session_state.user_profile[USER_FLUCTUATION] = fluctuation_options[choice-1]
+                st.session_state.user_profile[USER_FLUCTUATION] = FLUCTUATION_OPTIONS[choice-1]
                 st.session_state.step = 4
                 st.rerun()
 
@@ -200,7 +196,7 @@ elif st.session_state.step == 4:
             if choice=="Select Max Loss Tolerance":
                 st.warning("Please select a maximum loss tolerance.")
             else:
-                st.session_state.user_profile[USER_WORST_CASE] = worse_case_options[choice-1]
+                st.session_state.user_profile[USER_WORST_CASE] = WORSE_CASE_OPTIONS[choice-1]
                 st.session_state.step = 5
                 st.rerun()
 
@@ -232,26 +228,44 @@ elif st.session_state.step == 5:
             if choice=="Select ETF Age Minimum":
                 st.warning("Please select an ETF age minimum.")
             else:
-                st.session_state.user_profile[USER_MINIMUM_ETF_AGE] = minimum_etf_age_options[choice-1]
+                st.session_state.user_profile[USER_MINIMUM_ETF_AGE] = MINIMUM_ETF_AGE_OPTIONS[choice-1]
                 st.session_state.step = 6
                 st.rerun()
 
 # Step 6: Recommendations
 elif st.session_state.step == 6:
     st.subheader("🎯 Your Personalized ETF Recommendations")
+    ranking_method = st.selectbox("Rank ETFs by", list(SCORERS), key="ranking_method")
+    diversify = st.checkbox("Avoid near-duplicate ETFs (diversified basket)", key="diversify")
+    max_underwater = st.selectbox("Longest you could wait for an ETF to get back to a previous high",
+                                  [None] + MAX_UNDERWATER_OPTIONS,
+                                  format_func=lambda x: "No limit" if x is None else f"{x} year{'s' if x > 1 else ''}",
+                                  key="max_underwater")
     with st.spinner("Generating recommendations..."):
         try:
             user = st.session_state.user_profile
-            valid_tickers, data = download_valid_data()
+            valid_tickers, data = get_shared_price_data()
             end_date = pd.Timestamp(datetime.now())
-            md_tolerable_list = calculate_max_drawdown(
-                user[USER_WORST_CASE], user[USER_MINIMUM_ETF_AGE], valid_tickers, data, end_date
-            )
-            etf_metrics = get_etf_data(md_tolerable_list, user[USER_TIME_HORIZON], data, end_date, min_etf_age=user[USER_MINIMUM_ETF_AGE])
-            risk_free_data = fetch_risk_free_boc("1995-01-01")
-            etf_sharpe = sharpe_score(etf_metrics, user[USER_TIME_HORIZON], risk_free_data)
+            risk_free_data = get_risk_free_snapshot()
+            options = {'ranking_method': ranking_method, 'diversify': diversify,
+                       'max_underwater_years': max_underwater}
+
+            def run_stages(*targets):
+                # Only the stages whose answers changed since the last rerun are recomputed
+                return run_pipeline(targets, user, valid_tickers, data, end_date, risk_free_data,
+                                    st.session_state.pipeline_memo, options)
+
+            etf_ranked = run_stages('ranked')['ranked']
 
             st.success("✅ Analysis complete!")
+            price_status = refresh_metrics()[PRICES]
+            if price_status['age_seconds'] is not None:
+                st.caption(f"Market data updated {price_status['age_seconds'] / 3600:.0f} hours ago"
+                           + (" (a newer download is in progress)" if price_status['refreshing'] else "."))
+            memory = price_status['ingest_memory']
+            if memory is not None:
+                st.caption(f"Prices held in {memory['lean_bytes'] / 2**20:.1f} MB ({memory['dtype']}), "
+                           f"{memory['saved_pct']:.0f}% less than the full download.")
 
             st.subheader("📈 Recommendations")
             
@@ -265,28 +279,126 @@ elif st.session_state.step == 6:
             Minimum Age ETF: **{user[USER_MINIMUM_ETF_AGE]}**y
             """, unsafe_allow_html=True)
 
-            if not etf_sharpe.empty:
-                st.plotly_chart(create_etf_performance_chart(etf_sharpe, data,
-                                                            f"Top 5 ETFs:"), use_container_width=True)
+            if not etf_ranked.empty:
+                st.plotly_chart(create_etf_performance_chart(etf_ranked, data,
+                                                            f"Top {RECOMMENDATION_COUNT} ETFs by {ranking_method}:"), use_container_width=True)
             else:
-                st.warning("No Sharpe-based ETFs found.")
+                st.warning(f"No {ranking_method}-based ETFs found.")
 
             st.subheader("📊 Detailed Metrics")
             growth_col = f'Annual_Growth_{user[USER_TIME_HORIZON]}Y'
             std_col = f'Standard_Deviation_{user[USER_TIME_HORIZON]}Y'
 
-            if not etf_sharpe.empty:
-                sharpe_simple = etf_sharpe[['Ticker', growth_col, std_col]].reset_index(drop=True)
-                sharpe_simple.columns = ['Ticker','Annual Growth (%)','Standard Deviation (%)']
+            if not etf_ranked.empty:
+                score_col = SCORERS[ranking_method]['column']
+                ranked_simple = etf_ranked[['Ticker', growth_col, std_col, score_col]].reset_index(drop=True)
+                ranked_simple.columns = ['Ticker','Annual Growth (%)','Standard Deviation (%)', ranking_method]
 
-                st.dataframe(sharpe_simple, use_container_width=True)
+                st.dataframe(ranked_simple, use_container_width=True)
+                if set(SCORERS[ranking_method]['requires']) & set(DISTRIBUTION_STATISTICS):
+                    st.caption(f"{ranking_method}: annual growth over every past {user[USER_TIME_HORIZON]}-year "
+                               f"window of the ETF's history, not just the latest one.")
             else:
                 st.write("No data available")
 
-            if st.button("Start Over", key="restart"):
-                st.session_state.step = 0
-                st.session_state.user_profile = [None]*6
-                st.rerun()
+            if not etf_ranked.empty:
+                st.subheader("📉 Drops and Recoveries")
+                drawdowns = run_stages('drawdowns')['drawdowns']
+                summary = drawdowns['summary']
+                fell = summary['Peak_Date'].notna()
+                drawdown_table = pd.DataFrame({
+                    'Worst Drop (%)': summary['Max_Drawdown'],
+                    'Peak': summary['Peak_Date'].dt.strftime('%Y-%m-%d').where(fell, "-"),
+                    'Bottom': summary['Trough_Date'].dt.strftime('%Y-%m-%d').where(fell, "-"),
+                    'Recovered': summary['Recovery_Date'].dt.strftime('%Y-%m-%d').fillna("Not yet").where(fell, "-"),
+                    'Years to Recover': summary['Recovery_Years'],
+                    'Longest Time Below a High (y)': summary['Max_Underwater_Years'],
+                    'Below High Now (%)': summary['Current_Drawdown'],
+                }).round(1)
+                st.dataframe(drawdown_table, use_container_width=True)
+                st.plotly_chart(create_underwater_chart(drawdowns['underwater'],
+                                                        "How far each ETF was below its previous high"),
+                                use_container_width=True)
+                st.caption("The worst drop runs from the peak to the bottom; recovery is the first close back "
+                           "at the peak. The longest time below a high counts any drop, including one that "
+                           "has not recovered yet.")
+
+            with st.expander("🔍 Why wasn't an ETF recommended?"):
+                explanations = run_stages('rejections')['rejections']
+                ticker = st.selectbox("Look up an ETF", explanations['Ticker'], index=None,
+                                      placeholder="Choose a ticker", key="explain_ticker")
+                if ticker is not None:
+                    st.info(f"**{ticker}**: {explanations.set_index('Ticker').at[ticker, 'Explanation']}")
+                rejected = explanations[~explanations['Recommended']]
+                st.dataframe(rejected[['Ticker', 'Explanation']], use_container_width=True, hide_index=True)
+
+            if not etf_ranked.empty and st.checkbox("Show how stable this recommendation is", key="sensitivity"):
+                st.subheader("🧭 Recommendation Stability")
+                stability = run_stages('stability')['stability']['neighbors']
+                st.caption(f"{int(stability['Unchanged'].sum())} of {len(stability)} neighboring answers "
+                           f"give the same {RECOMMENDATION_COUNT} ETFs.")
+                stability = stability.assign(Answer=stability['Answer'].astype(str))
+                st.dataframe(stability[['Question', 'Answer', 'Overlap', 'Added', 'Removed']],
+                             use_container_width=True, hide_index=True)
+
+            st.subheader("💼 Suggested Portfolio Weights")
+            weights = run_stages('weights')['weights'].copy()  # renamed below; keep the memoized frame intact
+            if not weights.empty:
+                weights.columns = ['Ticker', 'Lowest Risk (%)', 'Best Risk-Adjusted (%)',
+                                   f'Matches {user[USER_FLUCTUATION]}% Fluctuation (%)']
+                st.dataframe(weights.round(1), use_container_width=True)
+            else:
+                st.write("No data available")
+
+            if not etf_ranked.empty:
+                st.subheader("🔮 Possible Outcomes")
+                outcomes = run_stages('outcomes')['outcomes']
+                col1, col2 = st.columns(2)
+                col1.metric(f"Chance of reaching {user[USER_DESIRED_GROWTH]}% a year",
+                            f"{outcomes['prob_desired_growth']:.0%}")
+                col2.metric(f"Chance of a drop worse than {user[USER_WORST_CASE]}%",
+                            f"{outcomes['prob_worst_case_breach']:.0%}")
+                outcome_table = pd.DataFrame({
+                    'Annual Growth (%)': outcomes['annual_growth'],
+                    'Value of $1,000': outcomes['final_value'] * 1000,
+                    'Worst Drop (%)': outcomes['max_drawdown'],
+                }).round(1)
+                outcome_table.index = [f"{p}th percentile" for p in outcome_table.index]
+                st.dataframe(outcome_table, use_container_width=True)
+                st.caption(f"Simulated by resampling monthly blocks of the basket's past daily returns "
+                           f"over {user[USER_TIME_HORIZON]} years.")
+
+                st.subheader("📅 Investing Monthly")
+                dca = run_stages('dca')['dca']
+                months = 12 * user[USER_TIME_HORIZON]
+                if dca['Start_Months'].max() > 0:
+                    percentiles = [int(col[len('Return_P'):]) for col in dca.columns if col.startswith('Return_P')]
+                    dca_table = pd.DataFrame({
+                        f"{p}th percentile": [
+                            f"{row[f'Return_P{p}']:.1f}% / ${row[f'Multiple_P{p}'] * months * DCA_MONTHLY_CONTRIBUTION:,.0f}"
+                            if row['Start_Months'] else "-"
+                            for _, row in dca.iterrows()]
+                        for p in percentiles
+                    }, index=dca.index)
+                    dca_table.insert(0, 'Start Months', dca['Start_Months'])
+                    st.dataframe(dca_table, use_container_width=True)
+                    st.caption(f"Annual money-weighted return / final value of ${DCA_MONTHLY_CONTRIBUTION} "
+                               f"invested at every month-end for {user[USER_TIME_HORIZON]} years "
+                               f"(${months * DCA_MONTHLY_CONTRIBUTION:,} in total), over every past start month. "
+                               f"The basket splits each contribution equally.")
+                else:
+                    st.write(f"Not enough history for {user[USER_TIME_HORIZON]} years of monthly investing.")
+
+            col1, col2, col3 = st.columns([1,1,1])
+            with col1:
+                if st.button("Back", key="back6"):
+                    st.session_state.step = 5
+                    st.rerun()
+            with col3:
+                if st.button("Start Over", key="restart"):
+                    st.session_state.step = 0
+                    st.session_state.user_profile = [None]*6
+                    st.rerun()
 
         except Exception as e:
             st.error(f"❌ An error occurred: {str(e)}")
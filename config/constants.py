@@ -1,4 +1,6 @@
 """Configuration constants for the ETF recommendation system."""
+import os
+import tempfile
 
 # User profile indices
 USER_TIME_HORIZON = 0
@@ -11,11 +13,117 @@ USER_RISK_PREFERENCE = 5
 # Time horizon options
 TIME_HORIZON_OPTIONS = [1, 4, 8, 15, 25]
 DESIRED_GROWTH_OPTIONS = [2, 5, 10, 16, 21]
-FLUCTUATION_OPTIONS = [5, 10, 15, 20, 60]
+FLUCTUATION_OPTIONS = [5, 10, 15, 20, 35]
 WORSE_CASE_OPTIONS = [15, 25, 35, 45, 100]
 MINIMUM_ETF_AGE_OPTIONS = [10, 5, 3, 1, 0]
 RISK_PREFERENCE_OPTIONS = [[3, 1], [2, 1], [1, 1], [1, 2], [1, 3]]
 
 TESTING_PERIOD = 3
+TRADING_DAYS_PER_YEAR = 252
 RECOMMENDATION_COUNT = 5
 TOP_RANGE_RECOMMENDATIONS = 15
+
+# Custom utility score (see core/scoring/custom_score.py)
+UTILITY_EXCESS_GROWTH_WEIGHT = 0.5  # value of growth beyond the user's goal
+UTILITY_EXCESS_RISK_PENALTY = 1.0  # extra cost of volatility beyond the user's tolerance
+
+# Data ingest
+INGEST_CHUNK_SIZE = 40
+PRICE_DTYPE = 'float64'  # 'float32' halves the cached panel, see download_valid_data
+OHLCV_FIELD_COUNT = 6
+
+# Shared memory-mapped price matrix (one copy per host for all app workers)
+SHARED_PRICE_DIR = os.environ.get(
+    'ETF_SHARED_PRICE_DIR', os.path.join(tempfile.gettempdir(), 'etf_shared_prices'))
+SHARED_PRICE_REFRESH_SECONDS = 86400
+SHARED_PRICE_KEEP_VERSIONS = 2
+SNAPSHOT_RETENTION_DAYS = 30  # older snapshots beyond the kept versions are deleted
+RISK_FREE_REFRESH_SECONDS = 604800
+SNAPSHOT_REFRESH_RETRY_SECONDS = 300  # wait after a failed background refresh
+# Record/replay fetch fixtures (see core/data_processing/fixtures.py)
+FETCH_MODE = os.environ.get('ETF_FETCH_MODE', 'live')  # 'live', 'record' or 'replay'
+FIXTURE_DIR = os.environ.get(
+    'ETF_FIXTURE_DIR', os.path.join(os.path.expanduser('~'), 'etf_fixtures'))
+FIXTURE_SCALE = int(os.environ.get('ETF_FIXTURE_SCALE', '1'))  # universe multiplier in replay mode
+FIXTURE_SYNTHETIC_NOISE = 0.5  # extra noise of a synthetic copy, relative to its source's volatility
+# Upstream fetch layer (see core/data_processing/http_client.py)
+BOC_VALET_URL = os.environ.get('ETF_BOC_VALET_URL', 'https://www.bankofcanada.ca/valet')
+HTTP_CONNECT_TIMEOUT = 3.05  # seconds
+HTTP_READ_TIMEOUT = 10
+HTTP_POOL_SIZE = 10
+FETCH_ATTEMPTS = 3
+FETCH_BACKOFF_BASE = 0.5  # seconds, doubled per attempt with full jitter
+FETCH_BACKOFF_MAX = 4
+CIRCUIT_FAILURE_THRESHOLD = 3  # consecutive failures before the circuit opens
+CIRCUIT_RESET_SECONDS = 60  # open time before one trial request is let through
+# Pin a content hash to rerun against an exact snapshot (e.g. for backtests)
+PINNED_PRICE_SNAPSHOT = os.environ.get('ETF_PRICE_SNAPSHOT')
+PINNED_RISK_FREE_SNAPSHOT = os.environ.get('ETF_RISK_FREE_SNAPSHOT')
+
+# Diversified basket selection (see core/scoring/diversification.py)
+MAX_BASKET_CORRELATION = 0.9
+COVARIANCE_SHRINKAGE_PRIOR = 60  # pseudo-days of zero correlation
+
+# Portfolio weighting (see core/analysis/portfolio_weights.py)
+FRONTIER_RISK_AVERSIONS = [0.5, 1, 2, 3, 5, 8, 12, 20, 35, 60, 100]
+PORTFOLIO_SOLVER_ITERATIONS = 300
+MIN_DISPLAY_WEIGHT_PCT = 0.5
+
+# Monte Carlo outcome simulation (see core/analysis/monte_carlo.py)
+MONTE_CARLO_PATHS = 100_000
+MONTE_CARLO_BLOCK_DAYS = 21
+MONTE_CARLO_CHUNK_PATHS = 25_000
+MONTE_CARLO_PERCENTILES = [5, 25, 50, 75, 95]
+MONTE_CARLO_SEED = 2024
+
+# Dollar-cost averaging (see core/analysis/dollar_cost_averaging.py)
+DCA_MONTHLY_CONTRIBUTION = 100  # dollars, for display
+DCA_IRR_ITERATIONS = 50
+
+# Rolling horizon-return distributions (see core/analysis/rolling_returns.py)
+ROLLING_PERCENTILES = [10, 25, 50, 75, 90]  # the 10th is the worst decile
+ROLLING_CACHE_ENTRIES = 8  # horizons kept for the current snapshot
+
+# Drawdown analytics (see core/analysis/drawdowns.py)
+MAX_UNDERWATER_OPTIONS = [1, 2, 3, 5]  # years below a previous high the user can wait out
+DRAWDOWN_CACHE_ENTRIES = 2  # windows kept for the current snapshot; each holds a dates x tickers curve
+
+# Rebalancing backtests (see core/analysis/rebalancing.py)
+REBALANCE_POLICIES = ['Buy and hold', 'Monthly', 'Quarterly', 'Threshold']
+REBALANCE_THRESHOLD = 0.05  # absolute weight drift that triggers a threshold rebalance
+TRADE_COST_BPS = 5  # commissions and fees per traded dollar
+SPREAD_BPS = 10  # quoted bid-ask spread; half of it is paid on every trade
+
+# Ingest data-quality checks (see core/data_processing/data_quality.py)
+QUALITY_SPIKE_MIN_MOVE = 0.15  # daily move that is checked for a reversal
+QUALITY_SPIKE_REVERSAL = 0.7  # share of the move undone the next day
+QUALITY_STALE_RUN = 5  # identical prices in a row
+QUALITY_SPLIT_FACTORS = [2, 3, 4, 5, 10]
+QUALITY_SPLIT_TOLERANCE = 0.03
+
+# Multi-resolution price pyramid (see core/data_processing/price_pyramid.py)
+PYRAMID_PERIODS = {'weekly': 'W-FRI', 'monthly': 'M'}
+PERIODS_PER_YEAR = {'daily': TRADING_DAYS_PER_YEAR, 'weekly': 52, 'monthly': 12}
+PYRAMID_VOLATILITY_TOLERANCE = 0.04  # relative standard error of the volatility estimate
+PYRAMID_CHART_MAX_POINTS = 600
+
+# Resumable profile sweep (see Code/testing/test_all_user_profiles.py)
+SWEEP_OUTPUT_DIR = os.environ.get(
+    'ETF_SWEEP_DIR', os.path.join(os.path.expanduser('~'), 'etf_profile_sweep'))
+SWEEP_BATCH_SIZE = 10  # profiles per Parquet part file
+
+# Concurrent-session load test (see Code/testing/load_test_app.py)
+LOAD_TEST_CONCURRENCY = [1, 2, 4, 8]  # simultaneous sessions per level
+LOAD_TEST_SESSIONS_PER_WORKER = 3
+LOAD_TEST_SCRIPT_TIMEOUT = 300  # seconds per script run
+LOAD_TEST_SEED = 7
+
+# Batch chart rendering (see Code/visualization/batch_reports.py)
+REPORT_PROCESSES = None  # worker processes; None uses every CPU
+REPORT_CHUNK_SIZE = 8  # charts per task sent to a worker
+
+# Indexed ETF screener (see core/analysis/screener.py)
+SCREENER_HORIZONS = [1, 3, 4, 5, 8, 10, 15, 25]
+
+# Memoized recommendation pipeline (see core/scoring/recommendation_pipeline.py)
+PIPELINE_MEMO_ENTRIES = 4  # results kept per stage and session
@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
+from config.constants import MONTE_CARLO_PERCENTILES, DCA_IRR_ITERATIONS
+from core.data_processing.price_pyramid import get_price_pyramid
+
+BASKET = 'Basket'
+
+
+def monthly_irr(final_value, n_months, iterations=DCA_IRR_ITERATIONS):
+    """
+    Solves the money-weighted monthly return of a DCA plan for many plans at once.
+
+    A plan invests 1 at the start of each of `n_months` months and is worth
+    `final_value` after the last month, so its growth factor x = 1 + r solves
+        x + x**2 + ... + x**n_months = final_value.
+    Newton's method runs on all plans together; the left side is increasing
+    in x, so it converges from the guess that the money was invested for
+    half the period on average.
+
+    Args:
+        final_value (np.ndarray): Final value per plan, in contributions; any shape.
+        n_months (int): The number of contributions.
+        iterations (int, optional): Newton steps. Defaults to `DCA_IRR_ITERATIONS`.
+
+    Returns:
+        np.ndarray: The monthly rate r per plan (NaN where the value is not positive).
+    """
+    value = np.asarray(final_value, dtype=float)
+    shape = value.shape
+    value = value.ravel()
+    powers = np.arange(1, n_months + 1)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (value / n_months) ** (2 / (n_months + 1))
+        for _ in range(iterations):
+            terms = x ** powers
+            step = (terms.sum(axis=0) - value) / (powers * terms / x).sum(axis=0)
+            x = np.maximum(x - step, x / 2)  # stay positive on overshoots
+    return np.where(value > 0, x - 1, np.nan).reshape(shape)
+
+
+def dca_outcomes(price_data, tickers, time_horizon, end_date=None, percentiles=MONTE_CARLO_PERCENTILES):
+    """
+    Simulates monthly investing into each ETF and into their equal-weight
+    basket, for every historical start month at once.
+
+    Contributions buy at month-end prices (the 'monthly' pyramid level). With
+    S the running sum of 1 / price, a plan started in month s that buys for
+    n = 12 * `time_horizon` months holds S[s + n] - S[s] units per dollar of
+    monthly contribution and is valued at the price of month s + n, so every
+    start month comes from two shifted slices of S instead of a loop. Only
+    start months where the ETF (or every basket member) has all n + 1
+    month-end prices are used. The basket splits each contribution equally.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        tickers (list): The ETFs, e.g. the recommended basket.
+        time_horizon (int): Years of monthly contributions.
+        end_date (pd.Timestamp, optional): The last valuation date. Defaults to
+                                           the end of the panel.
+        percentiles (list, optional): Percentiles to report. Defaults to
+                                      `MONTE_CARLO_PERCENTILES`.
+
+    Returns:
+        pd.DataFrame: One row per ticker plus a 'Basket' row, with the number
+                      of 'Start_Months', percentiles of the annualized
+                      money-weighted return ('Return_P{p}', percent) and of
+                      the final value per dollar contributed ('Multiple_P{p}').
+                      Percentiles are NaN when no start month has the history.
+    """
+    monthly = get_price_pyramid(price_data)['monthly']
+    monthly = monthly.loc[:end_date, [(ticker, 'Adj Close') for ticker in tickers]]
+    prices = monthly.to_numpy(dtype=float)
+    n = 12 * time_horizon
+    n_starts = len(prices) - n
+
+    columns = ['Start_Months'] + [f'Return_P{p}' for p in percentiles] + [f'Multiple_P{p}' for p in percentiles]
+    index = list(tickers) + [BASKET]
+    if n_starts <= 0 or not len(tickers):
+        return pd.DataFrame(np.nan, index=index, columns=columns).assign(Start_Months=0)
+
+    valid = ~np.isnan(prices)
+    with np.errstate(divide='ignore'):
+        units = np.vstack([np.zeros((1, len(tickers))), np.cumsum(np.where(valid, 1 / prices, 0.0), axis=0)])
+    missing = np.vstack([np.zeros((1, len(tickers)), dtype=int), np.cumsum(~valid, axis=0)])
+
+    # Units bought in months s .. s+n-1, the valuation price of month s+n, and
+    # whether all n + 1 prices exist, for every start month s at once
+    bought = units[n:n + n_starts] - units[:n_starts]
+    final_price = prices[n:n + n_starts]
+    complete = (missing[n + 1:n + 1 + n_starts] - missing[:n_starts]) == 0
+
+    value = np.where(complete, bought * final_price, np.nan)
+    basket = np.where(complete.all(axis=1), value.mean(axis=1), np.nan)
+    value = np.column_stack([value, basket])  # per dollar contributed each month: / n below
+
+    multiple = value / n
+    annual_return = ((1 + monthly_irr(np.nan_to_num(value, nan=-1.0), n)) ** 12 - 1) * 100
+    annual_return[np.isnan(value)] = np.nan
+
+    def spread(values):
+        result = np.full((len(percentiles), values.shape[1]), np.nan)
+        usable = ~np.isnan(values).all(axis=0)
+        if usable.any():
+            result[:, usable] = np.nanpercentile(values[:, usable], percentiles, axis=0)
+        return result
+
+    table = np.vstack([(~np.isnan(value)).sum(axis=0)[np.newaxis], spread(annual_return), spread(multiple)])
+    return pd.DataFrame(table.T, index=index, columns=columns).astype({'Start_Months': int})
@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from config.constants import DRAWDOWN_CACHE_ENTRIES
+from core.data_processing.shared_prices import snapshot_version
+
+DAYS_PER_YEAR = 365.25
+
+
+def drawdown_analytics(price_data, start_date=None, end_date=None):
+    """
+    Measures the drawdowns of every ticker in one pass over a window.
+
+    Prices are carried forward over gaps inside a ticker's history. The
+    running maximum gives the underwater curve (price / previous high - 1).
+    Forward and backward accumulations of the rows at a new high then give,
+    for every row, the high the ticker is under and the row where it is
+    regained. Peak, trough and recovery dates and the length of every
+    underwater spell come from those arrays by indexing, for all tickers at
+    once. A spell that has not recovered is counted up to the ticker's last
+    price.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        start_date (pd.Timestamp, optional): The first day of the window.
+                                             Defaults to the start of the panel.
+        end_date (pd.Timestamp, optional): The last day of the window.
+                                           Defaults to the end of the panel.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'summary' (pd.DataFrame): Indexed by ticker, with
+              'Max_Drawdown' (negative percent), the 'Peak_Date' before it,
+              its 'Trough_Date', the 'Recovery_Date' when the peak was
+              regained (NaT if not yet), 'Recovery_Years' from trough to
+              recovery (NaN if not yet), 'Max_Underwater_Years' (the longest
+              time below a previous high) and 'Current_Drawdown' (negative
+              percent). The dates are NaT for a ticker that never fell.
+            - 'underwater' (pd.DataFrame): The drawdown from the previous
+              high in percent, one row per date and one column per ticker
+              (NaN outside the ticker's history).
+    """
+    panel = price_data.loc[start_date:end_date]
+    tickers = list(panel.columns.get_level_values(0))
+    underwater_frame = pd.DataFrame(np.nan, index=panel.index, columns=tickers)
+    summary = pd.DataFrame({
+        'Max_Drawdown': np.nan, 'Peak_Date': pd.NaT, 'Trough_Date': pd.NaT, 'Recovery_Date': pd.NaT,
+        'Recovery_Years': np.nan, 'Max_Underwater_Years': np.nan, 'Current_Drawdown': np.nan,
+    }, index=pd.Index(tickers, name='Ticker'))
+    if panel.empty:
+        return {'summary': summary, 'underwater': underwater_frame}
+
+    prices = panel.ffill().where(panel.bfill().notna()).to_numpy(dtype=float)
+    n_rows = len(prices)
+    columns = np.arange(len(tickers))
+    rows = np.arange(n_rows)[:, np.newaxis]
+    days = panel.index.to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+    valid = ~np.isnan(prices)
+    has_prices = valid.any(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        underwater = prices / np.fmax.accumulate(prices, axis=0) - 1
+    at_peak = underwater >= 0  # NaN outside the history is never a peak
+
+    # The row of the high each row is under, and of the first new high after it (n_rows if none)
+    last_peak = np.maximum.accumulate(np.where(at_peak, rows, -1), axis=0)
+    next_peak = np.minimum.accumulate(np.where(at_peak, rows, n_rows)[::-1], axis=0)[::-1]
+    last_row = n_rows - 1 - np.argmax(valid[::-1], axis=0)
+
+    trough = np.argmin(np.where(valid, underwater, np.inf), axis=0)
+    depth = underwater[trough, columns]
+    fell = has_prices & (depth < 0)
+    peak = last_peak[trough, columns]
+    recovery = next_peak[trough, columns]
+    recovered = fell & (recovery < n_rows)
+    recovery = np.minimum(recovery, n_rows - 1)
+
+    # Every underwater row belongs to the spell from its high to the recovery (or last price)
+    below = valid & ~at_peak
+    spell_end = np.where(next_peak < n_rows, next_peak, last_row)
+    spell_days = np.where(below, days[spell_end] - days[np.maximum(last_peak, 0)], 0)
+
+    summary['Max_Drawdown'] = np.where(has_prices, depth * 100, np.nan)
+    summary['Peak_Date'] = pd.DatetimeIndex(panel.index[np.maximum(peak, 0)]).where(fell)
+    summary['Trough_Date'] = pd.DatetimeIndex(panel.index[trough]).where(fell)
+    summary['Recovery_Date'] = pd.DatetimeIndex(panel.index[recovery]).where(recovered)
+    summary['Recovery_Years'] = np.where(recovered, (days[recovery] - days[trough]) / DAYS_PER_YEAR, np.nan)
+    summary['Max_Underwater_Years'] = np.where(has_prices, spell_days.max(axis=0) / DAYS_PER_YEAR, np.nan)
+    summary['Current_Drawdown'] = np.where(has_prices, underwater[last_row, columns] * 100, np.nan)
+    underwater_frame[:] = underwater * 100
+    return {'summary': summary, 'underwater': underwater_frame}
+
+
+# (price snapshot, start day, end day) -> drawdown_analytics result, for one snapshot
+_analytics_cache = OrderedDict()
+_analytics_lock = threading.Lock()
+
+
+def get_drawdown_analytics(price_data, start_date=None, end_date=None):
+    """
+    Returns `drawdown_analytics` for a snapshot, computing it once per window.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        start_date (pd.Timestamp, optional): The first day of the window; truncated to the day.
+        end_date (pd.Timestamp, optional): The last day of the window; truncated to the day.
+
+    Returns:
+        dict: The 'summary' and 'underwater' frames; treat them as read-only.
+    """
+    start_date = None if start_date is None else pd.Timestamp(start_date).normalize()
+    end_date = None if end_date is None else pd.Timestamp(end_date).normalize()
+    version = snapshot_version(price_data)
+    key = (version, start_date, end_date)
+    with _analytics_lock:
+        if key in _analytics_cache:
+            _analytics_cache.move_to_end(key)
+            return _analytics_cache[key]
+
+    analytics = drawdown_analytics(price_data, start_date, end_date)
+    with _analytics_lock:
+        for stale in [cached for cached in _analytics_cache if cached[0] != version]:
+            del _analytics_cache[stale]
+        _analytics_cache[key] = analytics
+        while len(_analytics_cache) > DRAWDOWN_CACHE_ENTRIES:
+            _analytics_cache.popitem(last=False)
+    return analytics
@@ -3,18 +3,70 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(
     os.path.dirname(os.path.abspath(__file__)))))
 from core.data_processing.ishares_ETF_list import download_valid_data
+from core.data_processing.price_pyramid import get_price_pyramid
+from core.analysis.drawdowns import get_drawdown_analytics
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
 
-def calculate_max_drawdown(user_max_drawdown, user_minimum_efs_age, valid_tickers, data, end_date):
+def _weighted_drawdown(prices, end_date, slack=0.0):
+    # 30% full history, 70% last 10 years; `slack` deepens each window's
+    # drawdown by that many log points (the pyramid's error bound)
+    past_10_year_date = end_date - pd.DateOffset(years=10)
+
+    prices_origin = prices[prices.index <= end_date]
+    prices_10_year = prices[(prices.index >= past_10_year_date) & (
+        prices.index <= end_date)]
+
+    def window_drawdown(window):
+        if window.empty:
+            return None
+        running_max = window.cummax()
+        drawdown = ((window - running_max) / running_max).min()
+        return (np.expm1(np.log1p(drawdown) - slack) if slack else drawdown) * 100
+
+    max_drawdown_origin = window_drawdown(prices_origin)
+    max_drawdown_10yr = window_drawdown(prices_10_year)
+
+    if max_drawdown_origin is not None and max_drawdown_10yr is not None:
+        return 0.3 * max_drawdown_origin + 0.7 * max_drawdown_10yr
+    elif max_drawdown_origin is not None:
+        return max_drawdown_origin
+    return max_drawdown_10yr
+
+
+def _panel_weighted_drawdown(panel, end_date, slack):
+    # Vectorized `_weighted_drawdown` over all columns; NaN where no prices
+    prices = panel.loc[:end_date].to_numpy(dtype=float)
+    in_10_year = (panel.loc[:end_date].index >= end_date - pd.DateOffset(years=10))
+
+    def window_drawdown(window):
+        running_max = np.fmax.accumulate(window, axis=0)
+        with np.errstate(invalid='ignore', all='ignore'):
+            drawdown = np.nanmin(np.where(np.isnan(window), np.inf, window / running_max - 1), axis=0,
+                                 initial=np.inf)
+        drawdown = np.where(np.isinf(drawdown), np.nan, drawdown)
+        return np.expm1(np.log1p(drawdown) - slack) * 100
+
+    origin = window_drawdown(prices)
+    ten_year = window_drawdown(prices[in_10_year])
+    both = 0.3 * origin + 0.7 * ten_year
+    return np.where(np.isnan(origin), ten_year, np.where(np.isnan(ten_year), origin, both))
+
+
+def max_drawdown_masks(user_max_drawdown, user_minimum_efs_age, valid_tickers, data, end_date,
+                       resolution='daily', max_underwater_years=None):
     """
-    Filters a list of ETF tickers based on the user's maximum drawdown tolerance
-    and the minimum required age of the ETF.
+    Evaluates the drawdown and age filter of `calculate_max_drawdown` and
+    records why each rejected ETF failed.
 
-    The maximum drawdown is calculated as a weighted average of the ETF's full
-    history (30%) and the last 10 years of data (70%) to prioritize recent performance.
-    ETFs that are younger than the user's specified minimum age are also excluded.
+    The checks run in order (prices up to `end_date`, minimum age, maximum
+    drawdown, time underwater) and each rejected ticker is marked in the mask
+    of the first check it fails only, so younger ETFs never have their
+    drawdown computed on the daily path. The time underwater is the longest
+    spell below a previous high over the whole history, read from the
+    snapshot's cached `get_drawdown_analytics`.
 
     Args:
         user_max_drawdown (float): The maximum percentage drawdown the user can tolerate.
@@ -23,51 +75,102 @@ def calculate_max_drawdown(user_max_drawdown, user_minimum_efs_age, valid_ticker
         data (pd.DataFrame): A DataFrame containing the historical 'Adj Close'
                              price data for all valid ETFs.
         end_date (pd.Timestamp): The final date for the analysis period.
+        resolution (str, optional): 'daily', 'weekly' or 'monthly'. Defaults to 'daily'.
+        max_underwater_years (float, optional): The longest time in years an
+                                                ETF may have stayed below a
+                                                previous high. Defaults to no limit.
 
     Returns:
-        list: A filtered list of ticker symbols for ETFs that meet both the
-              maximum drawdown and minimum age criteria.
+        dict: 'no_prices', 'too_young', 'drawdown_too_deep' and
+              'underwater_too_long' mapped to boolean arrays aligned with
+              `valid_tickers`.
     """
-    
-    tickers_within_user_drawdown_tolerance = []
+    minimum_age_etf = datetime.now() - pd.DateOffset(years=user_minimum_efs_age)
+    no_prices = np.zeros(len(valid_tickers), dtype=bool)
+    too_young = np.zeros(len(valid_tickers), dtype=bool)
+    drawdown_too_deep = np.zeros(len(valid_tickers), dtype=bool)
+    undecided = np.ones(len(valid_tickers), dtype=bool)
 
-    for ticker in valid_tickers:
+    # Decide every ticker at once on the coarse level; only the ones inside
+    # the error band fall through to the daily loop below
+    if resolution != 'daily' and end_date >= data.index.max():
+        # The bound needs every daily bar up to end_date to belong to a sampled period
+        pyramid = get_price_pyramid(data)
+        columns = [(ticker, 'Adj Close') for ticker in valid_tickers]
+        coarse = pyramid[resolution][columns]
+        slack = pyramid['drift'][resolution].reindex(valid_tickers).to_numpy()
+        upper = _panel_weighted_drawdown(coarse, end_date, 0.0)
+        lower = _panel_weighted_drawdown(coarse, end_date, slack)
+        first_dates = pyramid['first_dates'].reindex(valid_tickers)
+        old_enough = (first_dates < minimum_age_etf).to_numpy()
+
+        no_prices = first_dates.isna().to_numpy()
+        too_young = ~no_prices & ~old_enough
+        drawdown_too_deep = old_enough & (upper < -user_max_drawdown)
+        undecided = old_enough & ~drawdown_too_deep & (lower < -user_max_drawdown)
+
+    for i in np.flatnonzero(undecided):
+        ticker = valid_tickers[i]
         if 'Adj Close' not in data[ticker]:
+            no_prices[i] = True
             continue
 
         prices = data[ticker]['Adj Close'].dropna()
-        past_10_year_date = end_date - pd.DateOffset(years=10)
+        if prices.empty:
+            no_prices[i] = True
+        elif prices.index.min() >= minimum_age_etf:
+            too_young[i] = True
+        else:
+            max_drawdown = _weighted_drawdown(prices, end_date)
+            if max_drawdown is None:
+                no_prices[i] = True
+            elif max_drawdown < -user_max_drawdown:
+                drawdown_too_deep[i] = True
 
-        prices_origin = prices[prices.index <= end_date]
-        prices_10_year = prices[(prices.index >= past_10_year_date) & (
-            prices.index <= end_date)]
+    underwater_too_long = np.zeros(len(valid_tickers), dtype=bool)
+    if max_underwater_years is not None:
+        summary = get_drawdown_analytics(data, end_date=end_date)['summary']
+        longest = summary['Max_Underwater_Years'].reindex(valid_tickers).to_numpy()
+        underwater_too_long = ~(no_prices | too_young | drawdown_too_deep) & (longest > max_underwater_years)
 
-        if not prices_origin.empty:
-            running_max = prices_origin.cummax()
-            drawdown = (prices_origin - running_max) / running_max
-            max_drawdown_origin = drawdown.min() * 100
-        else:
-            max_drawdown_origin = None
+    return {'no_prices': no_prices, 'too_young': too_young, 'drawdown_too_deep': drawdown_too_deep,
+            'underwater_too_long': underwater_too_long}
 
-        if not prices_10_year.empty:
-            running_max_10yr = prices_10_year.cummax()
-            drawdown_10yr = (prices_10_year -
-                             running_max_10yr) / running_max_10yr
-            max_drawdown_10yr = drawdown_10yr.min() * 100
-        else:
-            max_drawdown_10yr = None
-
-        if max_drawdown_origin is not None and max_drawdown_10yr is not None:
-            max_drawdown = 0.3 * max_drawdown_origin + 0.7 * max_drawdown_10yr
-        elif max_drawdown_origin is not None:
-            max_drawdown = max_drawdown_origin
-        elif max_drawdown_10yr is not None:
-            max_drawdown = max_drawdown_10yr
-        else:
-            continue
 
-        minimum_age_etf = datetime.now() - pd.DateOffset(years=user_minimum_efs_age)
-        if max_drawdown >= -user_max_drawdown and prices.index.min() < minimum_age_etf:
-            tickers_within_user_drawdown_tolerance.append(ticker)
+def calculate_max_drawdown(user_max_drawdown, user_minimum_efs_age, valid_tickers, data, end_date,
+                           resolution='daily', max_underwater_years=None):
+    """
+    Filters a list of ETF tickers based on the user's maximum drawdown tolerance
+    and the minimum required age of the ETF.
+
+    The maximum drawdown is calculated as a weighted average of the ETF's full
+    history (30%) and the last 10 years of data (70%) to prioritize recent performance.
+    ETFs that are younger than the user's specified minimum age are also excluded.
+
+    With a coarser `resolution` the drawdowns are first measured on that level
+    of the price pyramid. A coarse drawdown is never deeper than the daily one
+    and at most the ticker's drift shallower, so ETFs that clearly fail or
+    clearly pass are decided from the coarse data and only the ones inside
+    the error band are recomputed from daily prices. The result is identical
+    to the daily filter. `max_drawdown_masks` also tells why ETFs failed.
+
+    Args:
+        user_max_drawdown (float): The maximum percentage drawdown the user can tolerate.
+        user_minimum_efs_age (int): The minimum age in years an ETF must be to be considered.
+        valid_tickers (list): A list of valid ETF ticker symbols.
+        data (pd.DataFrame): A DataFrame containing the historical 'Adj Close'
+                             price data for all valid ETFs.
+        end_date (pd.Timestamp): The final date for the analysis period.
+        resolution (str, optional): 'daily', 'weekly' or 'monthly'. Defaults to 'daily'.
+        max_underwater_years (float, optional): Also drop ETFs that once stayed
+                                                below a previous high for longer
+                                                than this many years.
 
-    return tickers_within_user_drawdown_tolerance
+    Returns:
+        list: A filtered list of ticker symbols for ETFs that meet both the
+              maximum drawdown and minimum age criteria.
+    """
+    masks = max_drawdown_masks(user_max_drawdown, user_minimum_efs_age, valid_tickers, data, end_date,
+                               resolution, max_underwater_years)
+    rejected = np.logical_or.reduce(list(masks.values()))
+    return [ticker for ticker, out in zip(valid_tickers, rejected) if not out]
@@ -0,0 +1,134 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from config.constants import (
+    TRADING_DAYS_PER_YEAR, MONTE_CARLO_PATHS, MONTE_CARLO_BLOCK_DAYS,
+    MONTE_CARLO_CHUNK_PATHS, MONTE_CARLO_PERCENTILES
+)
+from core.data_processing.etf_data import price_returns
+
+
+def basket_daily_returns(price_data, tickers, weights=None, end_date=None):
+    """
+    Builds the daily return series of a basket of ETFs.
+
+    The basket is rebalanced daily to its weights, renormalized over the ETFs
+    that traded that day, so ETFs with a shorter history do not shorten the
+    series.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        tickers (list): The ETFs in the basket.
+        weights (dict, optional): Weight per ticker. Defaults to equal weights.
+        end_date (pd.Timestamp, optional): The last date used. Defaults to the
+                                           end of the panel.
+
+    Returns:
+        pd.Series: The basket's daily simple returns.
+    """
+    prices = price_data.loc[:end_date, [(ticker, 'Adj Close') for ticker in tickers]]
+    prices.columns = list(tickers)
+    returns = price_returns(prices)
+
+    w = pd.Series(1.0 if weights is None else weights, index=list(tickers), dtype=float).fillna(0.0)
+    weight_traded = returns.notna().mul(w).sum(axis=1)
+    basket = returns.mul(w).sum(axis=1) / weight_traded
+    return basket[weight_traded > 0].dropna()
+
+
+def _block_summaries(log_returns, block_size):
+    # For every possible block start: total log return, highest and lowest
+    # cumulative level inside the block, and the deepest drawdown inside it.
+    levels = np.concatenate([[0.0], np.cumsum(log_returns)])
+    windows = sliding_window_view(levels, block_size + 1)
+    relative = windows - windows[:, :1]
+    running_peak = np.maximum.accumulate(relative, axis=1)
+    return (relative[:, -1], relative.max(axis=1), relative.min(axis=1),
+            (relative - running_peak).min(axis=1))
+
+
+def simulate_outcomes(daily_returns, time_horizon, worst_case, desired_growth,
+                      n_paths=MONTE_CARLO_PATHS, block_size=MONTE_CARLO_BLOCK_DAYS,
+                      seed=None, chunk_size=MONTE_CARLO_CHUNK_PATHS,
+                      percentiles=MONTE_CARLO_PERCENTILES):
+    """
+    Projects outcome distributions over the user's horizon by block bootstrap.
+
+    Each path strings together randomly chosen blocks of `block_size`
+    consecutive historical days, which keeps short-term autocorrelation and
+    volatility clustering. Every possible block is summarized once (total
+    return, in-block high, low and drawdown), so a path costs one lookup per
+    block instead of one per day, and the running peak is carried between
+    blocks to give each path's exact maximum drawdown. Paths are simulated in
+    chunks of `chunk_size`, bounding memory at a few arrays of that length.
+
+    Args:
+        daily_returns (array-like): Historical daily simple returns of the basket.
+        time_horizon (int): The horizon in years; it is rounded up to whole blocks.
+        worst_case (float): The tolerated maximum drawdown, in percent.
+        desired_growth (float): The desired annual growth, in percent.
+        n_paths (int, optional): Number of simulated paths. Defaults to
+                                 `MONTE_CARLO_PATHS`.
+        block_size (int, optional): Block length in trading days. Defaults to
+                                    `MONTE_CARLO_BLOCK_DAYS`.
+        seed (int, optional): Seed for reproducible results.
+        chunk_size (int, optional): Paths simulated at once. Defaults to
+                                    `MONTE_CARLO_CHUNK_PATHS`.
+        percentiles (list, optional): Percentiles to report. Defaults to
+                                      `MONTE_CARLO_PERCENTILES`.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'annual_growth' (pd.Series): Percentiles of annualized growth (%).
+            - 'final_value' (pd.Series): Percentiles of the value of $1 at the horizon.
+            - 'max_drawdown' (pd.Series): Percentiles of the path's max drawdown (%).
+            - 'prob_worst_case_breach' (float): Share of paths whose drawdown
+              exceeds `worst_case`.
+            - 'prob_desired_growth' (float): Share of paths whose annualized
+              growth reaches `desired_growth`.
+
+    Raises:
+        ValueError: If there are fewer daily returns than one block.
+    """
+    log_returns = np.log1p(np.asarray(daily_returns, dtype=float))
+    log_returns = log_returns[np.isfinite(log_returns)]
+    if len(log_returns) < block_size:
+        raise ValueError(f"Need at least {block_size} daily returns, got {len(log_returns)}")
+
+    total, block_high, block_low, block_drawdown = _block_summaries(log_returns, block_size)
+    n_starts = len(total)
+    n_blocks = int(np.ceil(time_horizon * TRADING_DAYS_PER_YEAR / block_size))
+    years = n_blocks * block_size / TRADING_DAYS_PER_YEAR
+
+    rng = np.random.default_rng(seed)
+    final_level = np.empty(n_paths)
+    max_drawdown = np.empty(n_paths)
+
+    for first in range(0, n_paths, chunk_size):
+        size = min(chunk_size, n_paths - first)
+        level = np.zeros(size)
+        peak = np.zeros(size)
+        drawdown = np.zeros(size)
+        for _ in range(n_blocks):
+            starts = rng.integers(0, n_starts, size=size)
+            drawdown = np.minimum(drawdown, np.minimum(level + block_low[starts] - peak,
+                                                       block_drawdown[starts]))
+            peak = np.maximum(peak, level + block_high[starts])
+            level += total[starts]
+        final_level[first:first + size] = level
+        max_drawdown[first:first + size] = drawdown
+
+    annual_growth = np.expm1(final_level / years) * 100
+    drawdown_pct = np.expm1(max_drawdown) * 100
+
+    return {
+        'annual_growth': pd.Series(np.percentile(annual_growth, percentiles), index=percentiles),
+        'final_value': pd.Series(np.exp(np.percentile(final_level, percentiles)), index=percentiles),
+        'max_drawdown': pd.Series(np.percentile(drawdown_pct, percentiles), index=percentiles),
+        'prob_worst_case_breach': float(np.mean(drawdown_pct < -worst_case)),
+        'prob_desired_growth': float(np.mean(annual_growth >= desired_growth)),
+    }
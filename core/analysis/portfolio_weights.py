@@ -0,0 +1,172 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
+from config.constants import (
+    TRADING_DAYS_PER_YEAR, FRONTIER_RISK_AVERSIONS, PORTFOLIO_SOLVER_ITERATIONS,
+    MIN_DISPLAY_WEIGHT_PCT
+)
+from core.scoring.diversification import get_rolling_covariance
+from core.data_processing.risk_free_rates import average_risk_free_rate
+
+
+def project_to_simplex(values, mask):
+    """
+    Projects each row onto the probability simplex restricted to its mask.
+
+    Uses the sort-based algorithm of Duchi et al. (2008), vectorized over rows.
+    Entries outside the mask always receive a zero weight.
+
+    Args:
+        values (np.ndarray): Unconstrained weights, shape (n_rows, n_assets).
+        mask (np.ndarray): Boolean array of the same shape; True where an
+                           asset may be held.
+
+    Returns:
+        np.ndarray: Non-negative weights summing to one per row.
+    """
+    v = np.where(mask, values, -np.inf)
+    u = -np.sort(-v, axis=1)
+    with np.errstate(invalid='ignore'):
+        cumulative = np.cumsum(np.where(np.isfinite(u), u, 0.0), axis=1) - 1.0
+        ranks = np.arange(1, v.shape[1] + 1)
+        support = np.isfinite(u) & (u - cumulative / ranks > 0)
+    rho = support.sum(axis=1)
+    rho_safe = np.maximum(rho, 1)
+    theta = np.take_along_axis(cumulative, (rho_safe - 1)[:, np.newaxis], axis=1) / rho_safe[:, np.newaxis]
+    weights = np.where(mask, np.maximum(v - theta, 0.0), 0.0)
+    return np.where(rho[:, np.newaxis] > 0, weights, 0.0)
+
+
+def solve_mean_variance(mu, cov, risk_aversion, mask, n_iter=PORTFOLIO_SOLVER_ITERATIONS):
+    """
+    Solves many long-only mean-variance problems against one covariance matrix.
+
+    Each row b maximizes mu[b] @ w - risk_aversion[b] / 2 * w @ cov @ w over
+    fully invested, long-only weights restricted to mask[b]. All rows are
+    solved together with accelerated projected gradient (FISTA), so the cost
+    of a batch is a handful of (n_rows x n) @ (n x n) products per iteration.
+
+    Args:
+        mu (np.ndarray): Expected annual returns, shape (n_rows, n) or (n,).
+        cov (np.ndarray): Annual covariance matrix, shape (n, n).
+        risk_aversion (np.ndarray): Risk aversion per row, shape (n_rows,).
+                                    Use np.inf for the minimum-variance portfolio.
+        mask (np.ndarray): Boolean eligibility, shape (n_rows, n).
+        n_iter (int, optional): Gradient iterations. Defaults to
+                                `PORTFOLIO_SOLVER_ITERATIONS`.
+
+    Returns:
+        np.ndarray: Weights with shape (n_rows, n).
+    """
+    mask = np.asarray(mask, dtype=bool)
+    n_rows = mask.shape[0]
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), mask.shape)
+    risk_aversion = np.asarray(risk_aversion, dtype=float)[:, np.newaxis]
+
+    # min-variance rows: ignore returns and use unit risk aversion
+    min_variance = np.isinf(risk_aversion)
+    mu = np.where(min_variance, 0.0, mu)
+    risk_aversion = np.where(min_variance, 1.0, risk_aversion)
+
+    lipschitz = max(np.linalg.eigvalsh(cov).max(), 1e-12) * risk_aversion
+    step = 1.0 / lipschitz
+
+    counts = np.maximum(mask.sum(axis=1, keepdims=True), 1)
+    weights = np.where(mask, 1.0 / counts, 0.0)
+    momentum = weights.copy()
+    t = 1.0
+    for _ in range(n_iter):
+        gradient = mu - risk_aversion * (momentum @ cov)
+        updated = project_to_simplex(momentum + step * gradient, mask)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        momentum = updated + ((t - 1) / t_next) * (updated - weights)
+        weights, t = updated, t_next
+
+    return weights.reshape(n_rows, -1)
+
+
+def portfolio_weights(price_data, candidate_lists, time_horizon, end_date, risk_free_df,
+                      target_volatilities):
+    """
+    Computes minimum-variance, maximum-Sharpe and target-volatility weights for
+    many profiles that share one horizon.
+
+    Every profile brings its own candidate list (e.g. the output of
+    `calculate_max_drawdown`) and volatility target (its `USER_FLUCTUATION`).
+    Expected returns and the shrunk covariance come from the cached rolling
+    covariance of the horizon, and all profiles are solved in one batch along
+    a grid of risk aversions (`FRONTIER_RISK_AVERSIONS`). Each profile's
+    maximum-Sharpe portfolio is the frontier point with the best Sharpe ratio,
+    and its target-volatility portfolio is the highest-return frontier point
+    whose volatility does not exceed the target (the minimum-variance
+    portfolio when the target is below every frontier point).
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        candidate_lists (list): One list of eligible tickers per profile.
+        time_horizon (int): The estimation window in years.
+        end_date (pd.Timestamp): The final date of the window.
+        risk_free_df (pd.DataFrame): A DataFrame containing historical risk-free rates.
+        target_volatilities (list): The annual volatility target per profile,
+                                    in percent.
+
+    Returns:
+        list: One DataFrame per profile with a 'Ticker' column and the
+              'Min_Variance', 'Max_Sharpe' and 'Target_Volatility' weights in
+              percent, restricted to tickers with at least
+              `MIN_DISPLAY_WEIGHT_PCT` in one of the portfolios.
+    """
+    state = get_rolling_covariance(price_data, time_horizon, end_date)
+    universe = state.tickers
+    position = {ticker: i for i, ticker in enumerate(universe)}
+
+    mu = state.mean().to_numpy() * TRADING_DAYS_PER_YEAR
+    cov = state.covariance().to_numpy() * TRADING_DAYS_PER_YEAR
+    usable = np.isfinite(mu) & (np.diag(cov) > 0)
+    mu = np.nan_to_num(mu)
+    rf = average_risk_free_rate(risk_free_df, time_horizon, end_date) / 100
+
+    n_profiles = len(candidate_lists)
+    masks = np.zeros((n_profiles, len(universe)), dtype=bool)
+    for row, candidates in enumerate(candidate_lists):
+        masks[row, [position[t] for t in candidates if t in position]] = True
+    masks &= usable
+
+    # Profiles with the same candidates share a frontier, so each distinct mask
+    # is solved once: one batch of masks x (min-variance + each risk aversion)
+    unique_masks, profile_mask = np.unique(masks, axis=0, return_inverse=True)
+    profile_mask = profile_mask.reshape(-1)
+    aversions = np.array([np.inf] + list(FRONTIER_RISK_AVERSIONS))
+    batch_masks = np.repeat(unique_masks, len(aversions), axis=0)
+    batch_aversions = np.tile(aversions, len(unique_masks))
+    weights = solve_mean_variance(mu, cov, batch_aversions, batch_masks)
+    weights = weights.reshape(len(unique_masks), len(aversions), len(universe))[profile_mask]
+
+    expected = weights @ mu
+    volatility = np.sqrt(np.maximum(np.einsum('pkn,nm,pkm->pk', weights, cov, weights), 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(volatility > 0, (expected - rf) / volatility, -np.inf)
+
+    results = []
+    for row in range(n_profiles):
+        if not masks[row].any():
+            results.append(pd.DataFrame(columns=['Ticker', 'Min_Variance', 'Max_Sharpe', 'Target_Volatility']))
+            continue
+
+        target = target_volatilities[row] / 100
+        within = volatility[row] <= target
+        target_index = int(np.argmax(np.where(within, expected[row], -np.inf))) if within.any() else 0
+
+        df = pd.DataFrame({
+            'Ticker': universe,
+            'Min_Variance': weights[row, 0] * 100,
+            'Max_Sharpe': weights[row, int(np.argmax(sharpe[row]))] * 100,
+            'Target_Volatility': weights[row, target_index] * 100,
+        })
+        held = df[['Min_Variance', 'Max_Sharpe', 'Target_Volatility']].max(axis=1) >= MIN_DISPLAY_WEIGHT_PCT
+        results.append(df[held].sort_values('Target_Volatility', ascending=False).reset_index(drop=True))
+
+    return results
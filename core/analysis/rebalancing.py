@@ -0,0 +1,191 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
+from config.constants import (
+    TRADING_DAYS_PER_YEAR, REBALANCE_POLICIES, REBALANCE_THRESHOLD, TRADE_COST_BPS, SPREAD_BPS
+)
+
+
+def _basket_growth(price_data, baskets, weights, start, end):
+    # Cumulative growth of every basket member, shaped (days + 1, baskets, slots);
+    # row 0 is the purchase day and unused slots hold flat cash with weight 0
+    tickers = sorted({ticker for basket in baskets for ticker in basket})
+    prices = price_data.loc[start:end, [(ticker, 'Adj Close') for ticker in tickers]]
+    # Carry prices over gaps inside each history so the move across a missing
+    # day is kept; before the first and after the last price a holding is flat
+    filled = prices.ffill().where(prices.bfill().notna())
+    returns = filled.pct_change(fill_method=None).fillna(0.0).to_numpy(copy=True)
+    returns[0] = 0.0
+    growth = np.hstack([np.cumprod(1 + returns, axis=0), np.ones((len(returns), 1))])
+
+    slots = max((len(basket) for basket in baskets), default=1)
+    position = {ticker: i for i, ticker in enumerate(tickers)}
+    members = np.full((len(baskets), slots), len(tickers))
+    target = np.zeros((len(baskets), slots))
+    for b, basket in enumerate(baskets):
+        members[b, :len(basket)] = [position[ticker] for ticker in basket]
+        w = np.ones(len(basket)) if weights is None or weights[b] is None else \
+            np.array([weights[b].get(ticker, 0.0) for ticker in basket], dtype=float)
+        target[b, :len(basket)] = w / w.sum()
+    return prices.index, growth[:, members], target
+
+
+def _calendar_rebalances(dates, policy):
+    # Last trading day of every month or quarter, excluding the final day
+    if policy == 'Buy and hold':
+        days = np.zeros(len(dates), dtype=bool)
+    else:
+        period = dates.year * 12 + (dates.month - 1 if policy == 'Monthly' else (dates.quarter - 1) * 3)
+        days = np.append(np.diff(period) != 0, False)
+    days[0] = True
+    return days
+
+
+def _threshold_rebalances(growth, target, threshold, scan_days=63):
+    # Rebalance days per basket: the first day any weight drifts more than
+    # `threshold` from its target. Every round checks the next `scan_days`
+    # days of all unfinished baskets at once, so the loop runs about once per
+    # event or per `scan_days`, never once per day.
+    n_days, n_baskets, _ = growth.shape
+    days = np.zeros((n_days, n_baskets), dtype=bool)
+    days[0] = True
+    anchor = np.zeros(n_baskets, dtype=int)
+    checked = np.zeros(n_baskets, dtype=int)
+    active = np.arange(n_baskets)
+    offsets = np.arange(1, scan_days + 1)[:, np.newaxis]
+    while len(active):
+        rows = checked[active] + offsets
+        in_window = rows < n_days - 1  # no point rebalancing on the last day
+        rows = np.minimum(rows, n_days - 1)
+        held = target[active] * growth[rows, active] / growth[anchor[active], active]
+        drift = held / held.sum(axis=2, keepdims=True) - target[active]
+        breach = (np.abs(drift) > threshold).any(axis=2) & in_window
+
+        hit = breach.any(axis=0)
+        first = rows[np.argmax(breach, axis=0), np.arange(len(active))]
+        days[first[hit], active[hit]] = True
+        anchor[active[hit]] = first[hit]
+        checked[active] = np.where(hit, first, checked[active] + scan_days)
+        active = active[checked[active] < n_days - 2]
+    return days
+
+
+def _simulate(growth, target, rebalance_days, cost_rate):
+    # Values of $1 (days + 1, baskets; pre-trade on rebalance days), total
+    # turnover and total trading cost per basket for given rebalance days
+    n_days, n_baskets, _ = growth.shape
+    rows = np.arange(n_days)[:, np.newaxis]
+    last = np.maximum.accumulate(np.where(rebalance_days, rows, 0), axis=0)
+    anchor = np.vstack([np.zeros((1, n_baskets), dtype=int), last[:-1]])
+
+    held = target * (growth / np.take_along_axis(growth, anchor[:, :, np.newaxis], axis=0))
+    segment_growth = held.sum(axis=2)
+
+    # Weights only need comparing with the target on the (few) trading days
+    trade_day, trade_basket = np.nonzero(rebalance_days & (rows > 0))
+    drifted = held[trade_day, trade_basket] / segment_growth[trade_day, trade_basket][:, np.newaxis]
+    turnover = np.zeros((n_days, n_baskets))
+    turnover[trade_day, trade_basket] = np.abs(drifted - target[trade_basket]).sum(axis=1)
+
+    # Value carried into each segment: growth of every finished segment net of its trading cost
+    step = np.zeros((n_days, n_baskets))
+    step[trade_day, trade_basket] = (np.log(segment_growth[trade_day, trade_basket])
+                                     + np.log1p(-cost_rate * turnover[trade_day, trade_basket]))
+    carried = np.take_along_axis(np.cumsum(step, axis=0), anchor, axis=0)
+    values = (1 - cost_rate) * np.exp(carried) * segment_growth
+    costs = cost_rate * (1 + (turnover * values).sum(axis=0))
+    return values, turnover.sum(axis=0), costs
+
+
+def simulate_rebalancing(price_data, baskets, start, end, policies=REBALANCE_POLICIES, weights=None,
+                         cost_bps=TRADE_COST_BPS, spread_bps=SPREAD_BPS, threshold=REBALANCE_THRESHOLD,
+                         risk_free_rate=0.0):
+    """
+    Backtests many ETF baskets under several rebalancing policies at once.
+
+    Every basket is bought at the close of the first day of the window and
+    then, depending on the policy, held ('Buy and hold'), reset to its target
+    weights on the last trading day of each month ('Monthly') or quarter
+    ('Quarterly'), or reset whenever a weight drifts more than `threshold`
+    from its target ('Threshold'). Each trade pays `cost_bps` plus half of
+    `spread_bps` on the traded amount, including the initial purchase.
+
+    Between rebalances a holding grows with its own cumulative return, so
+    each policy is a few array operations over a (days, baskets, members)
+    array built once from the shared returns. Only threshold rebalancing
+    loops, over rebalancing events and quarter-long scans of all baskets at
+    once rather than over days. Days before an ETF's first price count as a
+    zero return, i.e. its weight waits in cash.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        baskets (list): One list of tickers per basket.
+        start (pd.Timestamp): The purchase day (first day of the window).
+        end (pd.Timestamp): The last day of the window.
+        policies (list, optional): Names from `REBALANCE_POLICIES`.
+        weights (list, optional): One dict of target weights per basket (or
+                                  None for equal weights). Defaults to equal
+                                  weights for every basket.
+        cost_bps (float, optional): Commission per traded dollar, in basis
+                                    points. Defaults to `TRADE_COST_BPS`.
+        spread_bps (float, optional): Bid-ask spread in basis points. Defaults
+                                      to `SPREAD_BPS`.
+        threshold (float, optional): Drift that triggers a 'Threshold'
+                                     rebalance. Defaults to `REBALANCE_THRESHOLD`.
+        risk_free_rate (float, optional): Annual rate in percent for the Sharpe ratio.
+                                          Defaults to 0.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'summary' (pd.DataFrame): One row per basket and policy with the
+              'Basket' index, 'Policy', 'Annual Return (%)', 'Volatility (%)',
+              'Sharpe', 'Max Drawdown (%)', 'Rebalances', 'Turnover (%)' and
+              'Costs (%)' (of the starting value, including the purchase).
+            - 'values' (dict): Policy -> DataFrame of the value of $1, one
+              column per basket.
+
+    Raises:
+        ValueError: If a basket is empty or a policy is unknown.
+    """
+    if not baskets or not all(baskets):
+        raise ValueError("Every basket needs at least one ticker")
+    dates, growth, target = _basket_growth(price_data, baskets, weights, start, end)
+    cost_rate = (cost_bps + spread_bps / 2) / 10_000
+    years = max(len(dates) - 1, 1) / TRADING_DAYS_PER_YEAR
+
+    summaries = []
+    values_by_policy = {}
+    for policy in policies:
+        if policy == 'Threshold':
+            days = _threshold_rebalances(growth, target, threshold)
+        elif policy in REBALANCE_POLICIES:
+            days = np.broadcast_to(_calendar_rebalances(dates, policy)[:, np.newaxis],
+                                   growth.shape[:2])
+        else:
+            raise ValueError(f"Unknown rebalancing policy {policy!r}; use one of {REBALANCE_POLICIES}")
+
+        values, turnover, costs = _simulate(growth, target, days, cost_rate)
+        daily = values[1:] / values[:-1] - 1
+        annual_return = (values[-1] ** (1 / years) - 1) * 100
+        volatility = daily.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = (annual_return - risk_free_rate) / volatility
+        drawdown = (values / np.maximum.accumulate(values, axis=0) - 1).min(axis=0) * 100
+        summaries.append(pd.DataFrame({
+            'Basket': np.arange(len(baskets)),
+            'Policy': policy,
+            'Annual Return (%)': annual_return,
+            'Volatility (%)': volatility,
+            'Sharpe': sharpe,
+            'Max Drawdown (%)': drawdown,
+            'Rebalances': days[1:].sum(axis=0),
+            'Turnover (%)': turnover * 100,
+            'Costs (%)': costs * 100,
+        }))
+        values_by_policy[policy] = pd.DataFrame(values, index=dates)
+
+    summary = pd.concat(summaries, ignore_index=True).set_index('Basket')
+    return {'summary': summary, 'values': values_by_policy}
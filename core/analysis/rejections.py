@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
+
+# Mask name -> explanation, in pipeline order; the first mask a ticker is in wins
+REJECTION_REASONS = {
+    'no_prices': "No prices up to the analysis date",
+    'too_young': "Trading for less than your {age}-year minimum",
+    'drawdown_too_deep': "Its past drops were deeper than your {worst_case}% limit",
+    'underwater_too_long': "It once took longer than your {max_underwater}-year limit to regain a previous high",
+    'insufficient_history': "Fewer than two prices in the last {horizon} years",
+    'nan_metrics': "Growth or fluctuation over {horizon} years could not be measured",
+    'nan_score': "No {ranking} score could be computed",
+    'too_similar': "Ranked #{rank} by {ranking} but moves almost in step with a better-ranked pick",
+    'below_top_k': "Ranked #{rank} by {ranking}; only the top {count} are recommended",
+}
+
+
+def ranking_masks(scores, ranked, score_col):
+    """
+    Records why scored ETFs were left out of the recommended basket.
+
+    Args:
+        scores (pd.DataFrame): The scored ETFs, e.g. from `score_etfs`.
+        ranked (pd.DataFrame): The selected rows from `top_recommend` or
+                               `diversified_top_recommend`.
+        score_col (str): The column the basket was ranked by.
+
+    Returns:
+        tuple: `(tickers, masks, ranks)`; `masks` maps 'nan_score',
+               'too_similar' (skipped although better ranked than a pick) and
+               'below_top_k' to boolean arrays aligned with `tickers`, and
+               `ranks` is a Series of each ticker's 1-based rank by score
+               (NaN if unscored).
+    """
+    if scores.empty or score_col not in scores.columns:
+        empty = np.zeros(0, dtype=bool)
+        return [], {'nan_score': empty, 'too_similar': empty, 'below_top_k': empty}, pd.Series(dtype=float)
+
+    tickers = scores['Ticker'].tolist()
+    ranks = pd.Series(scores[score_col].to_numpy(dtype=float), index=tickers)
+    ranks = ranks.rank(ascending=False, method='first')
+    position = ranks.to_numpy()
+    nan_score = np.isnan(position)
+    selected = scores['Ticker'].isin(ranked['Ticker']).to_numpy()
+    worst_selected = position[selected].max() if selected.any() else 0
+
+    left_out = ~selected & ~nan_score
+    masks = {
+        'nan_score': nan_score,
+        'too_similar': left_out & (position < worst_selected),
+        'below_top_k': left_out & (position > worst_selected),
+    }
+    return tickers, masks, ranks
+
+
+def explain_rejections(valid_tickers, stage_masks, recommended, ranks=None, **details):
+    """
+    Turns the filter masks of every stage into one explanation per ticker.
+
+    The masks are by-products of the vectorized filters
+    (`max_drawdown_masks`, `get_etf_data_with_masks`, `ranking_masks`), so
+    explaining costs a lookup per ticker, not another pass over prices.
+
+    Args:
+        valid_tickers (list): Every ticker that entered the pipeline.
+        stage_masks (list): `(tickers, masks)` pairs in pipeline order, where
+                            `masks` maps names from `REJECTION_REASONS` to
+                            boolean arrays aligned with `tickers`.
+        recommended (list): The tickers in the final basket.
+        ranks (pd.Series, optional): Rank by score per ticker, from
+                                     `ranking_masks`.
+        **details: Values for every explanation template: age, worst_case,
+                   max_underwater, horizon, ranking and count.
+
+    Returns:
+        pd.DataFrame: One row per ticker with 'Ticker', 'Recommended',
+                      'Reason' (the mask name, missing if recommended) and
+                      'Explanation'.
+    """
+    reasons = dict.fromkeys(valid_tickers)
+    for tickers, masks in stage_masks:
+        for name, mask in masks.items():
+            for ticker in np.asarray(tickers, dtype=object)[mask]:
+                if reasons.get(ticker) is None:
+                    reasons[ticker] = name
+
+    basket = set(recommended)
+    ranks = {} if ranks is None else ranks.to_dict()
+    rows = []
+    for ticker, reason in reasons.items():
+        if ticker in basket:
+            explanation = "Recommended"
+        elif reason is None:
+            explanation = "Not evaluated"
+        else:
+            rank = ranks.get(ticker)
+            explanation = REJECTION_REASONS[reason].format(
+                rank=None if rank is None or np.isnan(rank) else int(rank), **details)
+        rows.append({'Ticker': ticker, 'Recommended': ticker in basket,
+                     'Reason': None if ticker in basket else reason, 'Explanation': explanation})
+    return pd.DataFrame(rows, columns=['Ticker', 'Recommended', 'Reason', 'Explanation'])
@@ -0,0 +1,156 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from config.constants import PERIODS_PER_YEAR, ROLLING_PERCENTILES, ROLLING_CACHE_ENTRIES
+from core.data_processing.price_pyramid import get_price_pyramid, choose_resolution
+from core.data_processing.shared_prices import snapshot_version
+
+
+def rolling_horizon_metrics(price_data, time_horizon, end_date=None, resolution=None):
+    """
+    Computes the annualized return and volatility of every ticker over every
+    `time_horizon`-year window of its history.
+
+    A window spans n = periods-per-year * `time_horizon` rows of the chosen
+    pyramid level. Its growth comes from the difference of log prices n rows
+    apart and its volatility from differences of the running sums of
+    returns and squared returns, so all windows of all tickers cost a few
+    array operations. Gaps inside a ticker's history are carried forward
+    (a zero return); windows reaching before its first or after its last
+    price are NaN.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        time_horizon (int): The window length in years.
+        end_date (pd.Timestamp, optional): The last window end. Defaults to
+                                           the end of the panel.
+        resolution (str, optional): A pyramid level. Defaults to
+                                    `choose_resolution(time_horizon)`.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'growth' (pd.DataFrame): Annual growth in percent, one row per
+              window end date and one column per ticker.
+            - 'volatility' (pd.DataFrame): Annualized standard deviation of
+              returns in percent, same shape.
+    """
+    resolution = resolution or choose_resolution(time_horizon)
+    panel = get_price_pyramid(price_data)[resolution].loc[:end_date]
+    tickers = list(panel.columns.get_level_values(0))
+    n = PERIODS_PER_YEAR[resolution] * time_horizon
+    if len(panel) <= n:
+        empty = pd.DataFrame(columns=tickers, dtype=float)
+        return {'growth': empty, 'volatility': empty.copy()}
+
+    prices = panel.ffill().where(panel.bfill().notna()).to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_prices = np.log(prices)
+        returns = prices[1:] / prices[:-1] - 1
+        # Centring on each ticker's mean return keeps the running sums well conditioned
+        returns = returns - np.nanmean(returns, axis=0)
+
+    filled = np.nan_to_num(returns)
+    zero = np.zeros((1, len(tickers)))
+    sums = np.vstack([zero, np.cumsum(filled, axis=0)])
+    squares = np.vstack([zero, np.cumsum(filled ** 2, axis=0)])
+    gaps = np.vstack([zero, np.cumsum(np.isnan(returns), axis=0)])
+
+    # Window ending at row e covers returns e-n+1 .. e, i.e. running-sum rows e-n .. e
+    complete = (gaps[n:] - gaps[:-n]) == 0
+    mean = (sums[n:] - sums[:-n]) / n
+    variance = np.maximum((squares[n:] - squares[:-n]) - n * mean ** 2, 0.0) / (n - 1)
+    with np.errstate(invalid='ignore', over='ignore'):
+        growth = (np.exp((log_prices[n:] - log_prices[:-n]) / time_horizon) - 1) * 100
+    volatility = np.sqrt(variance * PERIODS_PER_YEAR[resolution]) * 100
+
+    index = panel.index[n:]
+    return {'growth': pd.DataFrame(np.where(complete, growth, np.nan), index=index, columns=tickers),
+            'volatility': pd.DataFrame(np.where(complete, volatility, np.nan), index=index, columns=tickers)}
+
+
+def _column_percentiles(values, percentiles):
+    # Linear-interpolated percentiles of every column, ignoring NaN; one sort
+    # instead of np.nanpercentile's per-column fallback when NaN is present
+    ordered = np.sort(values, axis=0)  # NaN sorts last
+    count = (~np.isnan(values)).sum(axis=0)
+    position = np.asarray(percentiles, dtype=float)[:, np.newaxis] / 100 * np.maximum(count - 1, 0)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, np.maximum(count - 1, 0))
+    low = np.take_along_axis(ordered, lower, axis=0)
+    high = np.take_along_axis(ordered, upper, axis=0)
+    return np.where(count > 0, low + (high - low) * (position - lower), np.nan)
+
+
+def horizon_distribution(price_data, time_horizon, end_date=None, resolution=None,
+                         percentiles=ROLLING_PERCENTILES):
+    """
+    Summarizes the rolling `time_horizon`-year returns and volatilities of every ticker.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        time_horizon (int): The window length in years.
+        end_date (pd.Timestamp, optional): The last window end.
+        resolution (str, optional): A pyramid level; see `rolling_horizon_metrics`.
+        percentiles (list, optional): Percentiles to report. Defaults to
+                                      `ROLLING_PERCENTILES`.
+
+    Returns:
+        pd.DataFrame: Indexed by ticker, with the number of 'Windows' and
+                      'Return_P{p}' and 'Volatility_P{p}' per percentile, in
+                      percent (NaN without a complete window).
+    """
+    rolling = rolling_horizon_metrics(price_data, time_horizon, end_date, resolution)
+    growth = rolling['growth'].to_numpy(dtype=float)
+    volatility = rolling['volatility'].to_numpy(dtype=float)
+    table = {'Windows': (~np.isnan(growth)).sum(axis=0)}
+    for name, values in (('Return', growth), ('Volatility', volatility)):
+        if len(values):
+            spread = _column_percentiles(values, percentiles)
+        else:
+            spread = np.full((len(percentiles), values.shape[1]), np.nan)
+        for p, row in zip(percentiles, spread):
+            table[f'{name}_P{p}'] = row
+    return pd.DataFrame(table, index=pd.Index(rolling['growth'].columns, name='Ticker'))
+
+
+# (price snapshot, horizon, day, resolution) -> horizon_distribution table, for one snapshot
+_distribution_cache = OrderedDict()
+_distribution_lock = threading.Lock()
+
+
+def get_horizon_distribution(price_data, time_horizon, end_date=None, resolution=None):
+    """
+    Returns `horizon_distribution` for a snapshot, computing it once per
+    horizon and day.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        time_horizon (int): The window length in years.
+        end_date (pd.Timestamp, optional): The last window end; truncated to the day.
+        resolution (str, optional): A pyramid level; see `rolling_horizon_metrics`.
+
+    Returns:
+        pd.DataFrame: The percentile table; treat it as read-only.
+    """
+    end_date = None if end_date is None else pd.Timestamp(end_date).normalize()
+    version = snapshot_version(price_data)
+    key = (version, time_horizon, end_date, resolution)
+    with _distribution_lock:
+        if key in _distribution_cache:
+            _distribution_cache.move_to_end(key)
+            return _distribution_cache[key]
+
+    table = horizon_distribution(price_data, time_horizon, end_date, resolution)
+    with _distribution_lock:
+        for stale in [cached for cached in _distribution_cache if cached[0] != version]:
+            del _distribution_cache[stale]
+        _distribution_cache[key] = table
+        while len(_distribution_cache) > ROLLING_CACHE_ENTRIES:
+            _distribution_cache.popitem(last=False)
+    return table
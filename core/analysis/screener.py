@@ -0,0 +1,195 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import threading
+
+import numpy as np
+import pandas as pd
+from config.constants import TRADING_DAYS_PER_YEAR, SCREENER_HORIZONS
+from core.analysis.drawdowns import get_drawdown_analytics
+from core.analysis.max_drawdown import _panel_weighted_drawdown
+from core.data_processing.etf_data import window_metrics
+from core.data_processing.risk_free_rates import average_risk_free_rate
+from core.data_processing.shared_prices import snapshot_version
+
+# Comparison -> (searchsorted side, keeps the values above the bound)
+OPERATORS = {'>': ('right', True), '>=': ('left', True), '<': ('left', False), '<=': ('right', False)}
+
+
+def screener_metrics(price_data, end_date, risk_free_df=None, horizons=SCREENER_HORIZONS):
+    """
+    Computes the screenable metrics of every ETF in the panel at once.
+
+    Growth and standard deviation follow `get_etf_data` (first and last price
+    in the window, returns between consecutive prices, daily resolution) and
+    'Max_Drawdown' is the blended drawdown of `calculate_max_drawdown`, so a
+    screen reproduces the app's filters.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        end_date (pd.Timestamp): The final date of every window.
+        risk_free_df (pd.DataFrame, optional): Risk-free rates; when given a
+                                               'Sharpe_{h}Y' column is added
+                                               per horizon.
+        horizons (list, optional): Window lengths in years. Defaults to
+                                   `SCREENER_HORIZONS`.
+
+    Returns:
+        pd.DataFrame: One row per ticker with 'Ticker', 'Age_Years',
+                      'Max_Drawdown' (negative percent), 'Max_Underwater_Years'
+                      (longest time below a previous high) and, per horizon,
+                      'Annual_Growth_{h}Y' and 'Standard_Deviation_{h}Y' in
+                      percent. NaN where an ETF lacks the history.
+    """
+    panel = price_data.loc[:end_date]
+    prices = panel.to_numpy(dtype=float)
+    valid = ~np.isnan(prices)
+    first_valid = np.where(valid.any(axis=0), np.argmax(valid, axis=0), len(prices))
+    first_dates = pd.DatetimeIndex(panel.index[np.minimum(first_valid, len(prices) - 1)])
+    drawdowns = get_drawdown_analytics(price_data, end_date=end_date)['summary']
+
+    table = {
+        'Ticker': list(panel.columns.get_level_values(0)),
+        'Age_Years': np.where(first_valid < len(prices),
+                              (end_date - first_dates).days / 365.25, np.nan),
+        'Max_Drawdown': _panel_weighted_drawdown(price_data, end_date, 0.0),
+        'Max_Underwater_Years': drawdowns['Max_Underwater_Years'].to_numpy(),
+    }
+
+    for horizon in horizons:
+        growth, std, _ = window_metrics(prices, panel.index, horizon, end_date, TRADING_DAYS_PER_YEAR)
+        table[f'Annual_Growth_{horizon}Y'] = growth
+        table[f'Standard_Deviation_{horizon}Y'] = std
+
+        if risk_free_df is not None:
+            excess = table[f'Annual_Growth_{horizon}Y'] - average_risk_free_rate(risk_free_df, horizon, end_date)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                table[f'Sharpe_{horizon}Y'] = excess / table[f'Standard_Deviation_{horizon}Y']
+
+    return pd.DataFrame(table).replace([np.inf, -np.inf], np.nan)
+
+
+class ETFScreener:
+    """
+    Answers range screens over a metrics table from sorted per-column indexes.
+
+    Every numeric column is argsorted once. A predicate such as
+    ('Annual_Growth_5Y', '>', 8) is then two `searchsorted` calls into that
+    column's sorted values, giving a contiguous slice of row ids. The slices
+    of all predicates are turned into row bitmaps and intersected, starting
+    from the most selective one, and the survivors are read off in the order
+    of the requested score's index. A query costs O(log n) per predicate plus
+    O(n) bitmap work with small constants, with no pass over the prices.
+    """
+
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        self._indexes = {}
+        for column in self.table.columns:
+            if not pd.api.types.is_numeric_dtype(self.table[column]):
+                continue
+            values = self.table[column].to_numpy(dtype=float)
+            order = np.argsort(values, kind='stable')  # NaN sorts last and is never matched
+            order = order[:np.count_nonzero(~np.isnan(values))]
+            self._indexes[column] = (order, values[order])
+
+    def _index(self, column):
+        if column not in self._indexes:
+            raise KeyError(f"Cannot screen on {column!r}; numeric columns: {sorted(self._indexes)}")
+        return self._indexes[column]
+
+    def _slice(self, column, operator, value):
+        # Row ids satisfying one predicate, as a slice of the column's sorted order
+        order, values = self._index(column)
+        if operator == '==':
+            return order[values.searchsorted(value, 'left'):values.searchsorted(value, 'right')]
+        if operator not in OPERATORS:
+            raise ValueError(f"Unknown operator {operator!r}; use one of {sorted(OPERATORS) + ['==']}")
+        side, above = OPERATORS[operator]
+        cut = values.searchsorted(value, side)
+        return order[cut:] if above else order[:cut]
+
+    def screen(self, predicates, order_by=None, ascending=False, limit=None):
+        """
+        Returns the ETFs that satisfy every predicate.
+
+        Args:
+            predicates (list): `(column, operator, value)` tuples combined with
+                               AND; operators are '>', '>=', '<', '<=' and '=='.
+            order_by (str, optional): A numeric column to sort the result by.
+                                      Rows where it is NaN are left out.
+                                      Defaults to the table order.
+            ascending (bool, optional): Sort direction. Defaults to False
+                                        (best score first).
+            limit (int, optional): The maximum number of rows to return.
+
+        Returns:
+            pd.DataFrame: The matching rows of the metrics table.
+
+        Raises:
+            KeyError: If a column is not a numeric column of the table.
+            ValueError: If an operator is unknown.
+        """
+        slices = sorted((self._slice(*predicate) for predicate in predicates), key=len)
+        n = len(self.table)
+        if slices:
+            mask = np.zeros(n, dtype=bool)
+            mask[slices[0]] = True
+            for ids in slices[1:]:
+                if not mask.any():
+                    break
+                bitmap = np.zeros(n, dtype=bool)
+                bitmap[ids] = True
+                mask &= bitmap
+        else:
+            mask = np.ones(n, dtype=bool)
+
+        if order_by is None:
+            ids = np.flatnonzero(mask)
+        else:
+            order = self._index(order_by)[0]
+            order = order if ascending else order[::-1]
+            ids = order[mask[order]]
+        return self.table.iloc[ids[:limit]]
+
+
+# (price snapshot, risk-free snapshot, day, horizons) -> ETFScreener
+_screener_cache = {}
+_screener_lock = threading.Lock()
+
+
+def get_screener(price_data, end_date, risk_free_df=None, horizons=SCREENER_HORIZONS):
+    """
+    Returns the screener for a snapshot, building its metrics and indexes once.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        end_date (pd.Timestamp): The final date of every window; truncated to the day.
+        risk_free_df (pd.DataFrame, optional): Adds the 'Sharpe_{h}Y' columns.
+        horizons (list, optional): Window lengths in years. Defaults to
+                                   `SCREENER_HORIZONS`.
+
+    Returns:
+        ETFScreener: A screener over `screener_metrics` of the panel.
+
+    Example:
+        >>> get_screener(data, end_date, risk_free_df).screen(
+        ...     [('Annual_Growth_5Y', '>', 8), ('Standard_Deviation_5Y', '<', 12),
+        ...      ('Max_Drawdown', '>', -25), ('Age_Years', '>', 5)],
+        ...     order_by='Sharpe_5Y', limit=10)
+    """
+    end_date = pd.Timestamp(end_date).normalize()
+    key = (snapshot_version(price_data),
+           None if risk_free_df is None else snapshot_version(risk_free_df),
+           end_date, tuple(horizons))
+    with _screener_lock:
+        cached = _screener_cache.get(key)
+    if cached is not None:
+        return cached
+
+    screener = ETFScreener(screener_metrics(price_data, end_date, risk_free_df, horizons))
+    with _screener_lock:
+        _screener_cache.clear()
+        _screener_cache[key] = screener
+    return screener
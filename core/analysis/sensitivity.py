@@ -0,0 +1,177 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import pandas as pd
+from config.constants import (
+    USER_TIME_HORIZON, USER_DESIRED_GROWTH, USER_FLUCTUATION, USER_WORST_CASE,
+    USER_MINIMUM_ETF_AGE, USER_RISK_PREFERENCE, TIME_HORIZON_OPTIONS,
+    DESIRED_GROWTH_OPTIONS, FLUCTUATION_OPTIONS, WORSE_CASE_OPTIONS,
+    MINIMUM_ETF_AGE_OPTIONS, RISK_PREFERENCE_OPTIONS, RECOMMENDATION_COUNT
+)
+from core.analysis.max_drawdown import calculate_max_drawdown
+from core.data_processing.etf_data import get_etf_data
+from core.data_processing.price_pyramid import choose_resolution
+from core.scoring.scorer_registry import SCORERS, score_etfs
+from core.scoring.custom_score import batch_utility_scores
+from core.scoring.sharpe_recommendation import daily_sharpe_matrix
+from core.scoring.etf_recommendation_evaluation import top_recommend
+from core.scoring.diversification import get_correlation_matrix, diversified_top_recommend
+
+UTILITY_RANKING = 'Utility'
+DAILY_SHARPE_RANKING = 'Daily Sharpe'
+
+# Profile index -> (label, option grid), in questionnaire order
+PROFILE_DIMENSIONS = {
+    USER_TIME_HORIZON: ('Time Horizon', TIME_HORIZON_OPTIONS),
+    USER_DESIRED_GROWTH: ('Desired Growth', DESIRED_GROWTH_OPTIONS),
+    USER_FLUCTUATION: ('Fluctuation', FLUCTUATION_OPTIONS),
+    USER_WORST_CASE: ('Worst Case', WORSE_CASE_OPTIONS),
+    USER_MINIMUM_ETF_AGE: ('Minimum ETF Age', MINIMUM_ETF_AGE_OPTIONS),
+    USER_RISK_PREFERENCE: ('Risk Preference', RISK_PREFERENCE_OPTIONS),
+}
+
+
+def profile_neighbors(user):
+    """
+    Lists the profiles one option away from `user` in the questionnaire grid.
+
+    Args:
+        user (list): The profile, indexed by the USER_* constants.
+
+    Returns:
+        list: `(dimension_label, neighbor_value, neighbor_profile)` tuples, at
+              most two per question. Answers that are not on the grid have
+              no neighbors.
+    """
+    neighbors = []
+    for index, (label, options) in PROFILE_DIMENSIONS.items():
+        if user[index] not in options:
+            continue
+        position = options.index(user[index])
+        for step in (-1, 1):
+            if 0 <= position + step < len(options):
+                neighbor = list(user)
+                neighbor[index] = options[position + step]
+                neighbors.append((label, options[position + step], neighbor))
+    return neighbors
+
+
+def neighborhood_sensitivity(user, valid_tickers, data, end_date, risk_free_df,
+                             ranking_method='Sharpe', diversify=False,
+                             amount_recommend=RECOMMENDATION_COUNT, max_underwater_years=None):
+    """
+    Reports how the recommended basket changes for every one-step neighbor
+    of a profile.
+
+    Each stage of the app's pipeline is evaluated once per distinct input and
+    shared by all neighbors that need it:
+        - the drawdown filter once per (worst case, minimum age) pair,
+        - ETF metrics and scores once per time horizon, over the union of the
+          candidates of every profile with that horizon,
+        - utility scores for all profiles of a horizon in one array operation,
+        - with 'Daily Sharpe', one `daily_sharpe_matrix` for all horizons.
+    A neighborhood of up to 12 profiles therefore needs 5 drawdown filters
+    and 3 horizons' metrics instead of 13 full runs. Neighbors that only
+    change answers the ranking does not use (e.g. the fluctuation when
+    ranking by Sharpe) cost nothing.
+
+    Args:
+        user (list): The profile, indexed by the USER_* constants.
+        valid_tickers (list): A list of valid ETF ticker symbols.
+        data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        end_date (pd.Timestamp): The final date for the analysis period.
+        risk_free_df (pd.DataFrame): A DataFrame containing historical risk-free rates.
+        ranking_method (str, optional): A name from `SCORERS`, or 'Utility'
+                                        for the custom utility score.
+                                        Defaults to 'Sharpe'.
+        diversify (bool, optional): Use `diversified_top_recommend` as the app
+                                    does when its checkbox is set.
+        amount_recommend (int, optional): Basket size. Defaults to
+                                          `RECOMMENDATION_COUNT`.
+        max_underwater_years (float, optional): The app's limit on time below
+                                                a previous high, applied to
+                                                every neighbor.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'base' (list): The profile's recommended tickers.
+            - 'neighbors' (pd.DataFrame): One row per neighbor with the
+              'Question', the neighbor's 'Answer', its 'Recommended' tickers,
+              the tickers 'Added' and 'Removed' versus the base, the
+              'Overlap' count and whether it is 'Unchanged'.
+    """
+    neighbors = profile_neighbors(user)
+    profiles = [list(user)] + [profile for _, _, profile in neighbors]
+
+    candidates = {}
+    for profile in profiles:
+        key = (profile[USER_WORST_CASE], profile[USER_MINIMUM_ETF_AGE])
+        if key not in candidates:
+            candidates[key] = calculate_max_drawdown(key[0], key[1], valid_tickers, data, end_date,
+                                                     resolution='weekly',
+                                                     max_underwater_years=max_underwater_years)
+
+    by_horizon = {}
+    for row, profile in enumerate(profiles):
+        by_horizon.setdefault(profile[USER_TIME_HORIZON], []).append(row)
+
+    # The daily excess-return Sharpe of every horizon comes out of one pass
+    daily_sharpe = (daily_sharpe_matrix(data, risk_free_df, end_date, sorted(by_horizon))
+                    if ranking_method == DAILY_SHARPE_RANKING else None)
+
+    recommended = [None] * len(profiles)
+    for horizon, rows in by_horizon.items():
+        union = set()
+        for row in rows:
+            union.update(candidates[(profiles[row][USER_WORST_CASE], profiles[row][USER_MINIMUM_ETF_AGE])])
+        ordered = [ticker for ticker in valid_tickers if ticker in union]
+
+        metrics = get_etf_data(ordered, horizon, data, end_date, resolution=choose_resolution(horizon))
+        if metrics.empty:
+            for row in rows:
+                recommended[row] = []
+            continue
+
+        if ranking_method == UTILITY_RANKING:
+            score_col = 'Utility_Score'
+            utilities = batch_utility_scores(metrics, horizon, risk_free_df, [profiles[row] for row in rows],
+                                             end_date)
+        else:
+            score_col = SCORERS[ranking_method]['column']
+            if daily_sharpe is not None:
+                scores = metrics.assign(**{score_col: daily_sharpe[horizon].reindex(metrics['Ticker']).to_numpy()})
+            else:
+                scores = score_etfs(metrics, horizon, data, end_date, risk_free_df, [ranking_method])
+        correlation = get_correlation_matrix(data, horizon, end_date) if diversify else None
+
+        for position, row in enumerate(rows):
+            profile = profiles[row]
+            allowed = set(candidates[(profile[USER_WORST_CASE], profile[USER_MINIMUM_ETF_AGE])])
+            if ranking_method == UTILITY_RANKING:
+                profile_scores = pd.DataFrame({'Ticker': utilities.columns,
+                                               score_col: utilities.iloc[position].to_numpy()})
+            else:
+                profile_scores = scores
+            profile_scores = profile_scores[profile_scores['Ticker'].isin(allowed)]
+
+            if diversify:
+                ranked = diversified_top_recommend(profile_scores, score_col, amount_recommend, correlation)
+            else:
+                ranked = top_recommend(profile_scores, score_col, amount_recommend)
+            recommended[row] = ranked['Ticker'].tolist()
+
+    base = recommended[0]
+    results = []
+    for (label, value, _), tickers in zip(neighbors, recommended[1:]):
+        results.append({
+            'Question': label,
+            'Answer': value,
+            'Recommended': ', '.join(tickers),
+            'Added': ', '.join(t for t in tickers if t not in base),
+            'Removed': ', '.join(t for t in base if t not in tickers),
+            'Overlap': len(set(tickers) & set(base)),
+            'Unchanged': set(tickers) == set(base),
+        })
+
+    return {'base': base, 'neighbors': pd.DataFrame(results)}
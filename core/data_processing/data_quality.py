@@ -0,0 +1,153 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
+from config.constants import (
+    QUALITY_SPIKE_MIN_MOVE, QUALITY_SPIKE_REVERSAL, QUALITY_STALE_RUN,
+    QUALITY_SPLIT_FACTORS, QUALITY_SPLIT_TOLERANCE
+)
+
+QUALITY_FLAGS = ('spike', 'stale', 'gap', 'split')
+
+
+def _run_lengths(flags):
+    # Length of the run of consecutive True values each cell belongs to (0 where False)
+    def forward(values):
+        counts = np.cumsum(values, axis=0)
+        resets = np.maximum.accumulate(np.where(values, 0, counts), axis=0)
+        return counts - resets
+
+    ahead = forward(flags)
+    behind = forward(flags[::-1])[::-1]
+    return np.where(flags, ahead + behind - 1, 0)
+
+
+def assess_quality(data):
+    """
+    Flags suspicious prices in the whole panel in one vectorized pass.
+
+    Four flags are produced for every date and ticker:
+        - 'spike': a move of at least `QUALITY_SPIKE_MIN_MOVE` that is mostly
+          undone the next day (a bad tick); the spike price is flagged.
+        - 'stale': the price repeats unchanged for `QUALITY_STALE_RUN` or more
+          days in a row; every repeat after the first is flagged.
+        - 'gap': a missing price between the ETF's first and last price.
+        - 'split': a move that is not undone and matches a common split
+          ratio (`QUALITY_SPLIT_FACTORS`), i.e. an unadjusted split.
+    Genuine large moves such as a market crash are not flagged because they
+    are neither reversed the next day nor close to a split ratio.
+
+    Masks are stored bit-packed along the date axis, eight days per byte.
+
+    Args:
+        data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'flags' (dict): Flag name -> packed uint8 array of shape
+              (ceil(n_dates / 8), n_tickers).
+            - 'n_dates' (int): The number of dates, needed to unpack.
+            - 'split_ratios' (np.ndarray): The price ratio of each flagged
+              split, in the row-major order of the 'split' mask; earlier
+              prices must be multiplied by it.
+            - 'report' (pd.DataFrame): One row per ticker with its first and
+              last date, price count and the count of each flag.
+    """
+    prices = data.to_numpy(dtype=float)
+    tickers = list(data.columns.get_level_values(0))
+    valid = ~np.isnan(prices)
+
+    # Previous valid price for every cell, so gaps do not hide moves
+    positions = np.where(valid, np.arange(len(prices))[:, np.newaxis], 0)
+    previous_index = np.maximum.accumulate(positions, axis=0)
+    previous_price = np.take_along_axis(prices, previous_index, axis=0)
+    previous_price = np.vstack([np.full((1, prices.shape[1]), np.nan), previous_price[:-1]])
+    has_previous = np.vstack([np.zeros((1, prices.shape[1]), bool),
+                              np.maximum.accumulate(valid, axis=0)[:-1]])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(valid & has_previous, prices / previous_price, np.nan)
+        log_move = np.log(ratio)
+    next_move = np.vstack([log_move[1:], np.full((1, prices.shape[1]), np.nan)])
+
+    with np.errstate(invalid='ignore'):
+        large = np.abs(log_move) >= np.log1p(QUALITY_SPIKE_MIN_MOVE)
+        reversed_next = (np.sign(next_move) == -np.sign(log_move)) & \
+                        (np.abs(next_move) >= QUALITY_SPIKE_REVERSAL * np.abs(log_move))
+        spike = large & reversed_next
+        undoes_spike = np.vstack([np.zeros((1, prices.shape[1]), bool), spike[:-1]])
+
+        # Only the few large, persistent moves are compared with the split ratios
+        factors = np.asarray(QUALITY_SPLIT_FACTORS, dtype=float)
+        candidates = np.concatenate([factors, 1 / factors])
+        rows, cols = np.nonzero(large & ~reversed_next & ~undoes_spike)
+        moves = ratio[rows, cols]
+        closest = candidates[np.argmin(np.abs(moves[:, np.newaxis] / candidates - 1), axis=1)]
+        is_split = np.abs(moves / closest - 1) <= QUALITY_SPLIT_TOLERANCE
+    split = np.zeros_like(valid)
+    split[rows[is_split], cols[is_split]] = True
+
+    with np.errstate(invalid='ignore'):
+        repeated = valid & (prices == previous_price)
+    stale = _run_lengths(repeated) >= QUALITY_STALE_RUN - 1
+
+    first_valid = np.argmax(valid, axis=0)
+    last_valid = len(prices) - 1 - np.argmax(valid[::-1], axis=0)
+    dates = np.arange(len(prices))[:, np.newaxis]
+    gap = ~valid & (dates > first_valid) & (dates < last_valid) & valid.any(axis=0)
+
+    masks = {'spike': spike, 'stale': stale, 'gap': gap, 'split': split}
+    report = pd.DataFrame({
+        'Ticker': tickers,
+        'First_Date': data.index[first_valid],
+        'Last_Date': data.index[last_valid],
+        'Prices': valid.sum(axis=0),
+        **{f'{name.capitalize()}_Count': mask.sum(axis=0) for name, mask in masks.items()},
+    })
+
+    return {
+        'flags': {name: np.packbits(mask, axis=0) for name, mask in masks.items()},
+        'n_dates': len(prices),
+        'split_ratios': closest[is_split],
+        'report': report,
+    }
+
+
+def unpack_flag(quality, name):
+    """
+    Unpacks one stored flag to a boolean array of shape (n_dates, n_tickers).
+    """
+    return np.unpackbits(quality['flags'][name], axis=0, count=quality['n_dates']).astype(bool)
+
+
+def clean_price_data(data, quality):
+    """
+    Applies the quality flags to a price panel.
+
+    Spike and stale prices become NaN. Return calculations take each return
+    from the previous price the ETF has (`window_metrics`, `price_returns`),
+    so the move across a removed price is kept. Prices before an unadjusted
+    split are multiplied by the split ratio so returns across the split are
+    continuous. Gaps are only reported.
+
+    Args:
+        data (pd.DataFrame): The 'Adj Close' panel that `quality` was built from.
+        quality (dict): The output of `assess_quality`.
+
+    Returns:
+        pd.DataFrame: A cleaned copy of `data`.
+    """
+    prices = data.to_numpy(dtype=float, copy=True)
+    prices[unpack_flag(quality, 'spike') | unpack_flag(quality, 'stale')] = np.nan
+
+    # A split at day t rescales every earlier price: cumulative product of the
+    # factors from the end, shifted so the split day itself is untouched
+    factors = np.ones_like(prices)
+    factors[np.nonzero(unpack_flag(quality, 'split'))] = quality['split_ratios']
+    later = np.cumprod(factors[::-1], axis=0)[::-1]
+    adjustment = np.vstack([later[1:], np.ones((1, prices.shape[1]))])
+    prices = (prices * adjustment).astype(data.to_numpy().dtype, copy=False)
+
+    return pd.DataFrame(prices, index=data.index, columns=data.columns)
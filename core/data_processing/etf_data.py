@@ -1,48 +1,165 @@
 import pandas as pd
 import numpy as np
+from config.constants import PERIODS_PER_YEAR
+from core.data_processing.price_pyramid import get_price_pyramid
 
-def get_etf_data(etf_list, time_horizon, price_data, end_date, min_etf_age=0):
+def window_metrics(prices, dates, time_horizon, end_date, periods_per_year):
+    """
+    Computes annual growth and volatility of many price columns over one window.
+
+    Matches the per-ticker definition of `get_etf_data`: growth from the first
+    and last price inside the window, volatility from the returns between
+    consecutive prices inside it (gaps are skipped, not filled).
+
+    Args:
+        prices (np.ndarray): Prices, one row per date and one column per ETF.
+        dates (pd.DatetimeIndex): The dates of the rows.
+        time_horizon (int): The window length in years, ending at `end_date`.
+        end_date (pd.Timestamp): The final date of the window.
+        periods_per_year (int): Rows per year, used to annualize the volatility.
+
+    Returns:
+        tuple: `(growth, std, count)` arrays with one value per column, growth
+               and std in percent (NaN where undefined) and count the number
+               of prices in the window.
+    """
+    first_row = dates.searchsorted(end_date - pd.DateOffset(years=time_horizon), side='left')
+    last_row = dates.searchsorted(end_date, side='right')
+    window = prices[first_row:last_row]
+    seen = ~np.isnan(window)
+    count = seen.sum(axis=0)
+    if not len(window):
+        nan = np.full(prices.shape[1], np.nan)
+        return nan, nan.copy(), count
+
+    # Previous price inside the window for every cell, as `pct_change` after `dropna`
+    rows = np.arange(len(window))[:, np.newaxis]
+    previous_row = np.maximum.accumulate(np.where(seen, rows, -1), axis=0)
+    previous_row = np.vstack([np.full((1, window.shape[1]), -1), previous_row[:-1]])
+    previous = np.take_along_axis(window, np.maximum(previous_row, 0), axis=0)
+
+    first = np.take_along_axis(window, np.argmax(seen, axis=0)[np.newaxis], axis=0)[0]
+    last = np.take_along_axis(window, (len(window) - 1 - np.argmax(seen[::-1], axis=0))[np.newaxis], axis=0)[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(seen & (previous_row >= 0), window / previous - 1, np.nan)
+        growth = ((last / first) ** (1 / time_horizon) - 1) * 100
+        n_returns = count - 1
+        mean = np.nansum(returns, axis=0) / n_returns
+        variance = np.nansum((returns - mean) ** 2, axis=0) / (n_returns - 1)
+        std = np.sqrt(variance * periods_per_year) * 100
+
+    return (np.where(count >= 2, growth, np.nan), np.where(n_returns >= 2, std, np.nan), count)
+
+
+def get_etf_data_with_masks(etf_list, time_horizon, price_data, end_date, resolution='daily'):
+    """
+    Computes the metrics of `get_etf_data` together with why ETFs were dropped.
+
+    All ETFs are evaluated in one vectorized pass over the window, and every
+    dropped ETF is marked in exactly one of the returned masks, in this
+    order: no price column, fewer than two prices in the window, and growth
+    or volatility that could not be computed (e.g. only two prices).
+
+    Args:
+        etf_list (list): The ticker symbols to evaluate.
+        time_horizon (int): The window length in years, ending at `end_date`.
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        end_date (pd.Timestamp): The final date of the window.
+        resolution (str, optional): 'daily', 'weekly' or 'monthly'. Defaults to 'daily'.
+
+    Returns:
+        tuple: `(metrics, masks)`; `metrics` is the `get_etf_data` DataFrame
+               and `masks` maps 'no_prices', 'insufficient_history' and
+               'nan_metrics' to boolean arrays aligned with `etf_list`.
+    """
+    if resolution != 'daily':
+        price_data = get_price_pyramid(price_data)[resolution]
+
+    # Accept both the ('TICKER', 'Adj Close') panel and plain ticker columns
+    columns = set(price_data.columns)
+    keys = [(etf, 'Adj Close') if (etf, 'Adj Close') in columns else etf if etf in columns else None
+            for etf in etf_list]
+    no_prices = np.array([key is None for key in keys], dtype=bool)
+    present = [key for key in keys if key is not None]
+
+    growth = np.full(len(etf_list), np.nan)
+    std = np.full(len(etf_list), np.nan)
+    count = np.zeros(len(etf_list), dtype=int)
+    if present:
+        prices = price_data[present].to_numpy(dtype=float)
+        growth[~no_prices], std[~no_prices], count[~no_prices] = window_metrics(
+            prices, price_data.index, time_horizon, end_date, PERIODS_PER_YEAR[resolution])
+
+    insufficient_history = ~no_prices & (count < 2)
+    nan_metrics = ~no_prices & ~insufficient_history & (np.isnan(growth) | np.isnan(std))
+    keep = ~(no_prices | insufficient_history | nan_metrics)
+
+    metrics = pd.DataFrame({
+        'Ticker': [etf for etf, ok in zip(etf_list, keep) if ok],
+        f'Annual_Growth_{time_horizon}Y': growth[keep],
+        f'Standard_Deviation_{time_horizon}Y': std[keep],
+    })
+    if metrics.empty:
+        metrics = pd.DataFrame()  # as before: empty if nothing valid
+    masks = {'no_prices': no_prices, 'insufficient_history': insufficient_history,
+             'nan_metrics': nan_metrics}
+    return metrics, masks
+
+
+def get_etf_data(etf_list, time_horizon, price_data, end_date, min_etf_age=0, resolution='daily'):
     """
     Returns a DataFrame with ETF metrics: annual growth and std deviation
     for the specified time horizon. Filters out ETFs that do not have
     sufficient history or missing data.
+
+    With resolution 'weekly' or 'monthly' the metrics come from that level of
+    the price pyramid (see `choose_resolution` and the error bounds in
+    `build_price_pyramid`); volatility is annualized with that level's
+    periods per year. Use `get_etf_data_with_masks` to also learn why ETFs
+    were dropped.
     """
-    df_list = []
+    return get_etf_data_with_masks(etf_list, time_horizon, price_data, end_date, resolution)[0]
 
-    start_date = end_date - pd.DateOffset(years=time_horizon)
 
-    for etf in etf_list:
-        # Attempt to get adjusted close prices
-        try:
-            prices = price_data[(etf, 'Adj Close')].dropna()
-        except (KeyError, TypeError):
-            try:
-                prices = price_data[etf].dropna()
-            except (KeyError, TypeError):
-                continue
-
-        period_prices = prices.loc[start_date:end_date]
-        if len(period_prices) < 2:  # not enough data to compute metrics
-            continue
-
-        # Annualized return
-        total_return = (period_prices.iloc[-1] / period_prices.iloc[0]) - 1
-        annual_return = ((1 + total_return) ** (1 / time_horizon) - 1) * 100
-
-        # Annualized standard deviation
-        daily_returns = period_prices.pct_change().dropna()
-        annual_std = daily_returns.std() * np.sqrt(252) * 100  # percent
-
-        df_list.append({
-            'Ticker': etf,
-            f'Annual_Growth_{time_horizon}Y': annual_return,
-            f'Standard_Deviation_{time_horizon}Y': annual_std
-        })
-
-    if not df_list:
-        return pd.DataFrame()  # return empty if nothing valid
-
-    df = pd.DataFrame(df_list)
-    # Filter ETFs that have missing values
-    df = df.dropna()
-    return df
+def price_returns(prices):
+    """
+    Computes simple returns, each from the previous price the ETF has.
+
+    A missing price (before inception, or a bad tick removed at ingest)
+    gives a NaN return on that day, and the next return spans the gap, so
+    the move across it is kept rather than lost as with `pct_change`.
+
+    Args:
+        prices (pd.DataFrame): Prices, one row per date and one column per ETF.
+
+    Returns:
+        pd.DataFrame: Returns with the same shape; the first row is NaN.
+    """
+    returns = prices / prices.ffill().shift(1) - 1
+    return returns.where(prices.notna())
+
+
+def get_returns_matrix(etf_list, time_horizon, price_data, end_date):
+    """
+    Builds the daily simple-return matrix for a set of ETFs over one horizon.
+
+    Prices are taken from the same window as `get_etf_data`. Days on which an
+    ETF has no price (e.g. before its inception) are NaN rather than dropped,
+    so all ETFs share one date axis. As in `window_metrics`, each return is
+    measured from the previous price inside the window (see `price_returns`).
+
+    Args:
+        etf_list (list): The ticker symbols to include.
+        time_horizon (int): The window length in years, ending at `end_date`.
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        end_date (pd.Timestamp): The final date of the window.
+
+    Returns:
+        pd.DataFrame: Daily returns with one row per trading day and one column
+                      per ticker (the first day of the window is dropped).
+    """
+    start_date = end_date - pd.DateOffset(years=time_horizon)
+    columns = [(etf, 'Adj Close') for etf in etf_list]
+    prices = price_data.loc[start_date:end_date, columns]
+    prices.columns = list(etf_list)
+    return price_returns(prices).iloc[1:]
@@ -0,0 +1,208 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import gzip
+import hashlib
+import json
+import re
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+from config.constants import FETCH_MODE, FIXTURE_DIR, FIXTURE_SCALE, FIXTURE_SYNTHETIC_NOISE
+
+FETCH_MODES = ('live', 'record', 'replay')
+_PRICES_SUBDIR = 'prices'
+
+# Synthetic copy n of a ticker in a scaled replay, e.g. 'XIU.TO' -> 'XIU-S2.TO'
+_SYNTHETIC = re.compile(r'^(?P<base>.+?)-S(?P<copy>\d+)(?P<suffix>\.[A-Z]+)?$')
+
+if FETCH_MODE not in FETCH_MODES:
+    raise ValueError(f"ETF_FETCH_MODE must be one of {FETCH_MODES}, not {FETCH_MODE!r}")
+
+
+def synthetic_ticker(ticker, copy):
+    """
+    Names the `copy`-th synthetic copy of a ticker, keeping its exchange suffix.
+
+    Args:
+        ticker (str): The recorded ticker, e.g. 'XIU.TO'.
+        copy (int): The copy number, from 2.
+
+    Returns:
+        str: e.g. 'XIU-S2.TO'.
+    """
+    base, dot, suffix = ticker.rpartition('.')
+    return f"{base}-S{copy}.{suffix}" if dot else f"{ticker}-S{copy}"
+
+
+def fixture_universe(tickers, scale=None):
+    """
+    Returns the tickers to request, multiplied by the replay scale.
+
+    Args:
+        tickers (list): The real universe, e.g. `ETF_LIST`.
+        scale (int, optional): Copies of the universe. Defaults to
+                               `FIXTURE_SCALE` in replay mode and 1 otherwise.
+
+    Returns:
+        list: `tickers` followed by copies 2..scale of each of them.
+    """
+    if scale is None:
+        scale = FIXTURE_SCALE if FETCH_MODE == 'replay' else 1
+    return list(tickers) + [synthetic_ticker(ticker, copy) for copy in range(2, scale + 1) for ticker in tickers]
+
+
+def record_prices(adj_close, directory=FIXTURE_DIR):
+    """
+    Saves one downloaded chunk of adjusted closes as a compressed fixture.
+
+    Each chunk is one `.npz` file named after its tickers, so recording again
+    replaces it and replay does not depend on the chunk size.
+
+    Args:
+        adj_close (pd.DataFrame): Dates x tickers, as from `_download_adj_close_chunk`.
+        directory (str, optional): The fixture directory. Defaults to `FIXTURE_DIR`.
+
+    Returns:
+        str: The path of the written file.
+    """
+    root = os.path.join(directory, _PRICES_SUBDIR)
+    os.makedirs(root, exist_ok=True)
+    tickers = [str(ticker) for ticker in adj_close.columns]
+    name = hashlib.sha1("\n".join(tickers).encode()).hexdigest()[:16]
+    path = os.path.join(root, f"{name}.npz")
+    staging = path + '.tmp.npz'
+    np.savez_compressed(staging, tickers=np.array(tickers),
+                        dates=pd.DatetimeIndex(adj_close.index).to_numpy(dtype='datetime64[ns]'),
+                        prices=adj_close.to_numpy(dtype=float))
+    os.replace(staging, path)
+    with _price_lock:
+        _price_cache.pop(directory, None)
+    return path
+
+
+# fixture directory -> {ticker: pd.Series}
+_price_cache = {}
+_price_lock = threading.Lock()
+
+
+def _recorded_prices(directory):
+    with _price_lock:
+        if directory in _price_cache:
+            return _price_cache[directory]
+    root = os.path.join(directory, _PRICES_SUBDIR)
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"No price fixtures in {root}; run once with ETF_FETCH_MODE=record")
+    series = {}
+    for name in sorted(os.listdir(root)):
+        if not name.endswith('.npz') or name.endswith('.tmp.npz'):
+            continue
+        with np.load(os.path.join(root, name)) as fixture:
+            index = pd.DatetimeIndex(fixture['dates'], name='Date')
+            for ticker, column in zip(fixture['tickers'], fixture['prices'].T):
+                series[str(ticker)] = pd.Series(column, index=index)
+    with _price_lock:
+        _price_cache[directory] = series
+    return series
+
+
+def _synthetic_prices(source, ticker, copy, noise=FIXTURE_SYNTHETIC_NOISE):
+    # A copy follows its source with extra daily noise of `noise` times the
+    # source's volatility, seeded by its name, so copies are distinct but
+    # every replay is identical
+    log_returns = np.log(source).diff()
+    sigma = np.nanstd(log_returns.to_numpy()) if log_returns.notna().sum() > 1 else 0.0
+    rng = np.random.default_rng(zlib.crc32(f"{ticker}:{copy}".encode()))
+    shocks = rng.normal(0.0, noise * sigma, len(source))
+    shocks[source.isna().to_numpy()] = 0.0
+    return source * np.exp(np.cumsum(shocks))
+
+
+def replay_prices(tickers, directory=FIXTURE_DIR):
+    """
+    Serves adjusted closes for a chunk of tickers from the recorded fixtures.
+
+    Synthetic tickers from `fixture_universe` are derived from their recorded
+    source, so a scaled universe needs no extra recording.
+
+    Args:
+        tickers (list): The requested ticker symbols.
+        directory (str, optional): The fixture directory. Defaults to `FIXTURE_DIR`.
+
+    Returns:
+        pd.DataFrame: Dates x tickers, in the layout of `_download_adj_close_chunk`;
+                      tickers that were never recorded are absent.
+
+    Raises:
+        FileNotFoundError: If nothing has been recorded in `directory`.
+    """
+    recorded = _recorded_prices(directory)
+    columns = {}
+    for ticker in tickers:
+        if ticker in recorded:
+            columns[ticker] = recorded[ticker]
+            continue
+        match = _SYNTHETIC.match(ticker)
+        if match:
+            source = match['base'] + (match['suffix'] or '')
+            if source in recorded:
+                columns[ticker] = _synthetic_prices(recorded[source], source, int(match['copy']))
+    if not columns:
+        return pd.DataFrame()
+    return pd.DataFrame(columns).dropna(how='all')
+
+
+def record_json(name, payload, directory=FIXTURE_DIR):
+    """
+    Saves a decoded JSON response as a gzip fixture.
+
+    Args:
+        name (str): The fixture name, e.g. 'boc_V39079'.
+        payload (dict): The decoded response body.
+        directory (str, optional): The fixture directory. Defaults to `FIXTURE_DIR`.
+
+    Returns:
+        str: The path of the written file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json.gz")
+    staging = path + '.tmp'
+    with gzip.open(staging, 'wt', encoding='utf-8') as f:
+        json.dump(payload, f, separators=(',', ':'))
+    os.replace(staging, path)
+    return path
+
+
+def replay_json(name, directory=FIXTURE_DIR):
+    """
+    Loads a JSON fixture saved by `record_json`.
+
+    Args:
+        name (str): The fixture name.
+        directory (str, optional): The fixture directory. Defaults to `FIXTURE_DIR`.
+
+    Returns:
+        dict: The decoded response body.
+
+    Raises:
+        FileNotFoundError: If the fixture was never recorded.
+    """
+    path = os.path.join(directory, f"{name}.json.gz")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No fixture {path}; run once with ETF_FETCH_MODE=record")
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    # ETF_FETCH_MODE=record python core/data_processing/fixtures.py
+    from core.data_processing.ishares_ETF_list import fetch_valid_data
+    from core.data_processing.risk_free_rates import fetch_risk_free_boc
+    if FETCH_MODE != 'record':
+        sys.exit("Set ETF_FETCH_MODE=record to capture fixtures")
+    valid_tickers, _ = fetch_valid_data()
+    risk_free = getattr(fetch_risk_free_boc, '__wrapped__', fetch_risk_free_boc)()
+    print(f"Recorded {len(valid_tickers)} tickers and {len(risk_free)} BoC rates to {FIXTURE_DIR}")
@@ -0,0 +1,167 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from config.constants import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_SIZE, FETCH_ATTEMPTS,
+    FETCH_BACKOFF_BASE, FETCH_BACKOFF_MAX, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and every
+    call fails immediately with `CircuitOpenError`. Once `reset_timeout`
+    seconds have passed, one trial call is let through (half-open): success
+    closes the circuit, failure opens it again for another `reset_timeout`.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'."""
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Raises `CircuitOpenError` unless a call may go through now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpenError(f"{self.name} is unavailable; circuit open after {self.failures} failures")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+BOC_BREAKER = CircuitBreaker('Bank of Canada')
+YAHOO_BREAKER = CircuitBreaker('Yahoo Finance')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process-wide HTTP session with a pooled connection adapter.
+
+    Reusing it keeps TCP/TLS connections alive across requests and threads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def call_with_retries(func, breaker, attempts=FETCH_ATTEMPTS, backoff_base=FETCH_BACKOFF_BASE,
+                      backoff_max=FETCH_BACKOFF_MAX, is_failure=None):
+    """
+    Calls `func` through a circuit breaker, retrying failures with jittered backoff.
+
+    The wait before retry k is uniform in [0, min(backoff_max, backoff_base * 2**k)]
+    ("full jitter"), so many clients retrying at once do not synchronize.
+    Together with per-call timeouts this bounds the total time to roughly
+    attempts * timeout + (attempts - 1) * backoff_max.
+
+    Args:
+        func (callable): The call to make; exceptions count as failures.
+        breaker (CircuitBreaker): The upstream's breaker.
+        attempts (int, optional): Total attempts. Defaults to `FETCH_ATTEMPTS`.
+        backoff_base (float, optional): First backoff cap in seconds.
+        backoff_max (float, optional): Largest backoff cap in seconds.
+        is_failure (callable, optional): Marks a returned value as a failure
+                                         that should be retried.
+
+    Returns:
+        The value returned by `func`. If every attempt returned a failure
+        value, the last one is returned.
+
+    Raises:
+        CircuitOpenError: If the circuit is open.
+        Exception: The last exception raised by `func`.
+    """
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            result = func()
+        except CircuitOpenError:
+            raise
+        except Exception:
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                raise
+        else:
+            if is_failure is None or not is_failure(result):
+                breaker.record_success()
+                return result
+            breaker.record_failure()
+            if attempt == attempts - 1:
+                return result
+        time.sleep(random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt)))
+
+
+def http_get(url, breaker, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), **kwargs):
+    """
+    GETs a URL with the pooled session, timeouts, retries and a circuit breaker.
+
+    Connection errors, timeouts and 429/5xx responses are retried; other
+    responses are returned as they are for the caller to check.
+
+    Args:
+        url (str): The URL.
+        breaker (CircuitBreaker): The upstream's breaker.
+        timeout (tuple, optional): `(connect, read)` timeouts in seconds.
+        **kwargs: Passed to `requests.Session.get`.
+
+    Returns:
+        requests.Response: The last response.
+    """
+    return call_with_retries(
+        lambda: get_session().get(url, timeout=timeout, **kwargs),
+        breaker,
+        is_failure=lambda response: response.status_code in RETRYABLE_STATUS,
+    )
@@ -1,40 +1,171 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
 import yfinance as yf
 
 import streamlit as st
+from config.constants import INGEST_CHUNK_SIZE, PRICE_DTYPE, OHLCV_FIELD_COUNT, HTTP_READ_TIMEOUT, FETCH_MODE
+from core.data_processing.fixtures import fixture_universe, record_prices, replay_prices
+from core.data_processing.http_client import call_with_retries, YAHOO_BREAKER
+
+
+ETF_LIST = ["SVR.TO", "CGL.TO", "XMV.TO", "XMI.TO", "XML.TO", "XIN.TO", "XMS.TO", "XMY.TO", "XEM.TO", "XMM.TO", "XEC.TO", "XUS.TO", "XEF.TO", "XMH.TO", "XMC.TO", "XDIV.TO", "XMU.TO", "XQQ.TO", "XWD.TO", "XDUH.TO", "XDG.TO", "XSU.TO", "XDU.TO", "XSUS.TO", "XSEA.TO", "XDGH.TO", "XESG.TO", "XGI.TO", "XCD.TO", "XSEM.TO", "XSP.TO", "CWO.TO", "CRQ.TO", "XID.TO", "XCH.TO", "XEMC.TO", "XHC.TO", "XDRV.TO", "CWW.TO", "XCV.TO", "XCG.TO", "XUSR.TO", "XDV.TO", "XDSR.TO", "XEU.TO", "CEW.TO", "XEH.TO", "XUU.TO", "COW.TO", "CIF.TO", "CYH.TO", "XDNA.TO", "XCLN.TO", "XQQU.TO", "XEXP.TO", "XAW.TO", "XHAK.TO", "XETM.TO", "XCHP.TO", "CIE.TO", "XUSF.TO", "XAD.TO", "XEN.TO", "CUD.TO", "CDZ.TO", "XQLT.TO", "XIU.TO", "CJP.TO", "XEG.TO", "XST.TO", "XIC.TO", "CPD.TO", "XSMC.TO",
+            "XMA.TO", "XUSC.TO", "XSMH.TO", "XFH.TO", "XIT.TO", "XFN.TO", "XMTM.TO", "XBM.TO", "XEI.TO", "XVLU.TO", "XMD.TO", "XUT.TO", "XCSR.TO", "XPF.TO", "XHU.TO", "XGD.TO", "XSPC.TO", "XUH.TO", "XCS.TO", "XHD.TO", "CLU.TO", "XMW.TO", "XSC.TO", "XSE.TO", "CMR.TO", "CLG.TO", "CBH.TO", "CLF.TO", "CBO.TO", "CVD.TO", "XQB.TO", "XAGG.TO", "XCBG.TO", "XSHG.TO", "XAGH.TO", "XSTB.TO", "XFLB.TO", "XFLI.TO", "XFLX.TO", "XSAB.TO", "XTLH.TO", "XTLT.TO", "XFR.TO", "XGB.TO", "XCB.TO", "XSB.TO", "XSI.TO", "XRB.TO", "XLB.TO", "XHB.TO", "XBB.TO", "XSH.TO", "XSTH.TO", "XSTP.TO", "XCBU.TO", "XIGS.TO", "XSHU.TO", "XEB.TO", "XIG.TO", "XHY.TO", "GCNS.TO", "GGRO.TO", "GEQT.TO", "GBAL.TO", "XGRO.TO", "XBAL.TO", "FIE.TO", "XTR.TO", "XCNS.TO", "XEQT.TO", "XINC.TO", "CGR.TO", "XRE.TO"]
+
+
+def _download_adj_close_chunk(tickers):
+    """
+    Downloads one chunk of tickers and keeps only the 'Adj Close' field.
+
+    The full OHLCV panel returned by yfinance only ever exists for the tickers
+    in this chunk; it is reduced to a plain date x ticker frame before the
+    next chunk is requested.
+
+    Each request has a timeout and goes through `YAHOO_BREAKER` with jittered
+    retries; an empty answer for a whole chunk counts as a failure. With
+    `FETCH_MODE` 'record' the chunk is also saved as a fixture, and with
+    'replay' it is served from the fixtures without any request.
+
+    Args:
+        tickers (list): The ticker symbols to download in this request.
+
+    Returns:
+        pd.DataFrame: A DataFrame of adjusted close prices with one column per
+                      ticker. Tickers that yfinance did not return are absent.
+
+    Raises:
+        RuntimeError: If no data came back after all retries, so a refresh
+                      fails instead of publishing a partial universe.
+        FileNotFoundError: In replay mode, if nothing has been recorded.
+    """
+    if FETCH_MODE == 'replay':
+        return replay_prices(tickers)
+
+    def missing(raw):
+        return raw is None or raw.empty or 'Adj Close' not in raw.columns.get_level_values(0)
+
+    raw = call_with_retries(
+        lambda: yf.download(tickers, period="max", group_by='column', auto_adjust=False,
+                            progress=False, timeout=HTTP_READ_TIMEOUT),
+        YAHOO_BREAKER, is_failure=missing)
+    if missing(raw):
+        raise RuntimeError(f"Yahoo Finance returned no data for {tickers[0]}..{tickers[-1]}")
+
+    adj_close = raw['Adj Close']
+    if isinstance(adj_close, pd.Series):  # single ticker without a ticker level
+        adj_close = adj_close.to_frame(tickers[0])
+    if FETCH_MODE == 'record':
+        record_prices(adj_close)
+    return adj_close
+
+
+def fetch_valid_data(dtype=PRICE_DTYPE, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Downloads historical data for a predefined list of ETFs from Yahoo Finance.
+
+    Tickers are requested in chunks of `chunk_size` and each chunk is reduced
+    to its 'Adj Close' column as soon as it is parsed, so the full OHLCV panel
+    for the whole universe is never held in memory at once. Tickers for which
+    no valid 'Adj Close' data is available are filtered out. This function is
+    not cached; see `download_valid_data` for the cached entry point.
+
+    Storing prices as float32 halves the size of the cached panel. float32 keeps
+    24 bits of mantissa, so every price carries a relative rounding error of at
+    most 2**-24 (about 6e-8). The metrics derived from the prices stay well
+    inside the precision they are reported with:
+        - daily returns: absolute error below 1.2e-7
+        - annual growth (%): the ratio of two prices is off by at most 2**-23,
+          so growth g over h years is off by about 1.19e-5 * (1 + g) / h
+          percentage points (1.19e-5 at h=1, g=0)
+        - annualized standard deviation (%): relative error below 1e-4 for any
+          series whose daily volatility exceeds 0.1%
+        - max drawdown (%): error below 1.2e-5 percentage points
+
+    Args:
+        dtype (str, optional): The storage dtype for prices, 'float64' or
+                               'float32'. Defaults to `PRICE_DTYPE`.
+        chunk_size (int, optional): The number of tickers requested per
+                                    download. Defaults to `INGEST_CHUNK_SIZE`.
+
+    Returns:
+        tuple: A tuple containing:
+            - valid_tickers (list): A list of ticker symbols that have valid data.
+            - filtered_data (pd.DataFrame): A DataFrame with a multi-level index,
+              containing only the 'Adj Close' prices for the valid tickers.
+    """
+    universe = fixture_universe(ETF_LIST)  # more than ETF_LIST only in a scaled replay
+    chunks = []
+    for start in range(0, len(universe), chunk_size):
+        chunk = _download_adj_close_chunk(universe[start:start + chunk_size])
+        if not chunk.empty:
+            chunks.append(chunk.astype(dtype, copy=False))
+
+    if not chunks:
+        return [], pd.DataFrame()
+
+    adj_close = pd.concat(chunks, axis=1).sort_index()
+
+    valid_tickers = [ticker for ticker in universe
+                     if ticker in adj_close.columns and adj_close[ticker].notna().any()]
+
+    filtered_data = adj_close.loc[:, valid_tickers]
+    filtered_data.columns = pd.MultiIndex.from_tuples(
+        [(ticker, 'Adj Close') for ticker in valid_tickers])
+
+    return valid_tickers, filtered_data
 
 
 @st.cache_data(ttl=86400, show_spinner=False)
-def download_valid_data():
+def download_valid_data(dtype=PRICE_DTYPE, chunk_size=INGEST_CHUNK_SIZE):
     """
     Downloads historical data for a predefined list of ETFs from Yahoo Finance.
 
-    This function attempts to download data for all tickers in a hardcoded list.
-    It then filters out any tickers for which valid 'Adj Close' data is not available.
-    The function is decorated with Streamlit's `cache_data` to prevent
+    This is `fetch_valid_data` decorated with Streamlit's `cache_data` to prevent
     re-downloading the data on every rerun of the application, improving performance.
 
+    Args:
+        dtype (str, optional): The storage dtype for prices, 'float64' or
+                               'float32'. Defaults to `PRICE_DTYPE`.
+        chunk_size (int, optional): The number of tickers requested per
+                                    download. Defaults to `INGEST_CHUNK_SIZE`.
+
     Returns:
         tuple: A tuple containing:
             - valid_tickers (list): A list of ticker symbols that have valid data.
             - filtered_data (pd.DataFrame): A DataFrame with a multi-level index,
               containing only the 'Adj Close' prices for the valid tickers.
     """
-    
-    etf_list = ["SVR.TO", "CGL.TO", "XMV.TO", "XMI.TO", "XML.TO", "XIN.TO", "XMS.TO", "XMY.TO", "XEM.TO", "XMM.TO", "XEC.TO", "XUS.TO", "XEF.TO", "XMH.TO", "XMC.TO", "XDIV.TO", "XMU.TO", "XQQ.TO", "XWD.TO", "XDUH.TO", "XDG.TO", "XSU.TO", "XDU.TO", "XSUS.TO", "XSEA.TO", "XDGH.TO", "XESG.TO", "XGI.TO", "XCD.TO", "XSEM.TO", "XSP.TO", "CWO.TO", "CRQ.TO", "XID.TO", "XCH.TO", "XEMC.TO", "XHC.TO", "XDRV.TO", "CWW.TO", "XCV.TO", "XCG.TO", "XUSR.TO", "XDV.TO", "XDSR.TO", "XEU.TO", "CEW.TO", "XEH.TO", "XUU.TO", "COW.TO", "CIF.TO", "CYH.TO", "XDNA.TO", "XCLN.TO", "XQQU.TO", "XEXP.TO", "XAW.TO", "XHAK.TO", "XETM.TO", "XCHP.TO", "CIE.TO", "XUSF.TO", "XAD.TO", "XEN.TO", "CUD.TO", "CDZ.TO", "XQLT.TO", "XIU.TO", "CJP.TO", "XEG.TO", "XST.TO", "XIC.TO", "CPD.TO", "XSMC.TO",
-                "XMA.TO", "XUSC.TO", "XSMH.TO", "XFH.TO", "XIT.TO", "XFN.TO", "XMTM.TO", "XBM.TO", "XEI.TO", "XVLU.TO", "XMD.TO", "XUT.TO", "XCSR.TO", "XPF.TO", "XHU.TO", "XGD.TO", "XSPC.TO", "XUH.TO", "XCS.TO", "XHD.TO", "CLU.TO", "XMW.TO", "XSC.TO", "XSE.TO", "CMR.TO", "CLG.TO", "CBH.TO", "CLF.TO", "CBO.TO", "CVD.TO", "XQB.TO", "XAGG.TO", "XCBG.TO", "XSHG.TO", "XAGH.TO", "XSTB.TO", "XFLB.TO", "XFLI.TO", "XFLX.TO", "XSAB.TO", "XTLH.TO", "XTLT.TO", "XFR.TO", "XGB.TO", "XCB.TO", "XSB.TO", "XSI.TO", "XRB.TO", "XLB.TO", "XHB.TO", "XBB.TO", "XSH.TO", "XSTH.TO", "XSTP.TO", "XCBU.TO", "XIGS.TO", "XSHU.TO", "XEB.TO", "XIG.TO", "XHY.TO", "GCNS.TO", "GGRO.TO", "GEQT.TO", "GBAL.TO", "XGRO.TO", "XBAL.TO", "FIE.TO", "XTR.TO", "XCNS.TO", "XEQT.TO", "XINC.TO", "CGR.TO", "XRE.TO"]
+    return fetch_valid_data(dtype, chunk_size)
 
-    data = yf.download(etf_list, period="max", group_by='ticker',
-                       auto_adjust=False, progress=False)
 
-    valid_tickers = []
-    for ticker in etf_list:
-        try:
-            if (ticker, 'Adj Close') in data.columns and not data[(ticker, 'Adj Close')].dropna().empty:
-                valid_tickers.append(ticker)
-        except Exception:
-            continue
+def ingest_memory_report(data, price_fields=OHLCV_FIELD_COUNT):
+    """
+    Reports the memory saved by the lean ingest compared to the full panel.
+
+    The full panel is estimated as what `yf.download` materializes for the same
+    dates and tickers: `price_fields` float64 columns per ticker.
+
+    Args:
+        data (pd.DataFrame): The price panel returned by `download_valid_data`.
+        price_fields (int, optional): The number of fields in the full OHLCV
+                                      panel. Defaults to `OHLCV_FIELD_COUNT`.
 
-    filtered_data = data.loc[:, [(ticker, 'Adj Close')
-                                 for ticker in valid_tickers]]
+    Returns:
+        dict: A dictionary with 'full_panel_bytes', 'lean_bytes',
+              'saved_bytes', 'saved_pct' and 'dtype'.
+    """
+    n_rows, n_tickers = data.shape
+    full_panel_bytes = n_rows * n_tickers * price_fields * np.dtype('float64').itemsize
+    lean_bytes = int(data.memory_usage(index=False).sum())
+    saved_bytes = full_panel_bytes - lean_bytes
 
-    return valid_tickers, filtered_data
\ No newline at end of file
+    return {
+        'full_panel_bytes': full_panel_bytes,
+        'lean_bytes': lean_bytes,
+        'saved_bytes': saved_bytes,
+        'saved_pct': round(100 * saved_bytes / full_panel_bytes, 2) if full_panel_bytes else 0.0,
+        'dtype': str(data.dtypes.iloc[0]) if n_tickers else PRICE_DTYPE,
+    }
@@ -0,0 +1,161 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import threading
+
+import numpy as np
+import pandas as pd
+from config.constants import (
+    PYRAMID_PERIODS, PERIODS_PER_YEAR, PYRAMID_VOLATILITY_TOLERANCE, PYRAMID_CHART_MAX_POINTS
+)
+from core.data_processing.shared_prices import snapshot_version
+
+RESOLUTIONS = ('daily', 'weekly', 'monthly')
+
+
+def _downsample(data, period):
+    # Last valid price of each ticker per period, dated on the period's last trading day
+    periods = data.index.to_period(period)
+    codes, uniques = pd.factorize(periods, sort=True)
+    coarse = data.groupby(codes).last()
+    last_day = pd.Series(data.index).groupby(codes).max()
+    coarse.index = pd.DatetimeIndex(last_day.to_numpy(), name=data.index.name)
+
+    # How far any daily price sits above (drop) or below (rise) the sample of its period
+    prices = data.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_gap = np.log(prices / coarse.to_numpy(dtype=float)[codes])
+    log_gap = np.nan_to_num(log_gap, nan=0.0, posinf=0.0, neginf=0.0)
+    drift = log_gap.max(axis=0, initial=0.0) - log_gap.min(axis=0, initial=0.0)
+    return coarse, pd.Series(drift, index=list(data.columns.get_level_values(0)))
+
+
+def build_price_pyramid(data):
+    """
+    Builds daily, weekly and month-end versions of the price panel.
+
+    Each coarser level keeps the last valid price of every ticker per period,
+    dated on the period's last trading day, so a level has roughly 1/5
+    (weekly) or 1/21 (monthly) of the daily bars. Along with each level the
+    largest log distance between any daily price and its period's sample is
+    stored per ticker ('drift'); it bounds the drawdown error of that level.
+
+    Error bounds versus daily data:
+        - Maximum drawdown: sampling can only miss part of a fall, so the
+          coarse drawdown is never deeper than the daily one and the daily
+          log drawdown exceeds it by at most the ticker's drift.
+        - Volatility: the annualized standard deviation of weekly or monthly
+          returns estimates the same quantity from fewer observations; its
+          relative standard error is about 1 / sqrt(2 * (n - 1)) for n
+          returns (see `volatility_error_bound`), plus any bias from
+          short-term autocorrelation that daily returns smooth out.
+        - Annual growth: the window start snaps to the first sample on or
+          after it, at most one period late, so the annualized growth moves
+          by at most that period's return divided by the horizon in years.
+        - Charts: points between samples are omitted; every plotted point is
+          an actual closing price.
+
+    Args:
+        data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'daily', 'weekly', 'monthly' (pd.DataFrame): The panels, with
+              the same columns as `data`.
+            - 'drift' (dict): Resolution -> pd.Series of the per-ticker drift
+              in log points (0 for 'daily').
+            - 'first_dates' (pd.Series): Each ticker's first daily price date.
+    """
+    tickers = list(data.columns.get_level_values(0))
+    pyramid = {'daily': data, 'drift': {'daily': pd.Series(0.0, index=tickers)}}
+    for resolution, period in PYRAMID_PERIODS.items():
+        pyramid[resolution], pyramid['drift'][resolution] = _downsample(data, period)
+
+    valid = data.notna().to_numpy()
+    # Series.where keeps the datetime dtype; np.where with NaT degrades
+    # nanosecond dates to integers
+    first = pd.Series(data.index[np.argmax(valid, axis=0)], index=tickers)
+    pyramid['first_dates'] = first.where(valid.any(axis=0))
+    return pyramid
+
+
+# snapshot -> pyramid; one entry, replaced when a new snapshot arrives
+_pyramid_cache = {}
+_pyramid_lock = threading.Lock()
+
+
+def get_price_pyramid(data):
+    """
+    Returns the price pyramid of a panel, built once per snapshot.
+
+    Args:
+        data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+
+    Returns:
+        dict: The output of `build_price_pyramid`.
+    """
+    version = snapshot_version(data)
+    with _pyramid_lock:
+        pyramid = _pyramid_cache.get(version)
+        if pyramid is None:
+            pyramid = build_price_pyramid(data)
+            _pyramid_cache.clear()
+            _pyramid_cache[version] = pyramid
+        return pyramid
+
+
+def volatility_error_bound(resolution, time_horizon):
+    """
+    Returns the relative standard error of an annualized volatility estimate.
+
+    Args:
+        resolution (str): One of `RESOLUTIONS`.
+        time_horizon (int): The window length in years.
+
+    Returns:
+        float: About 1 / sqrt(2 * (n - 1)) for n returns in the window.
+    """
+    n = PERIODS_PER_YEAR[resolution] * time_horizon
+    return 1 / np.sqrt(2 * max(n - 1, 1))
+
+
+def choose_resolution(time_horizon, tolerance=PYRAMID_VOLATILITY_TOLERANCE):
+    """
+    Picks the coarsest resolution whose volatility error stays within `tolerance`.
+
+    With the default tolerance, horizons of 1 and 4 years use daily data and
+    8 years or more use weekly data.
+
+    Args:
+        time_horizon (int): The window length in years.
+        tolerance (float, optional): The accepted relative standard error.
+                                     Defaults to `PYRAMID_VOLATILITY_TOLERANCE`.
+
+    Returns:
+        str: One of `RESOLUTIONS`.
+    """
+    for resolution in reversed(RESOLUTIONS):
+        if volatility_error_bound(resolution, time_horizon) <= tolerance:
+            return resolution
+    return 'daily'
+
+
+def chart_resolution(start_date, end_date, max_points=PYRAMID_CHART_MAX_POINTS):
+    """
+    Picks the finest resolution that plots at most `max_points` per series.
+
+    Args:
+        start_date (pd.Timestamp): The first plotted date.
+        end_date (pd.Timestamp): The last plotted date.
+        max_points (int, optional): The point budget per series. Defaults to
+                                    `PYRAMID_CHART_MAX_POINTS`.
+
+    Returns:
+        str: One of `RESOLUTIONS`.
+    """
+    years = max((end_date - start_date).days / 365.25, 0)
+    for resolution in RESOLUTIONS:
+        if years * PERIODS_PER_YEAR[resolution] <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
@@ -1,10 +1,41 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import threading
+
 import requests
+import numpy as np
 import pandas as pd
 import streamlit as st
+from config.constants import TRADING_DAYS_PER_YEAR, RISK_FREE_REFRESH_SECONDS, BOC_VALET_URL, FETCH_MODE
+from core.data_processing.fixtures import record_json, replay_json
+from core.data_processing.http_client import http_get, BOC_BREAKER
+from core.data_processing.shared_prices import snapshot_version, get_shared_risk_free
+
+BOC_FIXTURE = 'boc_V39079'
+
+
+def _request_boc(start_date, base_url):
+    # The decoded Valet response for the 3-month T-bill series
+    url = f"{base_url}/observations/V39079/json?start_date={start_date}"
+    response = http_get(url, BOC_BREAKER)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        # surface the HTTP error with context
+        raise RuntimeError(
+            f"Failed to fetch BoC data: {e}. Response text: {response.text[:500]}") from e
+
+    try:
+        return response.json()
+    except ValueError as e:
+        raise RuntimeError(
+            f"Response not valid JSON. Raw content starts with: {response.text[:500]}") from e
 
 
 @st.cache_data(ttl=604800, show_spinner=False)
-def fetch_risk_free_boc(start_date="1995-01-01"):
+def fetch_risk_free_boc(start_date="1995-01-01", base_url=BOC_VALET_URL):
     """
     Downloads historical 3-month Treasury Bill secondary-market average yield from the Bank of Canada (BoC).
 
@@ -12,9 +43,18 @@ def fetch_risk_free_boc(start_date="1995-01-01"):
     parses the JSON response, and returns a pandas DataFrame. The data is
     business-day interpolated to provide a daily risk-free rate.
 
+    The request uses the pooled session with connect/read timeouts, jittered
+    retries and `BOC_BREAKER`, so an unhealthy upstream fails fast instead of
+    hanging; callers then keep the last good snapshot.
+
+    With `FETCH_MODE` 'record' the decoded response is saved as the
+    'boc_V39079' fixture; with 'replay' that fixture is parsed instead, from
+    `start_date` on, without any request.
+
     Args:
         start_date (str, optional): The start date for the data retrieval in
                                     'YYYY-MM-DD' format. Defaults to '1995-01-01'.
+        base_url (str, optional): The Valet API root. Defaults to `BOC_VALET_URL`.
 
     Returns:
         pd.DataFrame: A DataFrame with the daily risk-free rates, indexed by date.
@@ -24,22 +64,19 @@ def fetch_risk_free_boc(start_date="1995-01-01"):
     Raises:
         RuntimeError: If there are issues fetching the data from the API,
                       the response is not valid JSON, or no observations are found.
+        CircuitOpenError: If the BoC circuit is open after repeated failures.
+        requests.RequestException: If the API stays unreachable after retries.
+        FileNotFoundError: In replay mode, if the fixture was never recorded.
     """
     
-    url = f"https://www.bankofcanada.ca/valet/observations/V39079/json?start_date={start_date}"
-    response = requests.get(url)
-    try:
-        response.raise_for_status()
-    except requests.HTTPError as e:
-        # surface the HTTP error with context
-        raise RuntimeError(
-            f"Failed to fetch BoC data: {e}. Response text: {response.text[:500]}") from e
-
-    try:
-        payload = response.json()
-    except ValueError as e:
-        raise RuntimeError(
-            f"Response not valid JSON. Raw content starts with: {response.text[:500]}") from e
+    if FETCH_MODE == 'replay':
+        payload = replay_json(BOC_FIXTURE)
+        payload['observations'] = [obs for obs in payload.get('observations') or []
+                                   if obs.get('d', '') >= start_date]
+    else:
+        payload = _request_boc(start_date, base_url)
+        if FETCH_MODE == 'record':
+            record_json(BOC_FIXTURE, payload)
 
     observations = payload.get("observations")
     if not observations:
@@ -83,3 +120,94 @@ def fetch_risk_free_boc(start_date="1995-01-01"):
     df = pd.DataFrame(rows).set_index("date").sort_index()
     df_daily = df.copy()
     return df_daily
+
+
+def average_risk_free_rate(risk_free_df, time_horizon, end_date=None):
+    """
+    Averages the risk-free yield over the last `time_horizon` years of the series.
+
+    Args:
+        risk_free_df (pd.DataFrame): The output of `fetch_risk_free_boc`.
+        time_horizon (int): The averaging window in years.
+        end_date (pd.Timestamp, optional): The end of the window, normally the
+                                           ETF window's end date. Defaults to
+                                           the latest observation.
+
+    Returns:
+        float: The mean annualized yield in percent over the window.
+    """
+    end = risk_free_df.index.max() if end_date is None else end_date
+    start = end - pd.DateOffset(years=time_horizon)
+    return risk_free_df.loc[start:end, 'yield_pct'].mean()
+
+
+def align_risk_free_daily(risk_free_df, dates):
+    """
+    Aligns the BoC yield to a trading calendar and converts it to daily rates.
+
+    Each trading day takes the latest yield published on or before it
+    (forward fill via `searchsorted`); days before the first observation take
+    the first one. The annualized percentage yield is converted to the
+    equivalent daily compounded rate over `TRADING_DAYS_PER_YEAR` days.
+
+    Args:
+        risk_free_df (pd.DataFrame): The output of `fetch_risk_free_boc`.
+        dates (pd.DatetimeIndex): The trading days, e.g. the price panel's index.
+
+    Returns:
+        pd.Series: The daily risk-free rate (as a fraction) for each date.
+    """
+    observed = risk_free_df['yield_pct'].dropna().sort_index()
+    positions = observed.index.searchsorted(dates, side='right') - 1
+    yields = observed.to_numpy()[np.maximum(positions, 0)]
+    daily = (1 + yields / 100) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+    return pd.Series(daily, index=dates, name='daily_rf')
+
+
+# (snapshot, risk-free key) -> aligned series; one entry per price snapshot
+_aligned_cache = {}
+_aligned_lock = threading.Lock()
+
+
+def get_daily_risk_free(price_data, risk_free_df):
+    """
+    Returns the daily risk-free series aligned to the price panel's calendar.
+
+    The alignment is done once per price snapshot and risk-free download, and
+    reused by every scorer and session until either changes.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        risk_free_df (pd.DataFrame): The output of `fetch_risk_free_boc`.
+
+    Returns:
+        pd.Series: The daily risk-free rate for every date of `price_data`.
+    """
+    key = (snapshot_version(price_data), snapshot_version(risk_free_df))
+    with _aligned_lock:
+        aligned = _aligned_cache.get(key)
+        if aligned is None:
+            aligned = align_risk_free_daily(risk_free_df, price_data.index)
+            _aligned_cache.clear()
+            _aligned_cache[key] = aligned
+        return aligned
+
+
+def get_risk_free_snapshot(max_age=RISK_FREE_REFRESH_SECONDS):
+    """
+    Returns the BoC series from the local content-hashed snapshot store.
+
+    The series is downloaded with `fetch_risk_free_boc` in the background
+    once the current snapshot is older than `max_age`; its content hash is
+    available through `snapshot_version` and keys every derived cache.
+
+    Args:
+        max_age (int, optional): The refresh interval in seconds. Defaults to
+                                 `RISK_FREE_REFRESH_SECONDS`.
+
+    Returns:
+        pd.DataFrame: The series in the layout of `fetch_risk_free_boc`.
+    """
+    # Bypass the st.cache_data layer so a refresh really downloads
+    fetch = getattr(fetch_risk_free_boc, '__wrapped__', fetch_risk_free_boc)
+    return get_shared_risk_free(lambda: fetch("1995-01-01"), max_age=max_age)
@@ -0,0 +1,585 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import json
+import shutil
+import threading
+import time
+import hashlib
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; the writer lock becomes per-process
+    fcntl = None
+
+from config.constants import (
+    SHARED_PRICE_DIR, SHARED_PRICE_REFRESH_SECONDS, SHARED_PRICE_KEEP_VERSIONS,
+    SNAPSHOT_RETENTION_DAYS, PINNED_PRICE_SNAPSHOT, PINNED_RISK_FREE_SNAPSHOT,
+    SNAPSHOT_REFRESH_RETRY_SECONDS
+)
+from core.data_processing.ishares_ETF_list import fetch_valid_data, ingest_memory_report
+from core.data_processing.data_quality import assess_quality, clean_price_data, QUALITY_FLAGS
+
+SNAPSHOT_VERSION_ATTR = 'snapshot_version'
+PRICES = 'prices'
+RISK_FREE = 'risk_free'
+
+_CURRENT_FILE = 'CURRENT'
+_LOCK_FILE = '.lock'
+_PRICES_FILE = 'prices.npy'
+_DATES_FILE = 'dates.npy'
+_META_FILE = 'meta.json'
+_YIELDS_FILE = 'yields.npy'
+_QUALITY_FILE = 'quality.npz'
+_QUALITY_REPORT_FILE = 'quality_report.csv'
+
+# Per-process view of the mapped matrix: every session thread shares this one
+# DataFrame instead of receiving a deserialized copy.
+_mapped = {'directory': None, 'version': None, 'value': None}
+_mapped_lock = threading.Lock()
+_process_write_locks = {}
+_process_write_locks_guard = threading.Lock()
+
+# root -> refresh bookkeeping for `refresh_metrics`
+_refresh_state = {}
+_refresh_state_lock = threading.Lock()
+
+
+@contextmanager
+def _writer_lock(directory, blocking=True):
+    """
+    Holds an exclusive lock so only one process refreshes the matrix at a time.
+
+    Yields True when the lock is held. With `blocking=False` it yields False
+    instead of waiting when another thread or process holds it.
+    """
+    with _process_write_locks_guard:
+        process_lock = _process_write_locks.setdefault(directory, threading.Lock())
+    if not process_lock.acquire(blocking):
+        yield False
+        return
+    try:
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(directory, _LOCK_FILE), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        process_lock.release()
+
+
+def _snapshot_root(directory, kind):
+    return directory if kind == PRICES else os.path.join(directory, kind)
+
+
+def current_version(directory=SHARED_PRICE_DIR, kind=None):
+    """
+    Reads the version name of the snapshot currently published in `directory`.
+
+    Args:
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        kind (str, optional): `PRICES` or `RISK_FREE`. Defaults to `PRICES`.
+
+    Returns:
+        str or None: The version name, or None when nothing has been published.
+    """
+    root = _snapshot_root(directory, kind or PRICES)
+    try:
+        with open(os.path.join(root, _CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _read_meta(root, version):
+    with open(os.path.join(root, version, _META_FILE)) as f:
+        return json.load(f)
+
+
+def _current_meta(directory):
+    # Metadata of the current price snapshot, empty when there is none
+    version = current_version(directory)
+    try:
+        return _read_meta(directory, version) if version else {}
+    except FileNotFoundError:
+        return {}
+
+
+def content_hash(arrays, labels):
+    """
+    Hashes the content of a snapshot.
+
+    Args:
+        arrays (list): The numpy arrays making up the snapshot.
+        labels (list): JSON-serializable labels such as the ticker list.
+
+    Returns:
+        str: The first 16 hex digits of the SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(labels).encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.view(np.uint8).reshape(-1).data)
+    return digest.hexdigest()[:16]
+
+
+def _publish_snapshot(root, files, meta, write_extra=None,
+                      keep_versions=SHARED_PRICE_KEEP_VERSIONS,
+                      retention_days=SNAPSHOT_RETENTION_DAYS, protect=()):
+    # Snapshots are immutable and named by their content hash: identical content
+    # is never written twice, only re-pointed, which also marks it as refreshed.
+    os.makedirs(root, exist_ok=True)
+    version = meta['version']
+    target = os.path.join(root, version)
+    if not os.path.isdir(target):
+        staging = os.path.join(root, f".staging-{version}-{os.getpid()}")
+        os.makedirs(staging)
+        for name, array in files.items():
+            np.save(os.path.join(staging, name), array)
+        if write_extra is not None:
+            write_extra(staging)
+        with open(os.path.join(staging, _META_FILE), 'w') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another process published the same content first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+
+    pointer_tmp = os.path.join(root, f".{_CURRENT_FILE}-{os.getpid()}")
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, _CURRENT_FILE))
+
+    _remove_old_versions(root, version, keep_versions, retention_days, protect)
+    return version
+
+
+def publish_price_matrix(valid_tickers, data, directory=SHARED_PRICE_DIR,
+                         keep_versions=SHARED_PRICE_KEEP_VERSIONS,
+                         retention_days=SNAPSHOT_RETENTION_DAYS):
+    """
+    Writes the price matrix as an immutable, content-hashed snapshot and publishes it.
+
+    The data-quality pass runs here, once per refresh: the flags are stored as
+    bitmasks next to the prices together with a per-ticker report, and the
+    published prices are the cleaned ones, so no reader has to clean again.
+    The snapshot's metadata also keeps its `ingest_memory_report`, which
+    `refresh_metrics` returns.
+
+    The version name is the hash of the cleaned prices, dates and tickers, so
+    the same data always gets the same name and every derived cache can be
+    keyed on it. A new snapshot is written to a temporary directory, renamed
+    into place and only then made current by atomically replacing the
+    `CURRENT` pointer, so readers always map a complete snapshot. Snapshots
+    other than the newest `keep_versions` that are also older than
+    `retention_days` are removed (a pinned snapshot is never removed);
+    processes that still map them keep their mapping until they switch.
+
+    Args:
+        valid_tickers (list): The ticker symbols, in column order.
+        data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        keep_versions (int, optional): How many previous versions to keep.
+                                       Defaults to `SHARED_PRICE_KEEP_VERSIONS`.
+        retention_days (float, optional): Minimum age before a previous version
+                                          may be removed. Defaults to
+                                          `SNAPSHOT_RETENTION_DAYS`.
+
+    Returns:
+        str: The version name (content hash) of the published snapshot.
+    """
+    quality = assess_quality(data)
+    data = clean_price_data(data, quality)
+
+    def write_quality(staging):
+        np.savez(os.path.join(staging, _QUALITY_FILE), n_dates=quality['n_dates'],
+                 split_ratios=quality['split_ratios'], **quality['flags'])
+        quality['report'].to_csv(os.path.join(staging, _QUALITY_REPORT_FILE), index=False)
+
+    prices = np.ascontiguousarray(data.to_numpy())
+    dates = data.index.to_numpy(dtype='datetime64[ns]')
+    version = content_hash([prices, dates], list(valid_tickers))
+    meta = {
+        'version': version,
+        'tickers': list(valid_tickers),
+        'dtype': str(prices.dtype),
+        'shape': list(prices.shape),
+        'published_at': time.time(),
+        'ingest_memory': ingest_memory_report(data),
+    }
+    return _publish_snapshot(directory, {_PRICES_FILE: prices, _DATES_FILE: dates}, meta,
+                             write_quality, keep_versions, retention_days,
+                             protect=[PINNED_PRICE_SNAPSHOT])
+
+
+def publish_risk_free(risk_free_df, directory=SHARED_PRICE_DIR,
+                      keep_versions=SHARED_PRICE_KEEP_VERSIONS,
+                      retention_days=SNAPSHOT_RETENTION_DAYS):
+    """
+    Writes the risk-free series as an immutable, content-hashed snapshot.
+
+    Stored under `<directory>/risk_free` with the same versioning, atomic
+    publishing and retention as the price matrix.
+
+    Args:
+        risk_free_df (pd.DataFrame): The output of `fetch_risk_free_boc`.
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        keep_versions (int, optional): How many previous versions to keep.
+        retention_days (float, optional): Minimum age before a previous version
+                                          may be removed.
+
+    Returns:
+        str: The version name (content hash) of the published snapshot.
+    """
+    yields = risk_free_df['yield_pct'].to_numpy(dtype=float)
+    dates = risk_free_df.index.to_numpy(dtype='datetime64[ns]')
+    version = content_hash([yields, dates], ['yield_pct'])
+    meta = {'version': version, 'shape': [len(yields)], 'published_at': time.time()}
+    return _publish_snapshot(_snapshot_root(directory, RISK_FREE),
+                             {_YIELDS_FILE: yields, _DATES_FILE: dates}, meta,
+                             keep_versions=keep_versions, retention_days=retention_days,
+                             protect=[PINNED_RISK_FREE_SNAPSHOT])
+
+
+def _remove_old_versions(root, current, keep_versions, retention_days, protect=()):
+    published = []
+    for name in os.listdir(root):
+        if name.startswith('.') or name == current or name in protect:
+            continue
+        try:
+            published.append((_read_meta(root, name)['published_at'], name))
+        except (FileNotFoundError, NotADirectoryError, KeyError, ValueError):
+            continue
+    published.sort(reverse=True)
+    cutoff = time.time() - retention_days * 86400
+    for published_at, name in published[keep_versions:]:
+        if published_at < cutoff:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def load_price_matrix(directory=SHARED_PRICE_DIR, version=None):
+    """
+    Maps a published price matrix read-only into this process.
+
+    The returned DataFrame wraps the memory-mapped array without copying, so
+    the pages are shared by every process that maps the same version. Repeated
+    calls return the same object until a new version is published.
+
+    Args:
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        version (str, optional): A content hash to load instead of the current
+                                 snapshot, for reproducible reruns.
+
+    Returns:
+        tuple or None: `(valid_tickers, data)` in the same layout as
+                       `download_valid_data`, or None when nothing is published.
+    """
+    version = version or current_version(directory)
+    if version is None:
+        return None
+
+    with _mapped_lock:
+        if _mapped['directory'] == directory and _mapped['version'] == version:
+            return _mapped['value']
+
+        meta = _read_meta(directory, version)
+        version_dir = os.path.join(directory, version)
+        prices = np.load(os.path.join(version_dir, _PRICES_FILE), mmap_mode='r')
+        dates = np.load(os.path.join(version_dir, _DATES_FILE))
+
+        tickers = meta['tickers']
+        data = pd.DataFrame(
+            prices,
+            index=pd.DatetimeIndex(dates, name='Date'),
+            columns=pd.MultiIndex.from_tuples([(ticker, 'Adj Close') for ticker in tickers]),
+            copy=False,
+        )
+        _tag_snapshot(data, version)
+
+        value = (tickers, data)
+        _mapped.update(directory=directory, version=version, value=value)
+        return value
+
+
+def load_risk_free(directory=SHARED_PRICE_DIR, version=None):
+    """
+    Reads a published risk-free snapshot.
+
+    Args:
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        version (str, optional): A content hash to load instead of the current
+                                 snapshot.
+
+    Returns:
+        pd.DataFrame or None: The series in the layout of `fetch_risk_free_boc`,
+                              or None when nothing is published.
+    """
+    root = _snapshot_root(directory, RISK_FREE)
+    version = version or current_version(directory, RISK_FREE)
+    if version is None:
+        return None
+    version_dir = os.path.join(root, version)
+    risk_free_df = pd.DataFrame(
+        {'yield_pct': np.load(os.path.join(version_dir, _YIELDS_FILE))},
+        index=pd.DatetimeIndex(np.load(os.path.join(version_dir, _DATES_FILE)), name='date'),
+    )
+    _tag_snapshot(risk_free_df, version)
+    return risk_free_df
+
+
+def load_quality(directory=SHARED_PRICE_DIR, version=None):
+    """
+    Reads the data-quality masks and report stored with a price snapshot.
+
+    Args:
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        version (str, optional): The snapshot's content hash. Defaults to the
+                                 current snapshot.
+
+    Returns:
+        dict or None: The same layout as `assess_quality`, or None when nothing
+                      is published or the snapshot has no quality files.
+    """
+    version = version or current_version(directory)
+    if version is None:
+        return None
+    version_dir = os.path.join(directory, version)
+    try:
+        with np.load(os.path.join(version_dir, _QUALITY_FILE)) as stored:
+            quality = {
+                'flags': {name: stored[name] for name in QUALITY_FLAGS},
+                'n_dates': int(stored['n_dates']),
+                'split_ratios': stored['split_ratios'],
+            }
+        quality['report'] = pd.read_csv(os.path.join(version_dir, _QUALITY_REPORT_FILE),
+                                        parse_dates=['First_Date', 'Last_Date'])
+    except FileNotFoundError:
+        return None
+    return quality
+
+
+def _run_refresh(root, refresh, max_age):
+    # Caller holds the writer lock. Another process may have refreshed while
+    # we waited for it, so staleness is checked again.
+    if not _is_stale(root, max_age):
+        return
+    started = time.time()
+    try:
+        refresh()
+    except Exception as e:
+        with _refresh_state_lock:
+            _refresh_state.setdefault(root, {}).update(last_error=str(e), last_attempt=started)
+        raise
+    with _refresh_state_lock:
+        state = _refresh_state.setdefault(root, {})
+        state.update(last_duration=time.time() - started, last_refresh=time.time(),
+                     last_error=None, last_attempt=started,
+                     refresh_count=state.get('refresh_count', 0) + 1)
+
+
+def _background_refresh(root, refresh, max_age):
+    try:
+        with _writer_lock(root, blocking=False) as acquired:
+            # Not acquired: another thread or process is already refreshing
+            if acquired:
+                _run_refresh(root, refresh, max_age)
+    except Exception:
+        pass  # recorded in _refresh_state; the stale snapshot keeps being served
+    finally:
+        with _refresh_state_lock:
+            _refresh_state[root]['thread'] = None
+
+
+def _get_or_revalidate(root, max_age, refresh, load):
+    # Stale-while-revalidate: a stale snapshot is returned at once and a single
+    # background thread refreshes it; only a missing snapshot blocks the caller.
+    # After a failed attempt the next one waits SNAPSHOT_REFRESH_RETRY_SECONDS.
+    if _has_snapshot(root):
+        if _is_stale(root, max_age):
+            with _refresh_state_lock:
+                state = _refresh_state.setdefault(root, {})
+                retry_at = state.get('last_attempt', 0) + SNAPSHOT_REFRESH_RETRY_SECONDS
+                if state.get('thread') is None and (state.get('last_error') is None or time.time() >= retry_at):
+                    state['thread'] = threading.Thread(target=_background_refresh,
+                                                       args=(root, refresh, max_age), daemon=True)
+                    state['thread'].start()
+        return load()
+
+    os.makedirs(root, exist_ok=True)
+    with _writer_lock(root):
+        _run_refresh(root, refresh, max_age)
+    return load()
+
+
+def _has_snapshot(root):
+    return os.path.exists(os.path.join(root, _CURRENT_FILE))
+
+
+def get_shared_price_data(directory=SHARED_PRICE_DIR, max_age=SHARED_PRICE_REFRESH_SECONDS):
+    """
+    Returns the shared price matrix, refreshing it in the background when it is too old.
+
+    This is the multi-process replacement for calling `download_valid_data` in
+    each worker. When the published snapshot is older than `max_age` seconds
+    it is still returned immediately, and one background refresh, shared by
+    all sessions of the process and guarded across processes by the writer
+    lock, downloads and publishes a new version. The `CURRENT` pointer swap
+    is atomic, so later calls map the new snapshot. Only when nothing has
+    been published yet does the caller wait for the download. When
+    `PINNED_PRICE_SNAPSHOT` is set, that snapshot is loaded and never
+    refreshed, so a run can be reproduced exactly.
+
+    Args:
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        max_age (int, optional): The refresh interval in seconds. Defaults to
+                                 `SHARED_PRICE_REFRESH_SECONDS`.
+
+    Returns:
+        tuple: `(valid_tickers, data)` in the same layout as `download_valid_data`.
+    """
+    if PINNED_PRICE_SNAPSHOT:
+        return load_price_matrix(directory, PINNED_PRICE_SNAPSHOT)
+
+    def refresh():
+        valid_tickers, data = fetch_valid_data()
+        publish_price_matrix(valid_tickers, data, directory)
+
+    return _get_or_revalidate(directory, max_age, refresh, lambda: load_price_matrix(directory))
+
+
+def get_shared_risk_free(fetch, directory=SHARED_PRICE_DIR, max_age=SHARED_PRICE_REFRESH_SECONDS):
+    """
+    Returns the shared risk-free snapshot, refreshing it in the background when it is too old.
+
+    Works like `get_shared_price_data`; `PINNED_RISK_FREE_SNAPSHOT` pins a version.
+
+    Args:
+        fetch (callable): Downloads a fresh series, e.g. `fetch_risk_free_boc`.
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+        max_age (int, optional): The refresh interval in seconds.
+
+    Returns:
+        pd.DataFrame: The series in the layout of `fetch_risk_free_boc`.
+    """
+    if PINNED_RISK_FREE_SNAPSHOT:
+        return load_risk_free(directory, PINNED_RISK_FREE_SNAPSHOT)
+    return _get_or_revalidate(_snapshot_root(directory, RISK_FREE), max_age,
+                              lambda: publish_risk_free(fetch(), directory),
+                              lambda: load_risk_free(directory))
+
+
+def refresh_metrics(directory=SHARED_PRICE_DIR):
+    """
+    Reports the staleness and refresh timings of the price and risk-free snapshots.
+
+    Args:
+        directory (str, optional): The shared directory. Defaults to
+                                   `SHARED_PRICE_DIR`.
+
+    Returns:
+        dict: `PRICES` and `RISK_FREE` -> dict with:
+            - 'version' (str or None): The current content hash.
+            - 'age_seconds' (float or None): Time since the last successful
+              refresh by any process.
+            - 'refreshing' (bool): Whether this process is refreshing now.
+            - 'last_duration_seconds' (float or None): How long this process's
+              last successful refresh took.
+            - 'refresh_count' (int): Successful refreshes by this process.
+            - 'last_error' (str or None): The error of the last failed attempt.
+            `PRICES` also has 'ingest_memory' (dict or None): the
+            `ingest_memory_report` stored with the current snapshot.
+    """
+    metrics = {}
+    for kind in (PRICES, RISK_FREE):
+        root = _snapshot_root(directory, kind)
+        try:
+            age = time.time() - os.path.getmtime(os.path.join(root, _CURRENT_FILE))
+        except FileNotFoundError:
+            age = None
+        with _refresh_state_lock:
+            state = dict(_refresh_state.get(root, {}))
+        metrics[kind] = {
+            'version': current_version(directory, kind),
+            'age_seconds': age,
+            'refreshing': state.get('thread') is not None,
+            'last_duration_seconds': state.get('last_duration'),
+            'refresh_count': state.get('refresh_count', 0),
+            'last_error': state.get('last_error'),
+        }
+    metrics[PRICES]['ingest_memory'] = _current_meta(directory).get('ingest_memory')
+    return metrics
+
+
+def _is_stale(root, max_age):
+    # Re-publishing identical content only rewrites the pointer, so its
+    # modification time is the time of the last successful refresh
+    try:
+        refreshed_at = os.path.getmtime(os.path.join(root, _CURRENT_FILE))
+    except FileNotFoundError:
+        return True
+    return time.time() - refreshed_at > max_age
+
+
+def _frame_identity(frame):
+    # pandas copies attrs onto slices, selections and arithmetic results, so
+    # a tag is only trusted on the very object it was put on, unchanged in shape
+    bounds = (str(frame.index[0]), str(frame.index[-1])) if len(frame) else None
+    return id(frame), frame.shape, bounds
+
+
+def _tag_snapshot(frame, version):
+    frame.attrs[SNAPSHOT_VERSION_ATTR] = (version,) + _frame_identity(frame)
+
+
+def snapshot_version(data):
+    """
+    Returns a key identifying the snapshot a price panel belongs to.
+
+    Frames loaded from a snapshot (`load_price_matrix`, `load_risk_free`)
+    carry its content hash. pandas copies that tag onto every frame derived
+    from them (`.loc[:date]`, column selections, `ffill`, arithmetic), so it
+    is only used for the loaded object itself. Any other frame, derived ones
+    included, is keyed on a hash of its full contents, index and columns.
+
+    Args:
+        data (pd.DataFrame): A price panel or risk-free series.
+
+    Returns:
+        str: The snapshot key.
+    """
+    tag = data.attrs.get(SNAPSHOT_VERSION_ATTR)
+    if isinstance(tag, tuple) and tag[1:] == _frame_identity(data):
+        return tag[0]
+
+    digest = hashlib.sha1()
+    digest.update(repr(list(data.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return f"fp-{digest.hexdigest()[:16]}"
@@ -0,0 +1,150 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+import pandas as pd
+from config.constants import (
+    USER_DESIRED_GROWTH, USER_FLUCTUATION, USER_RISK_PREFERENCE,
+    UTILITY_EXCESS_GROWTH_WEIGHT, UTILITY_EXCESS_RISK_PENALTY
+)
+from core.data_processing.risk_free_rates import average_risk_free_rate
+
+
+def utility_matrix(growth, std, risk_free_rate, desired_growth, fluctuation,
+                   risk_weight, return_weight):
+    """
+    Computes the custom utility of every ETF for every user profile at once.
+
+    The utility rewards growth above the risk-free rate and penalizes
+    volatility, weighted by the user's risk preference:
+
+        reward  = min(G, g*) + EXCESS_GROWTH_WEIGHT * max(G - g*, 0) - rf
+        penalty = S + EXCESS_RISK_PENALTY * max(S - s*, 0)
+        utility = (w_return * reward - w_risk * penalty) / (w_return + w_risk)
+
+    where G and S are the ETF's annual growth and standard deviation, g* is the
+    desired growth and s* the fluctuation tolerance. Growth past the user's goal
+    counts for less, and volatility past the user's tolerance costs more, so the
+    ranking depends on the profile and not only on the weights.
+
+    ETF inputs have shape (n_etfs,) and profile inputs shape (n_profiles,) or
+    scalars; the result broadcasts to (n_profiles, n_etfs).
+
+    Args:
+        growth (array-like): Annual growth of each ETF, in percent.
+        std (array-like): Annualized standard deviation of each ETF, in percent.
+        risk_free_rate (float): The average risk-free rate, in percent.
+        desired_growth (array-like): Desired annual growth per profile, in
+                                     percent. np.inf disables the growth cap.
+        fluctuation (array-like): Fluctuation tolerance per profile, in percent.
+                                  np.inf disables the excess-risk penalty.
+        risk_weight (array-like): Risk weight per profile.
+        return_weight (array-like): Return weight per profile.
+
+    Returns:
+        np.ndarray: The utility scores with shape (n_profiles, n_etfs).
+    """
+    growth = np.asarray(growth, dtype=float)[np.newaxis, :]
+    std = np.asarray(std, dtype=float)[np.newaxis, :]
+    desired_growth = np.atleast_1d(np.asarray(desired_growth, dtype=float))[:, np.newaxis]
+    fluctuation = np.atleast_1d(np.asarray(fluctuation, dtype=float))[:, np.newaxis]
+    risk_weight = np.atleast_1d(np.asarray(risk_weight, dtype=float))[:, np.newaxis]
+    return_weight = np.atleast_1d(np.asarray(return_weight, dtype=float))[:, np.newaxis]
+
+    reward = (np.minimum(growth, desired_growth)
+              + UTILITY_EXCESS_GROWTH_WEIGHT * np.maximum(growth - desired_growth, 0)
+              - risk_free_rate)
+    penalty = std + UTILITY_EXCESS_RISK_PENALTY * np.maximum(std - fluctuation, 0)
+
+    return (return_weight * reward - risk_weight * penalty) / (return_weight + risk_weight)
+
+
+def utility_score(etf_df, time_horizon, risk_free_df, risk_preference,
+                  desired_growth=None, fluctuation=None, end_date=None):
+    """
+    Calculates the custom utility score for each ETF and sorts them by the score.
+
+    See `utility_matrix` for the formula. When the desired growth or the
+    fluctuation tolerance is not given, growth is not capped and volatility is
+    penalized linearly.
+
+    Args:
+        etf_df (pd.DataFrame): A DataFrame containing ETF metrics, including
+                               annual growth and standard deviation.
+        time_horizon (int): The time period in years for which the metrics were
+                            calculated.
+        risk_free_df (pd.DataFrame): A DataFrame containing historical risk-free
+                                     rates, used to find the average risk-free
+                                     rate over the specified time horizon.
+        risk_preference (list): The risk and return preference weights,
+                                e.g., [risk_weight, return_weight].
+        desired_growth (float, optional): The user's desired annual growth rate.
+        fluctuation (float, optional): The user's acceptable annual standard
+                                       deviation.
+        end_date (pd.Timestamp, optional): The end of the ETF window, so the
+                                           risk-free average covers the same
+                                           period. Defaults to the latest
+                                           risk-free observation.
+
+    Returns:
+        pd.DataFrame: The original DataFrame with a new 'Utility_Score' column,
+                      sorted in descending order by the score.
+    """
+    growth_col = f'Annual_Growth_{time_horizon}Y'
+    std_col = f'Standard_Deviation_{time_horizon}Y'
+
+    if etf_df.empty:
+        return etf_df.assign(Utility_Score=pd.Series(dtype=float))
+
+    df = etf_df.dropna(subset=[growth_col, std_col]).copy()
+    avg_rf = average_risk_free_rate(risk_free_df, time_horizon, end_date)
+
+    df['Utility_Score'] = utility_matrix(
+        df[growth_col].to_numpy(), df[std_col].to_numpy(), avg_rf,
+        np.inf if desired_growth is None else desired_growth,
+        np.inf if fluctuation is None else fluctuation,
+        risk_preference[0], risk_preference[1]
+    )[0]
+
+    return df.sort_values('Utility_Score', ascending=False)
+
+
+def batch_utility_scores(etf_df, time_horizon, risk_free_df, profiles, end_date=None):
+    """
+    Scores every ETF for many user profiles in a single array operation.
+
+    All profiles must share the metrics in `etf_df`, i.e. the same time horizon,
+    drawdown filter and minimum ETF age; only the growth, fluctuation and risk
+    preference answers may differ.
+
+    Args:
+        etf_df (pd.DataFrame): A DataFrame containing ETF metrics, including
+                               annual growth and standard deviation.
+        time_horizon (int): The time period in years for which the metrics were
+                            calculated.
+        risk_free_df (pd.DataFrame): A DataFrame containing historical risk-free rates.
+        profiles (list): User profile lists in the layout of `getUserProfile`.
+        end_date (pd.Timestamp, optional): The end of the ETF window, so the
+                                           risk-free average covers the same
+                                           period. Defaults to the latest
+                                           risk-free observation.
+
+    Returns:
+        pd.DataFrame: The utility scores with one row per profile (in the order
+                      given) and one column per ticker.
+    """
+    growth_col = f'Annual_Growth_{time_horizon}Y'
+    std_col = f'Standard_Deviation_{time_horizon}Y'
+
+    df = etf_df.dropna(subset=[growth_col, std_col])
+    avg_rf = average_risk_free_rate(risk_free_df, time_horizon, end_date)
+    preferences = np.array([profile[USER_RISK_PREFERENCE] for profile in profiles], dtype=float)
+
+    scores = utility_matrix(
+        df[growth_col].to_numpy(), df[std_col].to_numpy(), avg_rf,
+        [profile[USER_DESIRED_GROWTH] for profile in profiles],
+        [profile[USER_FLUCTUATION] for profile in profiles],
+        preferences[:, 0], preferences[:, 1]
+    )
+    return pd.DataFrame(scores, columns=df['Ticker'].to_numpy())
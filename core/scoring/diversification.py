@@ -0,0 +1,256 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+from config.constants import MAX_BASKET_CORRELATION, COVARIANCE_SHRINKAGE_PRIOR
+from core.data_processing.etf_data import price_returns
+from core.data_processing.shared_prices import snapshot_version
+
+
+class RollingCovariance:
+    """
+    Pairwise return covariance over a sliding window, updated by adding and
+    removing rows instead of recomputing.
+
+    ETFs have different inception dates, so every statistic is kept per pair
+    over the days on which both ETFs have a return. With X the zero-filled
+    returns and M the validity mask, the window keeps:
+        count[i, j]  = sum(M_i * M_j)
+        sum_x[i, j]  = sum(X_i * M_j)
+        sum_sq[i, j] = sum(X_i**2 * M_j)
+        sum_xy[i, j] = sum(X_i * X_j)
+    Adding or removing k rows costs O(k * n**2). `start` (exclusive) and
+    `end` (inclusive) record the dates the window currently covers.
+    """
+
+    def __init__(self, tickers):
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.start = None
+        self.end = None
+        self.count = np.zeros((n, n))
+        self.sum_x = np.zeros((n, n))
+        self.sum_sq = np.zeros((n, n))
+        self.sum_xy = np.zeros((n, n))
+
+    def _accumulate(self, returns, sign):
+        values = np.asarray(returns, dtype=float)
+        if values.size == 0:
+            return
+        mask = (~np.isnan(values)).astype(float)
+        filled = np.nan_to_num(values)
+        self.count += sign * (mask.T @ mask)
+        self.sum_x += sign * (filled.T @ mask)
+        self.sum_sq += sign * ((filled ** 2).T @ mask)
+        self.sum_xy += sign * (filled.T @ filled)
+
+    def add(self, returns):
+        """Adds the rows of a date x ticker returns frame to the window."""
+        self._accumulate(returns, 1.0)
+
+    def remove(self, returns):
+        """Removes rows that previously entered the window."""
+        self._accumulate(returns, -1.0)
+
+    def copy(self):
+        """Returns an independent copy of the window."""
+        clone = RollingCovariance(self.tickers)
+        clone.start, clone.end = self.start, self.end
+        for name in ('count', 'sum_x', 'sum_sq', 'sum_xy'):
+            setattr(clone, name, getattr(self, name).copy())
+        return clone
+
+    def mean(self):
+        """Returns the mean daily return of each ETF over its days in the window."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return pd.Series(np.diag(self.sum_x) / np.diag(self.count), index=self.tickers)
+
+    def correlation(self, shrinkage_prior=COVARIANCE_SHRINKAGE_PRIOR):
+        """
+        Returns the shrunk pairwise correlation matrix.
+
+        Each correlation is shrunk towards zero with weight
+        `prior / (prior + overlap)`, where overlap is the number of days both
+        ETFs traded. Pairs with a short common history are therefore pulled
+        towards independence instead of reporting noisy near-duplicates.
+
+        Args:
+            shrinkage_prior (float, optional): The strength of the prior in
+                                               pseudo-days. Defaults to
+                                               `COVARIANCE_SHRINKAGE_PRIOR`.
+
+        Returns:
+            pd.DataFrame: The ticker x ticker correlation matrix.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n = self.count
+            cov = (self.sum_xy - self.sum_x * self.sum_x.T / n) / (n - 1)
+            var_i = (self.sum_sq - self.sum_x ** 2 / n) / (n - 1)
+            corr = cov / np.sqrt(var_i * var_i.T)
+        corr = np.nan_to_num(corr)
+        shrinkage = shrinkage_prior / (shrinkage_prior + self.count)
+        corr = np.clip((1 - shrinkage) * corr, -1.0, 1.0)
+        np.fill_diagonal(corr, 1.0)
+        return pd.DataFrame(corr, index=self.tickers, columns=self.tickers)
+
+    def covariance(self, shrinkage_prior=COVARIANCE_SHRINKAGE_PRIOR):
+        """
+        Returns the shrunk daily covariance matrix.
+
+        Built from the shrunk correlations and each ETF's own variance. Because
+        pairs are estimated over different overlaps, the result is projected
+        onto the positive semi-definite cone by clipping negative eigenvalues.
+
+        Args:
+            shrinkage_prior (float, optional): The strength of the prior in
+                                               pseudo-days. Defaults to
+                                               `COVARIANCE_SHRINKAGE_PRIOR`.
+
+        Returns:
+            pd.DataFrame: The ticker x ticker covariance of daily returns.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n = np.diag(self.count)
+            sum_x = np.diag(self.sum_x)
+            variance = np.nan_to_num((np.diag(self.sum_sq) - sum_x ** 2 / n) / (n - 1))
+        std = np.sqrt(np.maximum(variance, 0.0))
+        cov = self.correlation(shrinkage_prior).to_numpy() * np.outer(std, std)
+
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        if eigenvalues.min() < 0:
+            cov = (eigenvectors * np.maximum(eigenvalues, 0.0)) @ eigenvectors.T
+        return pd.DataFrame(cov, index=self.tickers, columns=self.tickers)
+
+
+# (horizon, tickers) -> {'state', 'version', 'window_hash'}; one entry per horizon and universe
+_covariance_cache = {}
+_covariance_lock = threading.Lock()
+
+
+def _window_rows(returns, start, end):
+    # The rows of `returns` dated in (start, end]
+    first = returns.index.searchsorted(start, side='right')
+    last = returns.index.searchsorted(end, side='right')
+    return returns.iloc[first:last]
+
+
+def _rows_hash(rows):
+    return hashlib.sha1(pd.util.hash_pandas_object(rows, index=True).to_numpy().tobytes()).hexdigest()
+
+
+def get_rolling_covariance(price_data, time_horizon, end_date):
+    """
+    Returns the rolling covariance state of the whole universe for one horizon.
+
+    The state is cached per horizon together with a hash of the return rows
+    it covers. When the window moves, the new rows are added and the rows that
+    left it are removed rather than recomputing the window. This is only done
+    if the rows already in the state are unchanged: a state built from another
+    snapshot is reused only when its rows hash the same in `price_data`
+    (a republished or cleaned snapshot may restate history), and is rebuilt
+    otherwise. Each return is taken from the ticker's previous price over its
+    whole history, so rows added now and removed later are identical. The
+    cached state is updated in place, so callers get a copy taken under the
+    lock.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        time_horizon (int): The window length in years.
+        end_date (pd.Timestamp): The final date of the window.
+
+    Returns:
+        RollingCovariance: A copy of the state covering the window ending at
+                           `end_date`.
+    """
+    tickers = tuple(price_data.columns.get_level_values(0))
+    last_bar = price_data.index[price_data.index <= end_date].max()
+    window_start = last_bar - pd.DateOffset(years=time_horizon)
+    version = snapshot_version(price_data)
+    key = (time_horizon, tickers)
+
+    with _covariance_lock:
+        entry = _covariance_cache.get(key)
+        if entry is not None and entry['version'] == version and entry['state'].end == last_bar:
+            return entry['state'].copy()
+
+        returns = price_returns(price_data.loc[:last_bar])
+        state = entry['state'] if entry is not None else None
+        if state is not None and entry['version'] != version and \
+                _rows_hash(_window_rows(returns, state.start, state.end)) != entry['window_hash']:
+            state = None  # the snapshot restated rows the state already holds
+
+        if state is None or state.end > last_bar or state.start > window_start:
+            state = RollingCovariance(tickers)
+            state.add(_window_rows(returns, window_start, last_bar))
+        else:
+            state.add(_window_rows(returns, state.end, last_bar))
+            state.remove(_window_rows(returns, state.start, window_start))
+        state.start = window_start
+        state.end = last_bar
+
+        _covariance_cache[key] = {'state': state, 'version': version,
+                                  'window_hash': _rows_hash(_window_rows(returns, window_start, last_bar))}
+        return state.copy()
+
+
+def get_correlation_matrix(price_data, time_horizon, end_date):
+    """
+    Returns the shrunk return correlation of the whole universe for one horizon.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        time_horizon (int): The window length in years.
+        end_date (pd.Timestamp): The final date of the window.
+
+    Returns:
+        pd.DataFrame: The ticker x ticker correlation matrix.
+    """
+    return get_rolling_covariance(price_data, time_horizon, end_date).correlation()
+
+
+def diversified_top_recommend(scored_df, score_col, amount_recommend, correlation,
+                              max_correlation=MAX_BASKET_CORRELATION):
+    """
+    Greedily selects high-scoring ETFs that are not near-duplicates of each other.
+
+    ETFs are visited from the best score down and accepted only if their
+    correlation with every ETF already in the basket is at most
+    `max_correlation`. If the cap leaves the basket short, it is filled with
+    the best remaining ETFs so the basket size is unchanged.
+
+    Args:
+        scored_df (pd.DataFrame): A DataFrame with a 'Ticker' column and the
+                                  score column.
+        score_col (str): The name of the column to rank by, higher is better.
+        amount_recommend (int): The number of ETFs to return.
+        correlation (pd.DataFrame): A correlation matrix covering the tickers,
+                                    e.g. from `get_correlation_matrix`.
+        max_correlation (float, optional): The correlation cap. Defaults to
+                                           `MAX_BASKET_CORRELATION`.
+
+    Returns:
+        pd.DataFrame: The selected rows in selection order.
+    """
+    if scored_df.empty or score_col not in scored_df.columns:
+        return scored_df.iloc[0:0]
+    ranked = scored_df.dropna(subset=[score_col]).sort_values(score_col, ascending=False)
+    tickers = ranked['Ticker'].tolist()
+    corr = correlation.reindex(index=tickers, columns=tickers).fillna(0.0).to_numpy()
+
+    selected = []
+    for i in range(len(tickers)):
+        if len(selected) == amount_recommend:
+            break
+        if not selected or corr[i, selected].max() <= max_correlation:
+            selected.append(i)
+
+    if len(selected) < amount_recommend:
+        leftovers = [i for i in range(len(tickers)) if i not in selected]
+        selected += leftovers[:amount_recommend - len(selected)]
+
+    return ranked.iloc[selected]
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def top_recommend(scored_df, score_col, amount_recommend):
+    """
+    Selects the highest-scoring ETFs from a scored DataFrame.
+
+    Works with the output of any scorer (e.g. 'Sharpe' or 'Utility_Score').
+    ETFs without a score are ignored.
+
+    Args:
+        scored_df (pd.DataFrame): A DataFrame with a 'Ticker' column and the
+                                  score column.
+        score_col (str): The name of the column to rank by, higher is better.
+        amount_recommend (int): The number of ETFs to return.
+
+    Returns:
+        pd.DataFrame: The top `amount_recommend` rows, sorted in descending
+                      order by `score_col`.
+    """
+    if scored_df.empty or score_col not in scored_df.columns:
+        return scored_df.iloc[0:0]
+    return scored_df.dropna(subset=[score_col]).nlargest(amount_recommend, score_col)
+
+
+def top_recommend_batch(score_frame, amount_recommend):
+    """
+    Selects the top ETFs for many profiles at once.
+
+    Uses a partial sort per row, so the cost is linear in the number of ETFs
+    rather than a full sort per profile. NaN scores are never selected.
+
+    Args:
+        score_frame (pd.DataFrame): Scores with one row per profile and one
+                                    column per ticker, e.g. the output of
+                                    `batch_utility_scores`.
+        amount_recommend (int): The number of ETFs to select per profile.
+
+    Returns:
+        list: One list of tickers per profile, best first. Lists are shorter
+              than `amount_recommend` when fewer ETFs have a score.
+    """
+    scores = np.where(np.isnan(score_frame.to_numpy(dtype=float)), -np.inf,
+                      score_frame.to_numpy(dtype=float))
+    tickers = score_frame.columns.to_numpy()
+    k = min(amount_recommend, scores.shape[1])
+    if k == 0:
+        return [[] for _ in range(len(score_frame))]
+
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    ranked = np.take_along_axis(candidates, order, axis=1)
+    ranked_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+    return [tickers[row[np.isfinite(row_scores)]].tolist()
+            for row, row_scores in zip(ranked, ranked_scores)]
@@ -0,0 +1,258 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config.constants import (
+    USER_TIME_HORIZON, USER_DESIRED_GROWTH, USER_FLUCTUATION, USER_WORST_CASE,
+    USER_MINIMUM_ETF_AGE, RECOMMENDATION_COUNT, MONTE_CARLO_SEED, PIPELINE_MEMO_ENTRIES
+)
+from core.analysis.dollar_cost_averaging import dca_outcomes
+from core.analysis.drawdowns import get_drawdown_analytics
+from core.analysis.max_drawdown import max_drawdown_masks
+from core.analysis.monte_carlo import basket_daily_returns, simulate_outcomes
+from core.analysis.portfolio_weights import portfolio_weights
+from core.analysis.rejections import ranking_masks, explain_rejections
+from core.analysis.sensitivity import neighborhood_sensitivity
+from core.data_processing.etf_data import get_etf_data_with_masks
+from core.data_processing.price_pyramid import choose_resolution
+from core.data_processing.shared_prices import snapshot_version
+from core.scoring.scorer_registry import SCORERS, score_etfs
+from core.scoring.etf_recommendation_evaluation import top_recommend
+from core.scoring.diversification import get_correlation_matrix, diversified_top_recommend
+
+# name -> {'func', 'fields', 'options', 'upstream'}; filled by @register_stage below,
+# in dependency order
+STAGES = {}
+
+# Settings that are not profile answers, with their defaults
+PIPELINE_OPTIONS = {'ranking_method': 'Sharpe', 'diversify': False, 'max_underwater_years': None}
+
+
+def register_stage(name, fields=(), options=(), upstream=()):
+    """
+    Registers a step of the recommendation pipeline and what it depends on.
+
+    The decorated function receives a dict with the shared inputs
+    ('user', 'valid_tickers', 'data', 'end_date', 'risk_free_df'), the
+    options and the result of every upstream stage under its name. It must
+    only read the profile fields and options it declares, since those (with
+    the upstream stages) are all its memo is keyed on.
+
+    Args:
+        name (str): The stage name.
+        fields (tuple): `USER_*` indexes of the profile answers it reads.
+        options (tuple): Names from `PIPELINE_OPTIONS` it reads.
+        upstream (tuple): Names of already registered stages it consumes.
+
+    Returns:
+        function: The decorator.
+    """
+    unknown = [stage for stage in upstream if stage not in STAGES]
+    unknown += [option for option in options if option not in PIPELINE_OPTIONS]
+    if unknown:
+        raise ValueError(f"Stage {name} depends on unknown stages or options: {unknown}")
+
+    def decorator(func):
+        STAGES[name] = {'func': func, 'fields': tuple(fields), 'options': tuple(options),
+                        'upstream': tuple(upstream)}
+        return func
+    return decorator
+
+
+@register_stage('drawdown_filter', fields=(USER_WORST_CASE, USER_MINIMUM_ETF_AGE),
+                options=('max_underwater_years',))
+def _drawdown_filter(ctx):
+    user = ctx['user']
+    return max_drawdown_masks(user[USER_WORST_CASE], user[USER_MINIMUM_ETF_AGE],
+                              ctx['valid_tickers'], ctx['data'], ctx['end_date'],
+                              resolution='weekly', max_underwater_years=ctx['max_underwater_years'])
+
+
+@register_stage('candidates', upstream=('drawdown_filter',))
+def _candidates(ctx):
+    # Same list as calculate_max_drawdown, read off the masks
+    rejected = np.logical_or.reduce(list(ctx['drawdown_filter'].values()))
+    return [ticker for ticker, out in zip(ctx['valid_tickers'], rejected) if not out]
+
+
+@register_stage('metric_filter', fields=(USER_TIME_HORIZON,), upstream=('candidates',))
+def _metric_filter(ctx):
+    horizon = ctx['user'][USER_TIME_HORIZON]
+    return get_etf_data_with_masks(ctx['candidates'], horizon, ctx['data'], ctx['end_date'],
+                                   resolution=choose_resolution(horizon))
+
+
+@register_stage('metrics', upstream=('metric_filter',))
+def _metrics(ctx):
+    return ctx['metric_filter'][0]
+
+
+@register_stage('scores', fields=(USER_TIME_HORIZON,), upstream=('metrics',))
+def _scores(ctx):
+    # Every ranking method comes out of the same returns pass
+    return score_etfs(ctx['metrics'], ctx['user'][USER_TIME_HORIZON], ctx['data'],
+                      ctx['end_date'], ctx['risk_free_df'])
+
+
+@register_stage('ranked', fields=(USER_TIME_HORIZON,), options=('ranking_method', 'diversify'),
+                upstream=('scores',))
+def _ranked(ctx):
+    score_col = SCORERS[ctx['ranking_method']]['column']
+    if ctx['diversify']:
+        correlation = get_correlation_matrix(ctx['data'], ctx['user'][USER_TIME_HORIZON], ctx['end_date'])
+        return diversified_top_recommend(ctx['scores'], score_col, RECOMMENDATION_COUNT, correlation)
+    return top_recommend(ctx['scores'], score_col, RECOMMENDATION_COUNT)
+
+
+@register_stage('weights', fields=(USER_TIME_HORIZON, USER_FLUCTUATION), upstream=('candidates',))
+def _weights(ctx):
+    user = ctx['user']
+    return portfolio_weights(ctx['data'], [ctx['candidates']], user[USER_TIME_HORIZON], ctx['end_date'],
+                             ctx['risk_free_df'], [user[USER_FLUCTUATION]])[0]
+
+
+@register_stage('outcomes', fields=(USER_TIME_HORIZON, USER_WORST_CASE, USER_DESIRED_GROWTH),
+                upstream=('ranked',))
+def _outcomes(ctx):
+    user = ctx['user']
+    if ctx['ranked'].empty:
+        return None
+    basket_returns = basket_daily_returns(ctx['data'], ctx['ranked']['Ticker'].tolist(), end_date=ctx['end_date'])
+    return simulate_outcomes(basket_returns, user[USER_TIME_HORIZON], user[USER_WORST_CASE],
+                             user[USER_DESIRED_GROWTH], seed=MONTE_CARLO_SEED)
+
+
+@register_stage('dca', fields=(USER_TIME_HORIZON,), upstream=('ranked',))
+def _dca(ctx):
+    if ctx['ranked'].empty:
+        return None
+    return dca_outcomes(ctx['data'], ctx['ranked']['Ticker'].tolist(), ctx['user'][USER_TIME_HORIZON],
+                        ctx['end_date'])
+
+
+@register_stage('drawdowns', upstream=('ranked',))
+def _drawdowns(ctx):
+    # Read off the snapshot's cached one-pass analytics over the whole history
+    if ctx['ranked'].empty:
+        return None
+    analytics = get_drawdown_analytics(ctx['data'], end_date=ctx['end_date'])
+    tickers = ctx['ranked']['Ticker'].tolist()
+    return {'summary': analytics['summary'].loc[tickers], 'underwater': analytics['underwater'][tickers]}
+
+
+@register_stage('rejections', fields=(USER_TIME_HORIZON, USER_WORST_CASE, USER_MINIMUM_ETF_AGE),
+                options=('ranking_method', 'max_underwater_years'),
+                upstream=('drawdown_filter', 'candidates', 'metric_filter', 'scores', 'ranked'))
+def _rejections(ctx):
+    user = ctx['user']
+    score_col = SCORERS[ctx['ranking_method']]['column']
+    scored, masks, ranks = ranking_masks(ctx['scores'], ctx['ranked'], score_col)
+    stage_masks = [(ctx['valid_tickers'], ctx['drawdown_filter']),
+                   (ctx['candidates'], ctx['metric_filter'][1]),
+                   (scored, masks)]
+    recommended = [] if ctx['ranked'].empty else ctx['ranked']['Ticker'].tolist()
+    return explain_rejections(ctx['valid_tickers'], stage_masks, recommended, ranks,
+                              age=user[USER_MINIMUM_ETF_AGE], worst_case=user[USER_WORST_CASE],
+                              max_underwater=ctx['max_underwater_years'],
+                              horizon=user[USER_TIME_HORIZON], ranking=ctx['ranking_method'],
+                              count=RECOMMENDATION_COUNT)
+
+
+@register_stage('stability', fields=(USER_TIME_HORIZON, USER_DESIRED_GROWTH, USER_FLUCTUATION,
+                                     USER_WORST_CASE, USER_MINIMUM_ETF_AGE),
+                options=('ranking_method', 'diversify', 'max_underwater_years'))
+def _stability(ctx):
+    return neighborhood_sensitivity(ctx['user'], ctx['valid_tickers'], ctx['data'], ctx['end_date'],
+                                    ctx['risk_free_df'], ctx['ranking_method'], ctx['diversify'],
+                                    max_underwater_years=ctx['max_underwater_years'])
+
+
+def new_memo():
+    """
+    Creates an empty pipeline memo; keep one per session (e.g. in
+    `st.session_state`) and pass it to every `run_pipeline` call.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'results' (dict): Stage name -> OrderedDict of key -> result,
+              at most `PIPELINE_MEMO_ENTRIES` per stage.
+            - 'executed' (list): The stages the last run had to compute.
+    """
+    return {'results': {name: OrderedDict() for name in STAGES}, 'executed': []}
+
+
+def _freeze(value):
+    # Profile answers may be lists (the risk preference); keys must be hashable
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _required(targets):
+    # The targets and everything upstream of them, in registration order
+    needed = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in STAGES:
+            raise KeyError(f"Unknown pipeline stage: {name}")
+        if name not in needed:
+            needed.add(name)
+            pending.extend(STAGES[name]['upstream'])
+    return [name for name in STAGES if name in needed]
+
+
+def run_pipeline(targets, user, valid_tickers, data, end_date, risk_free_df, memo, options=None):
+    """
+    Runs the recommendation stages needed for `targets`, reusing memoized results.
+
+    A stage's key is built from the snapshots (price and risk-free content
+    hashes), the analysis day, the profile fields and options it declares and
+    the keys of its upstream stages. Changing one answer therefore only
+    recomputes the stages that read it and the stages below them: a new time
+    horizon reruns the metrics, scores and ranking but reuses the drawdown
+    filter, and a new fluctuation answer only reruns the portfolio weights.
+
+    `end_date` is truncated to the day, so reruns within a day share results.
+
+    Args:
+        targets (list): Stage names whose results are wanted.
+        user (list): The profile, indexed by the USER_* constants.
+        valid_tickers (list): A list of valid ETF ticker symbols.
+        data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        end_date (pd.Timestamp): The final date for the analysis period.
+        risk_free_df (pd.DataFrame): A DataFrame containing historical risk-free rates.
+        memo (dict): The session's memo from `new_memo`; updated in place.
+        options (dict, optional): Overrides for `PIPELINE_OPTIONS`.
+
+    Returns:
+        dict: Stage name -> result for every stage in `targets`.
+    """
+    options = {**PIPELINE_OPTIONS, **(options or {})}
+    end_date = pd.Timestamp(end_date).normalize()
+    shared = (snapshot_version(data), snapshot_version(risk_free_df), end_date, len(valid_tickers))
+    ctx = {'user': user, 'valid_tickers': valid_tickers, 'data': data, 'end_date': end_date,
+           'risk_free_df': risk_free_df, **options}
+
+    keys = {}
+    memo['executed'] = []
+    for name in _required(targets):
+        stage = STAGES[name]
+        keys[name] = (shared,
+                      tuple(_freeze(user[field]) for field in stage['fields']),
+                      tuple(_freeze(options[option]) for option in stage['options']),
+                      tuple(keys[upstream] for upstream in stage['upstream']))
+        results = memo['results'].setdefault(name, OrderedDict())
+        if keys[name] in results:
+            results.move_to_end(keys[name])
+        else:
+            results[keys[name]] = stage['func'](ctx)
+            memo['executed'].append(name)
+            while len(results) > PIPELINE_MEMO_ENTRIES:
+                results.popitem(last=False)
+        ctx[name] = results[keys[name]]
+
+    return {name: ctx[name] for name in targets}
@@ -0,0 +1,285 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import numpy as np
+from config.constants import TRADING_DAYS_PER_YEAR
+from core.analysis.rolling_returns import get_horizon_distribution
+from core.data_processing.etf_data import get_returns_matrix
+from core.data_processing.risk_free_rates import average_risk_free_rate, get_daily_risk_free
+
+# name -> {'func', 'requires', 'column'}; filled by @register_scorer below
+SCORERS = {}
+
+
+def register_scorer(name, requires, column=None):
+    """
+    Registers a ranking method and the return statistics it needs.
+
+    The decorated function receives a dict of the requested statistics (each a
+    1-D array with one value per ETF) and the average risk-free rate in
+    percent, and returns one score per ETF, higher being better.
+
+    Args:
+        name (str): The name shown to users, e.g. 'Sortino'.
+        requires (tuple): Statistic names from `STATISTICS` or
+                          `DISTRIBUTION_STATISTICS`.
+        column (str, optional): The output column. Defaults to `name`.
+
+    Returns:
+        function: The decorator.
+    """
+    unknown = set(requires) - set(STATISTICS) - set(DISTRIBUTION_STATISTICS)
+    if unknown:
+        raise ValueError(f"Scorer {name} requires unknown statistics: {sorted(unknown)}")
+
+    def decorator(func):
+        SCORERS[name] = {'func': func, 'requires': tuple(requires), 'column': column or name}
+        return func
+    return decorator
+
+
+def _valid(ctx):
+    return ~np.isnan(ctx['returns'])
+
+
+def _filled(ctx):
+    return np.where(ctx['valid'], ctx['returns'], 0.0)
+
+
+def _count(ctx):
+    return ctx['valid'].sum(axis=0)
+
+
+def _excess(ctx):
+    # Daily returns in excess of the daily minimum acceptable return (the risk-free rate)
+    return np.where(ctx['valid'], ctx['returns'] - ctx['mar'], 0.0)
+
+
+def _wealth(ctx):
+    return np.cumprod(1.0 + ctx['filled'], axis=0)
+
+
+def _annual_growth(ctx):
+    # Same compounding convention as get_etf_data: total return over the horizon
+    return (ctx['wealth'][-1] ** (1.0 / ctx['time_horizon']) - 1.0) * 100
+
+
+def _volatility(ctx):
+    n = ctx['count']
+    mean = ctx['filled'].sum(axis=0) / n
+    sq_dev = np.where(ctx['valid'], ctx['returns'] - mean, 0.0) ** 2
+    return np.sqrt(sq_dev.sum(axis=0) / (n - 1)) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+
+
+def _downside_deviation(ctx):
+    shortfall = np.minimum(ctx['excess'], 0.0)
+    return np.sqrt((shortfall ** 2).sum(axis=0) / ctx['count']) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+
+
+def _max_drawdown(ctx):
+    wealth = ctx['wealth']
+    peak = np.maximum.accumulate(wealth, axis=0)
+    return (wealth / peak - 1.0).min(axis=0) * 100
+
+
+def _excess_mean(ctx):
+    return ctx['excess'].sum(axis=0) / ctx['count'] * TRADING_DAYS_PER_YEAR * 100
+
+
+def _excess_volatility(ctx):
+    n = ctx['count']
+    mean = ctx['excess'].sum(axis=0) / n
+    sq_dev = np.where(ctx['valid'], ctx['excess'] - mean, 0.0) ** 2
+    return np.sqrt(sq_dev.sum(axis=0) / (n - 1)) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100
+
+
+def _gain_moment(ctx):
+    return np.maximum(ctx['excess'], 0.0).sum(axis=0) / ctx['count']
+
+
+def _loss_moment(ctx):
+    return np.maximum(-ctx['excess'], 0.0).sum(axis=0) / ctx['count']
+
+
+# Shared intermediates are computed at most once per pass and reused by every statistic
+_INTERMEDIATES = {
+    'valid': _valid,
+    'filled': _filled,
+    'count': _count,
+    'excess': _excess,
+    'wealth': _wealth,
+}
+
+STATISTICS = {
+    'annual_growth': _annual_growth,
+    'volatility': _volatility,
+    'downside_deviation': _downside_deviation,
+    'max_drawdown': _max_drawdown,
+    'excess_mean': _excess_mean,
+    'excess_volatility': _excess_volatility,
+    'gain_moment': _gain_moment,
+    'loss_moment': _loss_moment,
+}
+
+# Statistics over every past window of the horizon rather than the latest one:
+# name -> column of `get_horizon_distribution`
+DISTRIBUTION_STATISTICS = {
+    'median_horizon_return': 'Return_P50',
+    'worst_decile_horizon_return': 'Return_P10',
+}
+
+
+# Statistics that `get_etf_data` already reports: name -> column template.
+# They are read from the metrics table, at whatever resolution it was built,
+# so a score agrees with the growth and volatility shown next to it.
+TABLE_STATISTICS = {
+    'annual_growth': 'Annual_Growth_{}Y',
+    'volatility': 'Standard_Deviation_{}Y',
+}
+
+
+class _Context(dict):
+    """Computes intermediates lazily the first time a statistic asks for them."""
+
+    def __missing__(self, key):
+        value = _INTERMEDIATES[key](self)
+        self[key] = value
+        return value
+
+
+def compute_return_statistics(returns, statistics, time_horizon, risk_free_rate,
+                              daily_risk_free=None):
+    """
+    Computes a set of return statistics for all ETFs in one pass.
+
+    Args:
+        returns (np.ndarray): Daily simple returns, shape (n_days, n_etfs),
+                              NaN where an ETF has no return.
+        statistics (iterable): Names from `STATISTICS`.
+        time_horizon (int): The window length in years.
+        risk_free_rate (float): The annual risk-free rate in percent; it is
+                                the threshold for downside and partial moments.
+        daily_risk_free (array-like, optional): The daily risk-free rate for
+                                                each row of `returns`, e.g. from
+                                                `get_daily_risk_free`. When given
+                                                it replaces the constant threshold.
+
+    Returns:
+        dict: Statistic name -> array of shape (n_etfs,).
+    """
+    if daily_risk_free is None:
+        mar = (1 + risk_free_rate / 100) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+    else:
+        mar = np.asarray(daily_risk_free, dtype=float)[:, np.newaxis]
+    ctx = _Context(
+        returns=np.asarray(returns, dtype=float),
+        time_horizon=time_horizon,
+        mar=mar,
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {name: STATISTICS[name](ctx) for name in statistics}
+
+
+def score_etfs(etf_df, time_horizon, price_data, end_date, risk_free_df, methods=None):
+    """
+    Scores ETFs with several ranking methods from a single returns pass.
+
+    The union of the statistics required by the selected scorers is computed
+    once over the returns matrix; each scorer then only combines columns.
+    Excess returns are taken against the BoC series aligned to the trading
+    calendar, and the average rate covers the same window as the ETFs.
+    Annual growth and volatility are taken from `etf_df` when it has them
+    (see `TABLE_STATISTICS`), so e.g. 'Sharpe' equals `sharpe_score` and the
+    displayed (growth - risk-free) / std even when the metrics were computed
+    from weekly prices. Distribution statistics are looked up in the per-snapshot rolling
+    percentiles of `get_horizon_distribution`.
+
+    Args:
+        etf_df (pd.DataFrame): The output of `get_etf_data`; its 'Ticker'
+                               column defines the ETFs to score.
+        time_horizon (int): The time period in years for which the metrics were
+                            calculated.
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        end_date (pd.Timestamp): The final date of the window.
+        risk_free_df (pd.DataFrame): A DataFrame containing historical risk-free rates.
+        methods (list, optional): Scorer names from `SCORERS`. Defaults to all.
+
+    Returns:
+        pd.DataFrame: `etf_df` with the computed statistics and one score
+                      column per method.
+    """
+    methods = list(SCORERS) if methods is None else list(methods)
+    if etf_df.empty:
+        return etf_df.copy()
+
+    required = []
+    for method in methods:
+        for statistic in SCORERS[method]['requires']:
+            if statistic not in required:
+                required.append(statistic)
+
+    tickers = etf_df['Ticker'].tolist()
+    returns = get_returns_matrix(tickers, time_horizon, price_data, end_date)
+    avg_rf = average_risk_free_rate(risk_free_df, time_horizon, end_date)
+    daily_rf = get_daily_risk_free(price_data, risk_free_df).reindex(returns.index)
+    columns = {statistic: template.format(time_horizon) for statistic, template in TABLE_STATISTICS.items()}
+    table = {statistic: columns[statistic] for statistic in required
+             if statistic in columns and columns[statistic] in etf_df}
+    window_required = [statistic for statistic in required if statistic in STATISTICS and statistic not in table]
+    stats = compute_return_statistics(returns.to_numpy(), window_required, time_horizon, avg_rf,
+                                      daily_rf.to_numpy())
+    for statistic, column in table.items():
+        stats[statistic] = etf_df[column].to_numpy(dtype=float)
+    if any(statistic in DISTRIBUTION_STATISTICS for statistic in required):
+        distribution = get_horizon_distribution(price_data, time_horizon, end_date).reindex(tickers)
+        for statistic in required:
+            if statistic in DISTRIBUTION_STATISTICS:
+                stats[statistic] = distribution[DISTRIBUTION_STATISTICS[statistic]].to_numpy(dtype=float)
+
+    df = etf_df.copy()
+    for statistic in required:
+        df[statistic] = stats[statistic]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for method in methods:
+            scorer = SCORERS[method]
+            df[scorer['column']] = scorer['func'](stats, avg_rf)
+    return df.replace([np.inf, -np.inf], np.nan)
+
+
+@register_scorer('Sharpe', requires=('annual_growth', 'volatility'))
+def _sharpe(stats, risk_free_rate):
+    return (stats['annual_growth'] - risk_free_rate) / stats['volatility']
+
+
+@register_scorer('Daily Sharpe', requires=('excess_mean', 'excess_volatility'),
+                 column='Daily_Sharpe')
+def _daily_sharpe(stats, risk_free_rate):
+    return stats['excess_mean'] / stats['excess_volatility']
+
+
+@register_scorer('Sortino', requires=('annual_growth', 'downside_deviation'))
+def _sortino(stats, risk_free_rate):
+    return (stats['annual_growth'] - risk_free_rate) / stats['downside_deviation']
+
+
+@register_scorer('Calmar', requires=('annual_growth', 'max_drawdown'))
+def _calmar(stats, risk_free_rate):
+    return stats['annual_growth'] / np.abs(stats['max_drawdown'])
+
+
+@register_scorer('Omega', requires=('gain_moment', 'loss_moment'))
+def _omega(stats, risk_free_rate):
+    return stats['gain_moment'] / stats['loss_moment']
+
+
+@register_scorer('Median Rolling Return', requires=('median_horizon_return',),
+                 column='Median_Rolling_Return')
+def _median_rolling_return(stats, risk_free_rate):
+    return stats['median_horizon_return']
+
+
+@register_scorer('Worst-Decile Rolling Return', requires=('worst_decile_horizon_return',),
+                 column='Worst_Decile_Rolling_Return')
+def _worst_decile_rolling_return(stats, risk_free_rate):
+    return stats['worst_decile_horizon_return']
@@ -1,6 +1,17 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+import threading
+
+import numpy as np
 import pandas as pd
+from config.constants import TIME_HORIZON_OPTIONS, TRADING_DAYS_PER_YEAR
+from core.data_processing.etf_data import price_returns
+from core.data_processing.risk_free_rates import average_risk_free_rate, get_daily_risk_free
+from core.data_processing.shared_prices import snapshot_version
 
-def sharpe_score(etf_df, time_horizon, risk_free_df, amount_recommend=5):
+def sharpe_score(etf_df, time_horizon, risk_free_df, amount_recommend=5, end_date=None):
     """
     Calculates the Sharpe Ratio for each ETF and sorts them by the score.
 
@@ -17,6 +28,10 @@ def sharpe_score(etf_df, time_horizon, risk_free_df, amount_recommend=5):
         risk_free_df (pd.DataFrame): A DataFrame containing historical risk-free
                                      rates, used to find the average risk-free
                                      rate over the specified time horizon.
+        end_date (pd.Timestamp, optional): The end of the ETF window, so the
+                                           risk-free average covers the same
+                                           period. Defaults to the latest
+                                           risk-free observation.
 
     Returns:
         pd.DataFrame: The original DataFrame with two new columns, 'ExcessReturn'
@@ -28,13 +43,94 @@ def sharpe_score(etf_df, time_horizon, risk_free_df, amount_recommend=5):
 
     df = etf_df.dropna(subset=[growth_col, std_col]).copy()
 
-    end = risk_free_df.index.max()
-    start = end - pd.DateOffset(years=time_horizon)
-    rf_period = risk_free_df.loc[start:end]
-    avg_rf = rf_period['yield_pct'].mean()
+    avg_rf = average_risk_free_rate(risk_free_df, time_horizon, end_date)
 
     df['ExcessReturn'] = df[growth_col] - avg_rf
     df['Sharpe'] = df['ExcessReturn'] / df[std_col]
 
     return df.sort_values('Sharpe', ascending=False).head(amount_recommend)
- 
+
+
+# (price snapshot, risk-free snapshot, end_date, horizons) -> Sharpe matrix
+_daily_sharpe_cache = {}
+_daily_sharpe_lock = threading.Lock()
+
+
+def daily_sharpe_matrix(price_data, risk_free_df, end_date, horizons=TIME_HORIZON_OPTIONS):
+    """
+    Computes the daily excess-return Sharpe ratio of every ETF for several horizons.
+
+    This is the registry's 'Daily Sharpe' for all tickers and horizons in one
+    pass. Daily returns of the whole panel (each from the ETF's previous
+    price, see `price_returns`) have the calendar-aligned daily risk-free
+    rate subtracted once. Prefix sums of the excess returns, their squares and
+    the valid-day counts then give every horizon's mean and standard deviation
+    from two lookups. Windows match `get_returns_matrix`: a return measured
+    from a price before the window is left out. Results are cached per
+    snapshot.
+
+    Args:
+        price_data (pd.DataFrame): The 'Adj Close' panel from `download_valid_data`.
+        risk_free_df (pd.DataFrame): The output of `fetch_risk_free_boc`.
+        end_date (pd.Timestamp): The final date of every window.
+        horizons (list, optional): Window lengths in years. Defaults to
+                                   `TIME_HORIZON_OPTIONS`.
+
+    Returns:
+        pd.DataFrame: Annualized Sharpe ratios, one row per ticker and one
+                      column per horizon; NaN where an ETF has fewer than two
+                      returns in the window.
+    """
+    end_date = pd.Timestamp(end_date)
+    key = (snapshot_version(price_data), snapshot_version(risk_free_df), end_date, tuple(horizons))
+    with _daily_sharpe_lock:
+        cached = _daily_sharpe_cache.get(key)
+    if cached is not None:
+        return cached
+
+    dates = price_data.index
+    last = dates.searchsorted(end_date, side='right')
+    prices = price_data.iloc[:last]
+    returns = price_returns(prices).to_numpy(dtype=float)
+    daily_rf = get_daily_risk_free(price_data, risk_free_df).to_numpy(dtype=float)[:last]
+    valid = ~np.isnan(returns)
+    excess = np.where(valid, returns - daily_rf[:, np.newaxis], 0.0)
+
+    def prefix(values):
+        return np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+    sums, squares, counts = prefix(excess), prefix(excess ** 2), prefix(valid.astype(float))
+
+    # First row with a price at or after each row (`last` if none)
+    rows = np.arange(last)[:, np.newaxis]
+    next_price = np.minimum.accumulate(np.where(prices.notna().to_numpy(), rows, last)[::-1], axis=0)[::-1]
+    columns = np.arange(returns.shape[1])
+
+    result = {}
+    for horizon in horizons:
+        # The window's first row only serves as the base of the next return
+        first = dates.searchsorted(end_date - pd.DateOffset(years=horizon), side='left')
+        lo = min(first + 1, last)
+        n = counts[last] - counts[lo]
+        s1 = sums[last] - sums[lo]
+        s2 = squares[last] - squares[lo]
+        if first < last:
+            # Without a price on the first day, an ETF's first return spans back before the window
+            start = next_price[first]
+            spans = (start > first) & (start < last)
+            start = np.minimum(start, last - 1)
+            spans &= valid[start, columns]
+            n = n - spans
+            s1 = s1 - np.where(spans, excess[start, columns], 0.0)
+            s2 = s2 - np.where(spans, excess[start, columns] ** 2, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = s1 / n
+            std = np.sqrt(np.maximum(s2 - s1 * mean, 0.0) / (n - 1))
+            result[horizon] = np.where(n > 1, mean / std * np.sqrt(TRADING_DAYS_PER_YEAR), np.nan)
+
+    matrix = pd.DataFrame(result, index=list(price_data.columns.get_level_values(0)))
+    matrix = matrix.replace([np.inf, -np.inf], np.nan)
+    with _daily_sharpe_lock:
+        _daily_sharpe_cache.clear()
+        _daily_sharpe_cache[key] = matrix
+    return matrix
@@ -1,8 +1,10 @@
 from datetime import datetime
+from config.constants import PYRAMID_CHART_MAX_POINTS
 
-def create_etf_performance_chart(etf_recommend_df, data, chart_title):
+def create_etf_performance_chart(etf_recommend_df, data, chart_title, max_points=PYRAMID_CHART_MAX_POINTS):
     import pandas as pd
     import plotly.graph_objects as go
+    from core.data_processing.price_pyramid import get_price_pyramid, chart_resolution
 
     fig = go.Figure()
     etf_tickers = etf_recommend_df['Ticker'].tolist()
@@ -21,6 +23,9 @@ def create_etf_performance_chart(etf_recommend_df, data, chart_title):
     # Step 2: Youngest ETF determines common start date
     start_date = max(first_dates)
 
+    # Long ranges are drawn from the weekly or month-end prices to keep the payload small
+    data = get_price_pyramid(data)[chart_resolution(start_date, data.index.max(), max_points)]
+
     # Step 3: Plot each ETF starting from the common start date
     for ticker in etf_tickers:
         if (ticker, 'Adj Close') not in data.columns:
@@ -59,3 +64,41 @@ def create_etf_performance_chart(etf_recommend_df, data, chart_title):
         height=400
     )
     return fig
+
+
+def create_underwater_chart(underwater, chart_title, max_points=PYRAMID_CHART_MAX_POINTS):
+    import numpy as np
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    underwater = underwater.dropna(how='all')
+    if underwater.empty:
+        return fig
+
+    # Long ranges keep the deepest point of each bucket of days, so troughs survive downsampling
+    step = int(np.ceil(len(underwater) / max_points))
+    if step > 1:
+        buckets = np.arange(len(underwater)) // step
+        dates = underwater.index[::step]
+        underwater = underwater.groupby(buckets).min()
+        underwater.index = dates
+
+    for ticker in underwater.columns:
+        series = underwater[ticker]
+        fig.add_trace(go.Scatter(
+            x=series.index,
+            y=series.values,
+            mode='lines',
+            name=ticker,
+            hovertemplate=f'<b>{ticker}</b><br>Date: %{{x|%Y-%m-%d}}<br>Below previous high: %{{y:.1f}}%<extra></extra>',
+            line=dict(width=2)
+        ))
+
+    fig.update_layout(
+        title=chart_title,
+        xaxis_title="Date",
+        yaxis_title="Drop From Previous High (%)",
+        hovermode='closest',
+        height=400
+    )
+    return fig